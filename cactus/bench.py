@@ -0,0 +1,235 @@
+#coding:utf-8
+"""
+Benchmarks that build synthetic sites generated from the skeleton, to compare Cactus versions.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+
+import django.conf
+from django.template import Template
+
+from cactus.bootstrap import bootstrap
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_LOCALES = ['fr', 'de', 'es', 'it', 'nl', 'pt', 'pl', 'sv', 'ja']
+
+
+def generate_site(path, pages=100, depth=3, statics=20, locales=0, fingerprint=('css', 'js')):
+    """
+    Generate a synthetic site from the skeleton.
+
+    :param pages: The number of pages to add, each extending the deepest template.
+    :param depth: The number of templates extending each other, on top of the skeleton's base.html.
+    :param statics: The number of static files to add (half css, half js).
+    :param locales: The number of languages to build, on top of the default one.
+    :param fingerprint: The extensions of the static files to fingerprint.
+    """
+    bootstrap(path)
+
+    config = {
+        'prettify': True,
+        'fingerprint': list(fingerprint),
+    }
+
+    if locales:
+        config.update({
+            'use_translate': True,
+            'default_language': 'en',
+            'other_languages': DEFAULT_LOCALES[:locales],
+        })
+
+    with open(os.path.join(path, 'config.json'), 'w') as f:
+        json.dump(config, f, indent=2)
+
+    parent = 'base.html'
+    for level in range(depth):
+        name = 'bench-{0}.html'.format(level)
+        with open(os.path.join(path, 'templates', name), 'w') as f:
+            f.write('{{% extends "{0}" %}}\n{{% block body %}}\n<div class="level-{1}">\n'
+                    '{{% block level_{1} %}}{{% endblock %}}\n{{{{ block.super }}}}\n</div>\n'
+                    '{{% endblock %}}\n'.format(parent, level))
+        parent = name
+
+    static_urls = []
+    static_path = os.path.join(path, 'static', 'bench')
+    os.makedirs(static_path)
+
+    for i in range(statics):
+        extension = 'css' if i % 2 == 0 else 'js'
+        name = 'file-{0}.{1}'.format(i, extension)
+        with open(os.path.join(static_path, name), 'w') as f:
+            f.write('/* {0} */\n'.format(i) * 200)
+        static_urls.append('/static/bench/{0}'.format(name))
+
+    page_path = os.path.join(path, 'pages', 'bench')
+    os.makedirs(page_path)
+
+    block = 'level_{0}'.format(depth - 1) if depth else 'body'
+
+    for i in range(pages):
+        links = ''.join(
+            '<a href="{{% url \'/bench/page-{0}.html\' %}}">{0}</a>\n'.format((i + j) % pages) for j in range(1, 6))
+        assets = ''.join(
+            '<link href="{{% static \'{0}\' %}}">\n'.format(static_urls[(i + j) % statics])
+            for j in range(min(5, statics)))
+
+        with open(os.path.join(page_path, 'page-{0}.html'.format(i)), 'w') as f:
+            f.write('title: Page {0}\n{{% extends "{1}" %}}\n{{% block {2} %}}\n<h1>{{{{ title }}}}</h1>\n'
+                    '{3}{4}<p>{5}</p>\n{{% endblock %}}\n'.format(i, parent, block, links, assets, 'Lorem ipsum ' * 100))
+
+
+def _new_site(path):
+    from cactus.site import Site
+
+    # Every site configures Django on its own
+    django.conf.settings._wrapped = django.conf.empty
+
+    site = Site(path, [os.path.join(path, 'config.json')], verb=Site.VERB_BUILD)
+    return site
+
+
+def _time(f):
+    start = time.time()
+    f()
+    return time.time() - start
+
+
+def _summary(runs):
+    ordered = sorted(runs)
+    return {
+        'runs': runs,
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+        'max': ordered[-1],
+    }
+
+
+def bench_builds(path, repeat=3):
+    """
+    Time cold builds (empty build folder), warm builds (nothing changed) and
+    rebuilds after changing a single page, each with a new site as if we were
+    running cactus again.
+    """
+    cold, warm, single = [], [], []
+    page = os.path.join(path, 'pages', 'bench', 'page-0.html')
+
+    for i in range(repeat):
+        site = _new_site(path)
+        site.clean()
+        cold.append(_time(site.build))
+        site.wait_for_sweep()
+
+        site = _new_site(path)
+        warm.append(_time(site.build))
+
+        with open(page, 'a') as f:
+            f.write('<!-- {0} -->\n'.format(i))
+
+        site = _new_site(path)
+        single.append(_time(site.build))
+        site.wait_for_sweep()
+
+    return {
+        'cold_build': _summary(cold),
+        'warm_build': _summary(warm),
+        'single_page_rebuild': _summary(single),
+    }
+
+
+def bench_tags(path, tags=10000, repeat=3):
+    """
+    Time {% static %} and {% url %} lookups, in tags per second.
+    """
+    site = _new_site(path)
+    site.build()
+
+    pages = [page for page in site.pages() if page.source_path.startswith('bench/')]
+    statics = [static.link_url for static in site.static() if static.link_url.startswith('/static/bench/')]
+    page = pages[0]
+
+    results = {}
+
+    for name, urls in [('static', statics), ('url', [p.link_url for p in pages])]:
+        if not urls:
+            continue
+
+        template = Template(''.join('{{% {0} \'{1}\' %}}'.format(name, urls[i % len(urls)]) for i in range(tags)))
+        runs = [tags / _time(lambda: template.render(page.context())) for _ in range(repeat)]
+        results['{0}_tags_per_second'.format(name)] = _summary(runs)
+
+    return results
+
+
+def run(path=None, pages=100, depth=3, statics=20, locales=0, fingerprint=('css', 'js'), repeat=3, tags=10000):
+    """
+    Generate a site (in a temporary folder unless a path is given) and run all the benchmarks on it.
+
+    :returns: The results, in a JSON-friendly dict.
+    """
+    parameters = {
+        'pages': pages,
+        'depth': depth,
+        'statics': statics,
+        'locales': locales,
+        'fingerprint': list(fingerprint),
+        'repeat': repeat,
+        'tags': tags,
+    }
+
+    temporary = path is None
+    if temporary:
+        path = os.path.join(tempfile.mkdtemp(), 'site')
+
+    try:
+        generate_site(path, pages, depth, statics, locales, fingerprint)
+
+        results = {}
+        results.update(bench_builds(path, repeat))
+        results.update(bench_tags(path, tags, repeat))
+    finally:
+        if temporary:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+    return {
+        'cactus': _version(),
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'parameters': parameters,
+        'results': results,
+    }
+
+
+def _version():
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        return None
+
+    try:
+        return version('lava-cactus')
+    except PackageNotFoundError:
+        return None
+
+
+def summary(report):
+    """
+    :returns: A human readable summary of the results.
+    """
+    lines = ['Cactus {0} on Python {1}: {2}'.format(
+        report['cactus'] or '(unknown version)', report['python'],
+        ', '.join('{0}={1}'.format(k, v) for k, v in sorted(report['parameters'].items())))]
+
+    for name, result in sorted(report['results'].items()):
+        unit = '/s' if name.endswith('_per_second') else 's'
+        lines.append('  {0:28s} median {1:12.3f}{3}  (min {2:.3f}{3})'.format(name, result['median'], result['min'], unit))
+
+    return '\n'.join(lines)
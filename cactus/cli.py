@@ -2,6 +2,7 @@
 # encoding: utf-8
 import os
 import sys
+import json
 import time
 import argparse
 import socket
@@ -45,10 +46,43 @@ class CactusCli(object):
 
         self.bootstrap(path, skeleton)
 
-    def build(self, path, config):
+    def build(self, path, config, profile=None, profile_top=20):
         """Build a cactus project"""
-        site = self.Site(path, config, verb=self.Site.VERB_BUILD)
-        site.build()
+        if profile is None:
+            site = self.Site(path, config, verb=self.Site.VERB_BUILD)
+            site.build()
+            return
+
+        from cactus import profiler
+        build_profiler = profiler.enable()
+
+        try:
+            site = self.Site(path, config, verb=self.Site.VERB_BUILD)
+            site.build()
+            site.wait_for_sweep()
+
+            report = build_profiler.report()
+        finally:
+            profiler.disable()
+            build_profiler.close()
+
+        build_profiler.write(profile, report)
+        print(build_profiler.summary(report, profile_top))
+        print('\nProfile written to {0}'.format(profile))
+
+    def bench(self, path, pages, depth, statics, locales, fingerprint, repeat, tags, output):
+        """Benchmark builds of a synthetic project"""
+        from cactus import bench
+
+        fingerprint = [extension for extension in fingerprint.split(',') if extension]
+        report = bench.run(path, pages, depth, statics, locales, fingerprint, repeat, tags)
+
+        print(bench.summary(report))
+
+        if output is not None:
+            with open(output, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+            print('\nResults written to {0}'.format(output))
 
     def deploy(self, path, config):
         """Upload the project to S3"""
@@ -60,10 +94,10 @@ class CactusCli(object):
         site = self.Site(path, config)
         site.make_messages()
 
-    def serve(self, path, config, port, browser):
+    def serve(self, path, config, port, browser, on_demand=False):
         """Serve the project and watch changes"""
         site = self.Site(path, config, verb=self.Site.VERB_SERVE)
-        site.serve(port=port, browser=browser)
+        site.serve(port=port, browser=browser, on_demand=on_demand)
 
     def domain_setup(self, path, config):
         site = self.Site(path, config)
@@ -78,6 +112,14 @@ class CactusCli(object):
         site.update_config(pair)
 
 
+def positive_int(value):
+    """An argparse type for counts that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError('must be at least 1, got {0}'.format(value))
+    return number
+
+
 def parse_arguments(cli, args):
     """Parse command line arguments"""
 
@@ -94,6 +136,27 @@ def parse_arguments(cli, args):
 
     parser_build = subparsers.add_parser('build', help='Build the current project.')
     parser_build.set_defaults(target=cli.build)
+    parser_build.add_argument('--profile', nargs='?', const='cactus-profile.json', metavar='REPORT',
+                              help='Profile the build, and write a report to REPORT (default: cactus-profile.json)')
+    parser_build.add_argument('--profile-top', type=int, default=20, metavar='N',
+                              help='Show the N slowest steps and items of the profile (default: 20)')
+
+    parser_bench = subparsers.add_parser('bench', help='Benchmark builds of a synthetic project.')
+    parser_bench.add_argument('-d', '--path', default=None,
+                              help='Where to generate the project (default: a temporary folder)')
+    parser_bench.add_argument('--pages', type=positive_int, default=100, help='The number of pages (default: 100)')
+    parser_bench.add_argument('--depth', type=int, default=3, help='The depth of template inheritance (default: 3)')
+    parser_bench.add_argument('--statics', type=int, default=20, help='The number of static files (default: 20)')
+    parser_bench.add_argument('--locales', type=int, default=0,
+                              help='The number of extra languages, this needs gettext (default: 0)')
+    parser_bench.add_argument('--fingerprint', default='css,js',
+                              help='The extensions to fingerprint, comma separated (default: css,js)')
+    parser_bench.add_argument('--repeat', type=positive_int, default=3,
+                              help='How many times to run each benchmark (default: 3)')
+    parser_bench.add_argument('--tags', type=int, default=10000,
+                              help='The number of tags to render for the tag benchmarks (default: 10000)')
+    parser_bench.add_argument('-o', '--output', help='Write the results to this file, as JSON')
+    parser_bench.set_defaults(target=cli.bench)
 
     parser_deploy = subparsers.add_parser('deploy', help='Deploy the current project to S3.')
     parser_deploy.set_defaults(target=cli.deploy)
@@ -102,6 +165,8 @@ def parse_arguments(cli, args):
     parser_serve.set_defaults(target=cli.serve)
     parser_serve.add_argument('-p', '--port', default=8000, type=int, help='The port on which to serve the site.')
     parser_serve.add_argument('-b', '--browser', action='store_true', help='Whether to open a browser for the site.')
+    parser_serve.add_argument('--on-demand', action='store_true',
+                              help='Only build pages and static files when they are requested.')
 
     parser_make_messages = subparsers.add_parser('messages:make',
                                                  help='Create translation files for the current project')
@@ -119,7 +184,7 @@ def parse_arguments(cli, args):
 
     config_parsers = [parser_build, parser_deploy, parser_serve, parser_make_messages, parser_domain_setup,
                       parser_domain_list, update_config]
-    all_parsers = config_parsers + [parser_create]
+    all_parsers = config_parsers + [parser_create, parser_bench]
 
     for subparser in config_parsers:
         subparser.add_argument('-c', '--config', action="append",
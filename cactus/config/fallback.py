@@ -26,6 +26,9 @@ class ConfigFallback(object):
     def has_key(self, key):
         return key in self.cnf
 
+    def dump(self):
+        return dict(self.cnf)
+
     def write(self):
         if self.cnf:
             logger.warning("Using config fallback, discarding config values: [%s]", ', '.join(self.cnf.keys()))
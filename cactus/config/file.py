@@ -26,6 +26,9 @@ class ConfigFile(object):
     def has_key(self, key):
         return key in self._data
 
+    def dump(self):
+        return dict(self._data)
+
     def load(self):
         self._data = {}
 
@@ -1,8 +1,11 @@
 #coding:utf-8
+import json
 import logging
 
+from cactus import dependencies
 from cactus.config.fallback import ConfigFallback
 from cactus.config.file import ConfigFile
+from cactus.utils.helpers import checksum
 
 
 logger = logging.getLogger(__name__)
@@ -55,6 +58,7 @@ class ConfigRouter(object):
         Return default if no config has it.
         """
         logger.debug("Searching for %s (nested:%s)", key, nested)
+        dependencies.record(dependencies.CONFIG, key)
         if nested:
             return self._get_nested(key, default)
         else:
@@ -80,6 +84,13 @@ class ConfigRouter(object):
         write_to.set(key, value)
         logger.debug("Set %s in %s", key, write_to.path)
 
+    def checksum(self):
+        """
+        A checksum of all the values in all the config files.
+        """
+        data = [config.dump() for config in self.configs]
+        return checksum(json.dumps(data, sort_keys=True, default=str).encode('utf-8'))
+
     def write(self):
         """
         Write the config files to the filesystem.
@@ -3,27 +3,38 @@ import subprocess
 from cactus.static.external import External
 
 
-class YUIJSOptimizer(External):
-    supported_extensions = ('js',)
-    output_extension = 'js'
+class YUIOptimizer(External):
+    """
+    YUI compressor can compress many files in one run, which saves starting a JVM for each of them.
+    """
+    batch_size = 50
+
+    @classmethod
+    def _run_batch(cls, externals):
+        if any(external.dst != external.src + '-alt' for external in externals):
+            # We can only name the outputs after the inputs
+            return super(YUIOptimizer, cls)._run_batch(externals)
+
+        subprocess.call([
+            'yuicompressor',
+            '--type', cls.output_extension,
+            '-o', '$:-alt',
+        ] + [external.src for external in externals])
 
     def _run(self):
         subprocess.call([
             'yuicompressor',
-            '--type', 'js',
+            '--type', self.output_extension,
             '-o', self.dst,
             self.src,
         ])
 
 
-class YUICSSOptimizer(External):
+class YUIJSOptimizer(YUIOptimizer):
+    supported_extensions = ('js',)
+    output_extension = 'js'
+
+
+class YUICSSOptimizer(YUIOptimizer):
     supported_extensions = ('css',)
     output_extension = 'css'
-
-    def _run(self):
-        subprocess.call([
-            'yuicompressor',
-            '--type', 'css',
-            '-o', self.dst,
-            self.src,
-        ])
@@ -0,0 +1,234 @@
+#coding:utf-8
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from cactus.utils.file import file_changed_hash
+from cactus.utils.helpers import checksum
+
+
+logger = logging.getLogger(__name__)
+
+
+# Kinds of dependencies a page can have
+FILE = 'file'  # A file on disk (the page itself, templates it extends or includes)
+CONFIG = 'config'  # A config key
+STATIC = 'static'  # A {% static %} lookup
+PAGE = 'page'  # A {% url %} lookup
+LISTING = 'listing'  # The list of pages or static files in the site context
+
+# CONFIG keys with this prefix are the keys of the config context (see ContextPlugin)
+CONTEXT_PREFIX = 'context.'
+
+
+_local = threading.local()
+
+
+@contextmanager
+def recording():
+    """
+    Record the dependencies used in this thread while in the block.
+    Yields the set of (kind, key) tuples that were recorded.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+
+    keys = set()
+    stack.append(keys)
+    try:
+        yield keys
+    finally:
+        stack.pop()
+
+
+def record(kind, key):
+    """
+    Record a dependency for the page currently being rendered in this thread, if any.
+    """
+    stack = getattr(_local, 'stack', None)
+    if stack:
+        stack[-1].add((kind, key))
+
+
+class RecordingDict(dict):
+    """
+    A dict that records which of its keys are accessed as LISTING dependencies.
+    Used for the site context, so that only pages that list pages or static files
+    depend on the site structure.
+    """
+    def __getitem__(self, key):
+        record(LISTING, key)
+        return super(RecordingDict, self).__getitem__(key)
+
+    def get(self, key, default=None):
+        record(LISTING, key)
+        return super(RecordingDict, self).get(key, default)
+
+
+class DependencyGraph(object):
+    """
+    Keeps track of what each page used while rendering, so that only the
+    pages affected by a change have to be rendered again.
+
+    Records are kept by page source path and only contain JSON-friendly values.
+    """
+    def __init__(self, site):
+        self.site = site
+        self.records = {}
+        self._values = {}
+
+    def clear(self):
+        """
+        Forget everything we know about the pages.
+        """
+        self.records = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the values we resolved for the current state of the site.
+        Must be called whenever the site could have changed (e.g. at the start of a build).
+        """
+        self._values = {}
+
+    def value(self, kind, key):
+        """
+        Resolve the current value of a dependency.
+        """
+        try:
+            return self._values[(kind, key)]
+        except KeyError:
+            # Looking up a value (e.g. a static URL) is not using it
+            with recording():
+                value = self._values[(kind, key)] = getattr(self, '_resolve_{0}'.format(kind))(key)
+            return value
+
+    def entry(self, kind, key):
+        """
+        What a record keeps of a dependency: its current value, and for files the digest of their
+        content too, so that files that were only touched (e.g. in a fresh checkout) don't count as changed.
+        """
+        value = self.value(kind, key)
+        if kind == FILE:
+            return [value, self.value('digest', key)]
+        return value
+
+    def changed(self, kind, key, entry):
+        """
+        Whether a dependency changed since its entry was made (see entry).
+        """
+        value = self.value(kind, key)
+        if kind != FILE:
+            return value != entry
+
+        stamp, digest = entry
+        if value == stamp:
+            return False
+        if value is None or self.value('digest', key) != digest:
+            return True
+
+        # Same content: the next build can tell from the stamp again
+        entry[0] = value
+        return False
+
+    def _resolve_file(self, path):
+        try:
+            return file_changed_hash(path)
+        except OSError:
+            return None
+
+    def _resolve_digest(self, path):
+        # Not a kind of dependency: what the content of a FILE dependency is
+        try:
+            return self.site.digests.get(path)
+        except (IOError, OSError):
+            return None
+
+    def _resolve_config(self, key):
+        if key.startswith(CONTEXT_PREFIX):
+            # Missing is not the same as None, the key could be added
+            name = key[len(CONTEXT_PREFIX):]
+            context = self.site.config.get('context', {}, nested=True)
+            value = [name in context, context.get(name)]
+        else:
+            # Look at every config file, the key could be merged (e.g. "context")
+            value = [config.get(key) for config in self.site.config.configs]
+        return checksum(json.dumps(value, sort_keys=True, default=str).encode('utf-8'))
+
+    def _resolve_static(self, link_url):
+        return self.site.get_url_for_static(link_url) or self.site.get_url_for_static_alias(link_url)
+
+    def _resolve_page(self, link_url):
+        return self.site.get_url_for_page(link_url) or self.site.get_url_for_page_alias(link_url)
+
+    def _resolve_listing(self, key):
+        if key == 'pages':
+            resources = [p for p in self.site.pages() if p.is_html()]
+        elif key == 'static':
+            resources = self.site.static()
+        else:
+            return None
+        # Listings are mostly used for links, which change with the final URLs (e.g. fingerprints)
+        return checksum('\n'.join(sorted('{0} {1}'.format(r.link_url, r.final_url) for r in resources)).encode('utf-8'))
+
+    def commit(self, page, keys, output=None):
+        """
+        Store the dependencies recorded while building a page.
+
+        :param output: The checksum of the page output, if it was not discarded.
+        """
+        dependencies = {}
+        for kind, key in keys:
+            dependencies.setdefault(kind, {})[key] = self.entry(kind, key)
+
+        self.records[page.source_path] = {
+            'build_path': page.build_path,
+            'discarded': page.discarded,
+            'output': output,
+            'dependencies': dependencies,
+        }
+
+    def is_stale(self, page):
+        """
+        Whether the page needs to be rendered again.
+        """
+        record = self.records.get(page.source_path)
+        if record is None:
+            return True
+
+        if not record['discarded'] and not os.path.exists(page.full_build_path):
+            return True
+
+        for kind, values in record['dependencies'].items():
+            for key, value in values.items():
+                if self.changed(kind, key, value):
+                    logger.debug('%s changed for %s: %s', kind, page.source_path, key)
+                    return True
+
+        return False
+
+    def stale(self, pages):
+        """
+        :returns: The pages that need to be rendered again.
+        """
+        return [page for page in pages if self.is_stale(page)]
+
+    def removed(self, pages):
+        """
+        Forget the pages that are gone from the site.
+
+        :returns: The build paths of the pages that were removed.
+        """
+        current = set(page.source_path for page in pages)
+        build_paths = []
+
+        for source_path in list(self.records.keys()):
+            if source_path not in current:
+                record = self.records.pop(source_path)
+                if not record['discarded']:
+                    build_paths.append(record['build_path'])
+
+        return build_paths
@@ -0,0 +1,127 @@
+#coding:utf-8
+import os
+import json
+import time
+import logging
+
+from cactus.utils.file import calculate_file_checksum, new_hasher
+
+
+logger = logging.getLogger(__name__)
+
+
+DIGESTS_FILENAME = '.cactus-digests'
+
+# Bump this when the structure of the file changes
+DIGESTS_VERSION = 1
+
+# Files modified this recently could still change without their mtime changing
+# (coarse filesystem timestamps), so their digest is not kept.
+RACY_DELAY = 2
+
+MAX_ENTRIES = 100000
+
+
+class DigestCache(object):
+    """
+    The digests of files, persisted across runs so that unchanged files are never hashed again.
+
+    Entries are keyed by device and inode, and are valid for as long as the size and
+    modification time do not change. So a renamed or hard linked file is not hashed again either.
+    """
+    def __init__(self, path, algorithm='md5', max_entries=MAX_ENTRIES):
+        new_hasher(algorithm)  # Fail early on unknown algorithms
+
+        self.path = path
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._entries = None
+        self._changed = False
+        self._generation = 0
+
+    def _key(self, info):
+        return '{0}:{1}'.format(info.st_dev, info.st_ino)
+
+    def load(self):
+        """
+        Load the digests from disk. A missing or invalid file is an empty one.
+        """
+        self._entries = {}
+        self._changed = False
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except IOError:
+            logger.debug("No digests at %s", self.path)
+            return
+        except ValueError:
+            logger.warning("Ignoring invalid digests at %s", self.path)
+            return
+
+        if data.get('version') != DIGESTS_VERSION or data.get('algorithm') != self.algorithm:
+            logger.debug("Ignoring outdated digests at %s", self.path)
+            return
+
+        self._generation = data['generation']
+        self._entries = data['entries']
+
+    def get(self, path):
+        """
+        :returns: The digest of the file at path, hashing it only if it changed since it was last hashed.
+        """
+        if self._entries is None:
+            self.load()
+
+        info = os.stat(path)
+        key = self._key(info)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == info.st_size and entry[1] == info.st_mtime_ns:
+            if entry[3] != self._generation:
+                entry[3] = self._generation
+                self._changed = True
+            return entry[2]
+
+        digest = calculate_file_checksum(path, self.algorithm)
+
+        if time.time() - info.st_mtime > RACY_DELAY:
+            self._entries[key] = [info.st_size, info.st_mtime_ns, digest, self._generation]
+            self._changed = True
+
+        return digest
+
+    def write(self):
+        """
+        Save the digests, if anything changed. The entries that were not used for the longest
+        time are dropped if there are more than max_entries.
+        """
+        if not self._changed:
+            return
+
+        entries = self._entries
+        if len(entries) > self.max_entries:
+            kept = sorted(entries.items(), key=lambda item: item[1][3], reverse=True)[:self.max_entries]
+            entries = dict(kept)
+
+        data = {
+            'version': DIGESTS_VERSION,
+            'algorithm': self.algorithm,
+            'generation': self._generation + 1,
+            'entries': entries,
+        }
+
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+        # Other processes (e.g. building other languages) may write at the same time
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+        self._generation += 1
+        self._changed = False
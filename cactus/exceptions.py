@@ -5,3 +5,10 @@ class InvalidCredentials(Exception):
     Raised when invalid credentials are used to connect.
     """
     pass
+
+
+class BuildCancelled(Exception):
+    """
+    Raised at a safe point of a build that was cancelled (because what it builds changed again).
+    """
+    pass
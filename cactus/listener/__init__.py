@@ -10,5 +10,9 @@ logger = logging.getLogger(__name__)
 try:
     from cactus.listener.mac import FSEventsListener as Listener
 except (ImportError, OSError):
-    logger.debug("Failed to load FSEventsListener, falling back to PollingListener", exc_info=True)
-    Listener = PollingListener
+    logger.debug("Failed to load FSEventsListener, trying InotifyListener", exc_info=True)
+    try:
+        from cactus.listener.inotify import InotifyListener as Listener
+    except (ImportError, OSError, AttributeError):
+        logger.debug("Failed to load InotifyListener, falling back to PollingListener", exc_info=True)
+        Listener = PollingListener
@@ -0,0 +1,46 @@
+#coding:utf-8
+
+
+KINDS = ('added', 'deleted', 'changed')
+
+
+def merge(changes, path, kind):
+    """
+    Add a change to a dict of path -> kind, so a file that was added then deleted
+    was never there, and a file that was deleted then added was changed.
+    """
+    previous = changes.get(path)
+
+    if previous is None:
+        changes[path] = kind
+    elif kind == 'deleted':
+        if previous == 'added':
+            del changes[path]
+        else:
+            changes[path] = 'deleted'
+    elif kind == 'added':
+        changes[path] = 'changed' if previous == 'deleted' else previous
+    elif previous == 'deleted':
+        changes[path] = 'changed'
+
+
+def merge_result(changes, result):
+    """
+    Add the changes reported to a listener callback to a dict of path -> kind.
+    """
+    for kind in KINDS:
+        for path in result[kind]:
+            merge(changes, path, kind)
+
+
+def to_result(changes):
+    """
+    :returns: The changes in a dict of path -> kind, as they are reported to a listener callback.
+    """
+    result = dict((kind, []) for kind in KINDS)
+
+    for path, kind in sorted(changes.items()):
+        result[kind].append(path)
+
+    result['any'] = result['added'] + result['deleted'] + result['changed']
+    return result
@@ -0,0 +1,327 @@
+#coding:utf-8
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+from cactus.listener.changes import merge, to_result
+
+
+logger = logging.getLogger(__name__)
+
+
+if not sys.platform.startswith('linux'):
+    raise ImportError("inotify is only available on Linux")
+
+libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+
+# Raises AttributeError on a libc without inotify
+inotify_init1 = libc.inotify_init1
+inotify_init1.argtypes = [ctypes.c_int]
+inotify_init1.restype = ctypes.c_int
+
+inotify_add_watch = libc.inotify_add_watch
+inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+inotify_add_watch.restype = ctypes.c_int
+
+inotify_rm_watch = libc.inotify_rm_watch
+inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+inotify_rm_watch.restype = ctypes.c_int
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+FOLDER_MASK = (IN_CREATE | IN_DELETE | IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB |
+               IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+# Watches on symlinked files, that follow the file the link points to
+FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB | IN_DELETE_SELF
+
+EVENT = struct.Struct('iIII')
+
+# Make sure the inotify syscalls are allowed here (they may not be, in some containers)
+_fd = inotify_init1(IN_CLOEXEC)
+if _fd < 0:
+    raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+os.close(_fd)
+
+
+class InotifyListener(object):
+    """
+    Watches a folder with inotify: there is one watch per folder (and per symlinked file),
+    new folders are watched as they appear, so nothing gets polled.
+
+    Changes are grouped for delay seconds, and are passed to f like PollingListener does.
+    Files and folders for which ignore returns True, and hidden ones, are not watched.
+    """
+    def __init__(self, path, f, delay = .5, ignore = None):
+        self.path = path
+        self.f = f
+        self.delay = delay
+        self.ignore = ignore
+
+        self._fd = None
+        self._pause = False
+        self._stopped = False
+        self._lock = threading.RLock()
+
+        self._watches = {}  # wd -> [path]
+        self._paths = {}  # path -> wd
+        self._folders = set()
+        self._files = set()
+
+    def _ignored(self, path, name):
+        if name.startswith('.'):
+            return True
+        return bool(self.ignore and self.ignore(path))
+
+    def _add_watch(self, path, mask):
+        wd = inotify_add_watch(self._fd, os.fsencode(path), mask)
+
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                logger.warning("Not watching %s: out of inotify watches, raise fs.inotify.max_user_watches", path)
+            elif error not in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                logger.warning("Not watching %s: %s", path, os.strerror(error))
+            return False
+
+        paths = self._watches.setdefault(wd, [])
+        if path not in paths:
+            paths.append(path)
+        self._paths[path] = wd
+        return True
+
+    def _remove_watches(self, path):
+        prefix = path + os.sep
+
+        for watched in [p for p in self._paths if p == path or p.startswith(prefix)]:
+            wd = self._paths.pop(watched)
+            paths = self._watches.get(wd, [])
+            if watched in paths:
+                paths.remove(watched)
+            if not paths:
+                self._watches.pop(wd, None)
+                inotify_rm_watch(self._fd, wd)
+
+        self._folders = set(p for p in self._folders if not (p == path or p.startswith(prefix)))
+
+    def _watch(self, path, changes=None, seen=None):
+        """
+        Watch a folder and everything in it (following symlinks).
+        The files found are added to changes, if given.
+        """
+        seen = seen if seen is not None else set()
+
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            return
+        seen.add(real_path)
+
+        if not self._add_watch(path, FOLDER_MASK):
+            return
+        self._folders.add(path)
+
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            return
+
+        for entry in entries:
+            if self._ignored(entry.path, entry.name):
+                continue
+            try:
+                is_folder = entry.is_dir()
+            except OSError:
+                continue
+
+            if is_folder:
+                self._watch(entry.path, changes, seen)
+            else:
+                self._found(entry.path, changes)
+
+    def _found(self, path, changes):
+        if changes is not None:
+            merge(changes, path, 'changed' if path in self._files else 'added')
+        self._files.add(path)
+
+        if os.path.islink(path):
+            self._add_watch(path, FILE_MASK)
+
+    def _lost(self, path, changes):
+        prefix = path + os.sep
+
+        for lost in [p for p in self._files if p == path or p.startswith(prefix)]:
+            self._files.discard(lost)
+            merge(changes, lost, 'deleted')
+
+        self._remove_watches(path)
+
+    def _read(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except (BlockingIOError, InterruptedError):
+            return []
+
+        events = []
+        offset = 0
+
+        while offset + EVENT.size <= len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+
+        return events
+
+    def _process(self, events, changes):
+        for wd, mask, name in events:
+
+            if mask & IN_Q_OVERFLOW:
+                logger.debug("InotifyListener: queue overflow, rescanning %s", self.path)
+                self._rescan(changes)
+                continue
+
+            if mask & IN_IGNORED:
+                for path in self._watches.pop(wd, []):
+                    self._paths.pop(path, None)
+                continue
+
+            for watched in list(self._watches.get(wd, [])):
+
+                if not name:
+                    # The watched item itself: only symlinked files matter here
+                    if watched not in self._folders and mask & (IN_MODIFY | IN_CLOSE_WRITE | IN_ATTRIB):
+                        merge(changes, watched, 'changed')
+                    continue
+
+                path = os.path.join(watched, name)
+
+                if self._ignored(path, name):
+                    continue
+
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # A symlink to a folder is not flagged IN_ISDIR
+                    if mask & IN_ISDIR or os.path.isdir(path):
+                        self._watch(path, changes)
+                    else:
+                        self._found(path, changes)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._lost(path, changes)
+                elif not mask & IN_ISDIR:
+                    self._files.add(path)
+                    merge(changes, path, 'changed')
+
+    def _rescan(self, changes):
+        """
+        Events were lost, watch everything again and consider every file changed.
+        """
+        previous = self._files
+
+        for wd in list(self._watches):
+            inotify_rm_watch(self._fd, wd)
+
+        self._watches, self._paths, self._folders, self._files = {}, {}, set(), set()
+        self._watch(self.path)
+
+        for path in previous - self._files:
+            merge(changes, path, 'deleted')
+        for path in self._files:
+            merge(changes, path, 'changed' if path in previous else 'added')
+
+    def _drain(self):
+        """
+        Read the pending events, keeping the watches up to date, but forget the changes.
+        """
+        while True:
+            events = self._read()
+            if not events:
+                return
+            self._process(events, {})
+
+    def run(self):
+        logger.debug("Using inotify")
+
+        fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        with self._lock:
+            self._fd = fd
+            self._watch(self.path)
+
+        t = threading.Thread(target=self._loop)
+        t.daemon = True
+        t.start()
+
+    def pause(self):
+        self._pause = True
+
+    def resume(self):
+        with self._lock:
+            if self._fd is not None:
+                self._drain()
+            self._pause = False
+
+    def stop(self):
+        self._stopped = True
+
+    def _wait(self, timeout):
+        try:
+            return bool(select.select([self._fd], [], [], timeout)[0])
+        except InterruptedError:
+            return False
+
+    def _loop(self):
+        changes = {}
+        deadline = None
+
+        try:
+            while not self._stopped:
+                timeout = 1.0 if deadline is None else max(0, deadline - time.time())
+
+                if self._wait(timeout):
+                    with self._lock:
+                        if self._pause:
+                            self._drain()
+                            continue
+                        self._process(self._read(), changes)
+
+                    if changes and deadline is None:
+                        deadline = time.time() + self.delay
+
+                if deadline is not None and time.time() >= deadline:
+                    deadline = None
+                    if changes and not self._pause:
+                        self._notify(changes)
+                    changes = {}
+        finally:
+            os.close(self._fd)
+
+    def _notify(self, changes):
+        try:
+            self.f(to_result(changes))
+        except Exception:
+            logger.exception("Error while handling changes")
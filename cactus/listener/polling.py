@@ -4,37 +4,170 @@ import time
 import threading
 import logging
 
-import six
-
-from cactus.utils.filesystem import fileList
 from cactus.utils.network import retry
 
+
+logger = logging.getLogger(__name__)
+
+
+# The share of the time polling may spend checking the files: checks are
+# done less often on trees where they take long.
+CPU_BUDGET = 0.05
+
+# Folders modified this recently could still change without their mtime
+# changing (coarse filesystem timestamps), so they are listed again.
+RACY_DELAY_NS = 2 * 10 ** 9
+
+
+class Folder(object):
+    __slots__ = ('mtime', 'files', 'folders', 'racy')
+
+    def __init__(self, mtime, files, folders, listed):
+        self.mtime = mtime
+        self.files = files
+        self.folders = folders
+        self.racy = listed - mtime < RACY_DELAY_NS
+
+
 class PollingListener(object):
+    """
+    Watches a folder by checking the modification time of its folders every delay
+    seconds: only folders where files were added, deleted or renamed (e.g. saved by
+    an editor that writes a new file then renames it) are listed again.
+
+    The files themselves are checked in a full sweep, as often as CPU_BUDGET allows
+    (every delay seconds on small trees) to catch files that are changed in place.
+
+    Files and folders for which ignore returns True, and hidden ones, are skipped.
+    """
     def __init__(self, path, f, delay = .5, ignore = None):
         self.path = path
         self.f = f
         self.delay = delay
         self.ignore = ignore
         self._pause = False
-        self._checksums = {}
-
-    def checksums(self):
-        checksumMap = {}
-
-        for f in fileList(self.path):
-
-            if f.startswith('.'):
-                continue
-
-            if self.ignore and self.ignore(f):
+        self._stopped = False
+        self._lock = threading.RLock()
+
+        self._folders = {}  # path -> Folder
+        self._checksums = {}  # path -> (st_mtime_ns, st_size)
+
+        self._interval = delay
+        self._sweep_interval = delay
+        self._last_sweep = 0
+
+    def _ignored(self, path, name):
+        if name.startswith('.'):
+            return True
+        return bool(self.ignore and self.ignore(path))
+
+    def _list(self, path, changes):
+        """
+        List a folder, and report the files that changed in it.
+        """
+        files, folders = set(), set()
+
+        try:
+            entries = list(os.scandir(path))
+        except OSError:
+            entries = []
+
+        for entry in entries:
+            if self._ignored(entry.path, entry.name):
                 continue
 
             try:
-                checksumMap[f] = int(os.stat(f).st_mtime)
+                if entry.is_dir():
+                    folders.add(entry.path)
+                    continue
+                # Follows symlinks
+                info = entry.stat()
             except OSError:
                 continue
 
-        return checksumMap
+            files.add(entry.path)
+            checksum = (info.st_mtime_ns, info.st_size)
+
+            previous = self._checksums.get(entry.path)
+            if previous is None:
+                changes['added'].append(entry.path)
+            elif previous != checksum:
+                changes['changed'].append(entry.path)
+
+            self._checksums[entry.path] = checksum
+
+        return files, folders
+
+    def _forget(self, path, changes):
+        """
+        Drop a folder that is gone, and report the files it had as deleted.
+        """
+        folder = self._folders.pop(path, None)
+        if folder is None:
+            return
+
+        for file_path in folder.files:
+            del self._checksums[file_path]
+            changes['deleted'].append(file_path)
+
+        for folder_path in folder.folders:
+            self._forget(folder_path, changes)
+
+    def _visit(self, path, full, changes, parents=()):
+        try:
+            info = os.stat(path)
+        except OSError:
+            self._forget(path, changes)
+            return
+
+        # Don't loop on symlinks to a parent folder
+        inode = (info.st_dev, info.st_ino)
+        if inode in parents:
+            return
+
+        folder = self._folders.get(path)
+
+        if folder is None or full or folder.racy or folder.mtime != info.st_mtime_ns:
+            listed = time.time_ns()
+            files, folders = self._list(path, changes)
+
+            if folder is not None:
+                for file_path in folder.files - files:
+                    del self._checksums[file_path]
+                    changes['deleted'].append(file_path)
+
+                for folder_path in folder.folders - folders:
+                    self._forget(folder_path, changes)
+
+            folder = self._folders[path] = Folder(info.st_mtime_ns, files, folders, listed)
+
+        for folder_path in folder.folders:
+            self._visit(folder_path, full, changes, parents + (inode,))
+
+    def check(self, full=False):
+        """
+        Look for changes, in the modified folders only unless full is True.
+
+        :returns: The changes, in a dict of added, deleted, changed and any.
+        """
+        changes = {
+            'added': [],
+            'deleted': [],
+            'changed': [],
+        }
+
+        with self._lock:
+            self._visit(self.path, full, changes)
+
+        changes['any'] = changes['added'] + changes['deleted'] + changes['changed']
+        return changes
+
+    def checksums(self):
+        """
+        :returns: The modification time (in nanoseconds) of every file.
+        """
+        self.check(full=True)
+        return dict((path, checksum[0]) for path, checksum in self._checksums.items())
 
     def run(self):
         # self._loop()
@@ -46,41 +179,40 @@ class PollingListener(object):
         self._pause = True
 
     def resume(self):
-        self._checksums = self.checksums()
+        # Forget about what changed while paused
+        self.check()
         self._pause = False
 
+    def stop(self):
+        self._stopped = True
+
     def _loop(self):
-        self._checksums = self.checksums()
+        self._sweep()
 
-        while True:
+        while not self._stopped:
             self._run()
 
+    def _sweep(self):
+        # CPU time of this thread: waiting for other threads (e.g. a build) doesn't count
+        start = time.thread_time()
+        changes = self.check(full=True)
+        duration = time.thread_time() - start
+
+        self._last_sweep = time.time()
+        self._sweep_interval = max(self.delay, duration / CPU_BUDGET)
+        return changes
+
     @retry((Exception,), tries = 5, delay = 0.5)
     def _run(self):
         if not self._pause:
-            oldChecksums = self._checksums
-            newChecksums = self.checksums()
-
-            result = {
-                'added': [],
-                'deleted': [],
-                'changed': [],
-            }
-
-            for k, v in six.iteritems(oldChecksums):
-                if k not in newChecksums:
-                    result['deleted'].append(k)
-                elif v != newChecksums[k]:
-                    result['changed'].append(k)
-
-            for k, v in six.iteritems(newChecksums):
-                if k not in oldChecksums:
-                    result['added'].append(k)
-
-            result['any'] = result['added'] + result['deleted'] + result['changed']
-
-            if result['any']:
-                self._checksums = newChecksums
+            if time.time() - self._last_sweep >= self._sweep_interval:
+                result = self._sweep()
+            else:
+                start = time.thread_time()
+                result = self.check()
+                self._interval = max(self.delay, (time.thread_time() - start) / CPU_BUDGET)
+
+            if result['any'] and not self._pause:
                 self.f(result)
 
-        time.sleep(self.delay)
+        time.sleep(self._interval)
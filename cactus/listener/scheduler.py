@@ -0,0 +1,150 @@
+#coding:utf-8
+import logging
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from cactus.exceptions import BuildCancelled
+from cactus.listener.changes import merge_result, to_result
+
+
+logger = logging.getLogger(__name__)
+
+
+class RebuildScheduler(object):
+    """
+    Runs rebuilds for the changes reported by a listener, one at a time, from the IOLoop
+    of the web server: rebuilds run in an executor, and their results come back on the
+    loop, where it's safe to talk to the browsers.
+
+    Changes are merged until none came for debounce seconds (or for at most max_delay
+    seconds), so a burst of changes (e.g. a git checkout) is a single rebuild. Changes
+    that come during a rebuild set the cancelled event: the build stops at its next safe
+    point, and starts again with the changes it had merged with the new ones.
+
+    :param rebuild: Called in the executor with the changes (like listener callbacks), may raise BuildCancelled.
+    :param done: Called on the loop with the changes and what rebuild returned, once it finished.
+    """
+    def __init__(self, rebuild, done=None, debounce=.2, max_delay=2):
+        self.rebuild = rebuild
+        self.done = done
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.cancelled = threading.Event()
+
+        self._io_loop = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix='cactus-rebuild')
+        self._lock = threading.Lock()
+        self._pending = {}  # path -> kind
+        self._first = None
+        self._last = None
+        self._timeout = None
+        self._building = False
+        self._stopped = False
+
+    def start(self, io_loop):
+        """
+        Start running rebuilds from io_loop (a Tornado IOLoop).
+        """
+        self._io_loop = io_loop
+        self._io_loop.add_callback(self._schedule)
+
+    def stop(self):
+        self._stopped = True
+        self.cancelled.set()
+        self._executor.shutdown(wait=False)
+
+    def add(self, changes):
+        """
+        Schedule a rebuild for changes, cancelling the current one if any. Use this as the listener
+        callback: it can be called from any thread.
+        """
+        with self._lock:
+            merge_result(self._pending, changes)
+
+            if self._first is None:
+                self._first = self._now()
+            self._last = self._now()
+
+            if self._building:
+                logger.debug("Cancelling the current build")
+                self.cancelled.set()
+
+        if self._io_loop is not None:
+            self._io_loop.add_callback(self._schedule)
+
+    def idle(self):
+        """
+        :returns: Whether nothing is being built, or waiting to be built.
+        """
+        with self._lock:
+            return not self._building and not self._pending
+
+    def _now(self):
+        # Listeners may add changes before we know our loop
+        if self._io_loop is None:
+            return 0
+        return self._io_loop.time()
+
+    def _schedule(self):
+        """
+        Run the pending changes once they settled (on the loop).
+        """
+        with self._lock:
+            if self._stopped or self._building or not self._pending:
+                return
+            deadline = min(self._last + self.debounce, self._first + self.max_delay)
+
+        if self._timeout is not None:
+            self._io_loop.remove_timeout(self._timeout)
+        self._timeout = self._io_loop.call_at(deadline, self._run)
+
+    def _run(self):
+        self._timeout = None
+
+        with self._lock:
+            if self._stopped or self._building or not self._pending:
+                return
+
+            if self._now() < min(self._last + self.debounce, self._first + self.max_delay):
+                # More changes came since we were scheduled
+                self._io_loop.add_callback(self._schedule)
+                return
+
+            changes = to_result(self._pending)
+            self._pending, self._first, self._last = {}, None, None
+
+            self.cancelled.clear()
+            self._building = True
+
+        future = self._io_loop.run_in_executor(self._executor, self.rebuild, changes)
+        self._io_loop.add_future(future, functools.partial(self._finished, changes))
+
+    def _finished(self, changes, future):
+        with self._lock:
+            self._building = False
+
+        try:
+            result = future.result()
+        except BuildCancelled:
+            logger.info("*** Build cancelled, files changed again")
+
+            with self._lock:
+                # Keep the order of the changes, ours came first
+                pending = {}
+                merge_result(pending, changes)
+                merge_result(pending, to_result(self._pending))
+                self._pending = pending
+
+                if self._first is None:
+                    self._first = self._last = self._now()
+        except Exception:
+            logger.exception("Error while rebuilding")
+        else:
+            if self.done is not None:
+                try:
+                    self.done(changes, result)
+                except Exception:
+                    logger.exception("Error after rebuilding")
+
+        self._schedule()
@@ -0,0 +1,134 @@
+#coding:utf-8
+import os
+import json
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_FILENAME = '.cactus-manifest'
+
+# Bump this when the structure of the manifest changes
+MANIFEST_VERSION = 5
+
+
+class Manifest(object):
+    """
+    What we know about a build folder, persisted across runs so that a new
+    process can skip the static files and pages that did not change.
+
+    - environment: a checksum of everything that can affect every file in the build
+    - dependencies: kind -> key -> value, for what was used outside of the pages (see `cactus.dependencies`)
+    - static: static path -> source stamp and digest, fingerprint checksum, final name and output hash
+    - pages: page source path -> dependency record (see `cactus.dependencies`)
+    - urls: link_url -> final_url for every page and static file
+    - outputs: build path -> checksum, for every file we wrote to the build folder
+
+    Outputs that are about to be written are listed in a journal next to the manifest
+    (see forget_outputs), that is only cleared once the manifest is written again.
+    """
+    def __init__(self, build_path):
+        self.path = os.path.join(build_path, MANIFEST_FILENAME)
+        self.journal_path = self.path + '.journal'
+        self.clear()
+
+    def clear(self):
+        self.outputs = {}
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forget everything but the outputs: those still describe what is in the build folder.
+        """
+        self.environment = None
+        self.dependencies = {}
+        self.static = {}
+        self.pages = {}
+        self.urls = {}
+
+    def load(self):
+        """
+        Load the manifest from the build folder. A missing or invalid manifest is an empty one.
+        """
+        self.clear()
+
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except IOError:
+            logger.debug("No build manifest at %s", self.path)
+            return
+        except ValueError:
+            logger.warning("Ignoring invalid build manifest at %s", self.path)
+            return
+
+        if data.get('version') != MANIFEST_VERSION:
+            logger.debug("Ignoring outdated build manifest at %s", self.path)
+            return
+
+        self.environment = data['environment']
+        self.dependencies = data['dependencies']
+        self.static = data['static']
+        self.pages = data['pages']
+        self.urls = data['urls']
+        self.outputs = data['outputs']
+
+        # A build wrote these, but stopped before writing the manifest: we don't know what they hold,
+        # nor what they were built from
+        try:
+            with open(self.journal_path) as f:
+                written = set(line.rstrip('\n') for line in f)
+        except IOError:
+            written = set()
+
+        if written:
+            for build_path in written:
+                self.outputs.pop(build_path, None)
+
+            self.pages = dict((source_path, record) for source_path, record in self.pages.items()
+                              if record['build_path'] not in written)
+            self.static = dict((path, entry) for path, entry in self.static.items()
+                               if os.path.join('static', os.path.dirname(path), entry['final_name']) not in written)
+
+    def forget_outputs(self, build_paths):
+        """
+        Record that files are about to be written to the build folder: until the manifest is
+        written again, their checksum in the outputs can't tell what is on disk (the build
+        could stop halfway, e.g. on an error or when cancelled).
+        """
+        if not build_paths:
+            return
+
+        # A single append, so builds in other processes can write to the journal too
+        data = ''.join('{0}\n'.format(build_path) for build_path in build_paths).encode('utf-8')
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def write(self):
+        """
+        Write the manifest to the build folder.
+        We write to a temporary file first so we never leave a partial manifest behind.
+        """
+        data = {
+            'version': MANIFEST_VERSION,
+            'environment': self.environment,
+            'dependencies': self.dependencies,
+            'static': self.static,
+            'pages': self.pages,
+            'urls': self.urls,
+            'outputs': self.outputs,
+        }
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+        try:
+            os.remove(self.journal_path)
+        except OSError:
+            pass
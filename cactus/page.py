@@ -6,17 +6,27 @@ import yaml
 
 from six.moves import urllib
 
-from django.template import Template, Context
+from django.template import Context
+from cactus import dependencies, profiler, template_stream
 from cactus.compat.paths import PageCompatibilityLayer
+from cactus.utils.file import calculate_file_checksum, copy_if_changed, write_chunks_if_changed
 from cactus.utils.url import ResourceURLHelperMixin
 
 
 logger = logging.getLogger(__name__)
 
 
+# Use the C YAML parser when it's available
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
+
 class Page(PageCompatibilityLayer, ResourceURLHelperMixin):
 
     discarded = False
+    _split = None
 
     def __init__(self, site, source_path):
         self.site = site
@@ -68,6 +78,9 @@ class Page(PageCompatibilityLayer, ResourceURLHelperMixin):
         return os.path.join(self.site.build_path, self.build_path)
 
     def data(self):
+        # Pages can read other pages (e.g. a list of posts with their title)
+        dependencies.record(dependencies.FILE, self.full_source_path)
+
         with io.FileIO(self.full_source_path, 'r') as f:
             try:
                 return f.read().decode('utf-8')
@@ -75,19 +88,39 @@ class Page(PageCompatibilityLayer, ResourceURLHelperMixin):
                 logger.warning("Template engine could not process page: %s", self.path, exc_info=True)
                 return u""
 
+    def split(self):
+        """
+        The page context (from the page header) and the page body.
+
+        The source is only read and parsed again when its mtime or size changes.
+        """
+        dependencies.record(dependencies.FILE, self.full_source_path)
+
+        info = os.stat(self.full_source_path)
+        stamp = (info.st_mtime_ns, info.st_size)
+
+        if self._split is None or self._split[0] != stamp:
+            self._split = (stamp,) + self.parse_context(self.data())
+
+        _, page_context, body = self._split
+        return dict(page_context), body
+
     def context(self, data=None, extra=None):
         """
         The page context.
         """
-        if extra is None:
-            extra = {}
+        if data:
+            page_context, _ = self.parse_context(data)
+        else:
+            page_context, _ = self.split()
 
-        context = {'__CACTUS_CURRENT_PAGE__': self,}
+        return self._context(page_context, extra)
 
-        page_context, data = self.parse_context(data or self.data())
+    def _context(self, page_context, extra=None):
+        context = {'__CACTUS_CURRENT_PAGE__': self,}
 
         context.update(self.site.context())
-        context.update(extra)
+        context.update(extra or {})
         context.update(page_context)
 
         return Context(context)
@@ -96,38 +129,72 @@ class Page(PageCompatibilityLayer, ResourceURLHelperMixin):
         """
         Takes the template data with context and renders it to the final output file.
         """
+        return u''.join(self.render_chunks())
 
-        data = self.data()
-        context = self.context(data=data)
-
-        # This is not very nice, but we already used the header context in the
-        # page context, so we don't need it anymore.
-        page_context, data = self.parse_context(data)
+    def render_chunks(self):
+        """
+        Like render, but returns the output as an iterable of strings, that are only rendered as
+        they are consumed. The preBuildPage plugins (which can discard the page) run right away.
+        """
+        page_context, data = self.split()
+        context = self._context(page_context)
 
         context, data = self.site.plugin_manager.preBuildPage(
             self.site, self, context, data)
-        return Template(data).render(context)
+
+        chunks = template_stream.stream(self.site.page_template(self, data), context)
+        return self.site.plugin_manager.postRenderPage(self, chunks)
 
     def build(self):
         """
         Save the rendered output to the output file.
         """
         logger.debug('Building {0} --> {1}'.format(self.source_path, self.final_url))  #TODO: Fix inconsistency w/ static
-        data = self.render()  #TODO: This calls preBuild indirectly. Not great.
 
-        if not self.discarded:
+        cached_path, keys, output = None, None, None
+        render_cache = self.site.render_cache
+        previous = self.site.manifest.outputs.get(self.build_path)
+        if previous is not None:
+            self.site.manifest.forget_outputs([self.build_path])
 
-            # Make sure a folder for the output path exists
-            try:
-                os.makedirs(os.path.dirname(self.full_build_path))
-            except OSError:
-                pass
+        if render_cache is not None:
+            cached_path, keys = render_cache.get(self)
 
-            with io.FileIO(self.full_build_path, 'w') as f:
-                f.write(data.encode('utf-8'))
+        if cached_path is not None:
+            try:
+                with profiler.measure(profiler.WRITE, 'page', self.build_path):
+                    output = calculate_file_checksum(cached_path, self.site.digests.algorithm)
+                    copy_if_changed(cached_path, self.full_build_path, output, previous)
+            except (IOError, OSError):
+                # The entry was evicted in the meantime
+                cached_path, output = None, None
+
+        if cached_path is None:
+            # The page is rendered while it's written, so we need to record until then
+            with dependencies.recording() as keys:
+                dependencies.record(dependencies.FILE, self.full_source_path)
+                with profiler.measure(profiler.RENDER, 'page', self.source_path):
+                    chunks = self.render_chunks()  #TODO: This calls preBuild indirectly. Not great.
+
+                if not self.discarded:
+                    chunks = profiler.measure_iter(profiler.RENDER, 'page', self.source_path, chunks)
+
+                    with profiler.measure(profiler.WRITE, 'page', self.build_path):
+                        written, output = write_chunks_if_changed(
+                            self.full_build_path, (chunk.encode('utf-8') for chunk in chunks), previous,
+                            self.site.digests.algorithm)
+
+                    if not written:
+                        logger.debug('Output unchanged for %s', self.source_path)
+
+            if render_cache is not None and not self.discarded:
+                render_cache.set(self, keys, self.full_build_path)
 
+        if not self.discarded:
             self.site.plugin_manager.postBuildPage(self)
 
+        self.site.dependencies.commit(self, keys, output)
+
     def parse_context(self, data, splitChar=':'):
         """
         Values like
@@ -170,7 +237,7 @@ class Page(PageCompatibilityLayer, ResourceURLHelperMixin):
         if parsing_yaml:
             [raw_yaml, template] = data.split('...', 1)
             try:
-                return yaml.load(raw_yaml), template
+                return yaml.load(raw_yaml, Loader=YAMLLoader) or {}, template
             except Exception as e:
                 # Safety return
                 return {}, template
@@ -1,4 +1,19 @@
 #coding:utf-8
+from django.template.context import ContextDict
+
+from cactus import dependencies
+
+
+class ConfigContextDict(ContextDict):
+    """
+    The config context, as a layer of a page context. The keys looked up in it are recorded as
+    CONFIG dependencies of the page, whether they are found or not (they could be added), so
+    that changing a key only renders the pages that use it again.
+    """
+    def __contains__(self, key):
+        dependencies.record(dependencies.CONFIG, dependencies.CONTEXT_PREFIX + key)
+        return super(ConfigContextDict, self).__contains__(key)
+
 
 class ContextPlugin(object):
     """
@@ -11,13 +26,15 @@ class ContextPlugin(object):
         """
         Load the context from the config
         """
-        self.context = site.config.get("context", {}, nested=True)
+        # Pages depend on the keys they use, not on the whole context
+        with dependencies.recording():
+            self.context = site.config.get("context", {}, nested=True)
 
     def preBuildPage(self, page, context, data):
         """
         Update the page context with the config context
         """
-        context.update(self.context)
+        ConfigContextDict(context, self.context)
 
         return context, data
 
@@ -13,6 +13,18 @@ def preBuildPage(page, context, data):
     return context, data
 
 
+def postRenderPage(page, chunks):
+    """
+    Called while rendering a page, to post-process its output.
+
+    :param page: The page being rendered
+    :param chunks: The rendered output, as an iterable of strings.
+    :returns: The modified (or not) output, as an iterable of strings. Process it chunk by chunk (e.g. with a
+              generator) rather than joining it, to keep memory usage low for large pages.
+    """
+    return chunks
+
+
 def postBuildPage(page):
     """
     Called after building a page.
@@ -101,6 +113,7 @@ ORDER = -1
 
 DEFAULTS = [
     'preBuildPage',
+    'postRenderPage',
     'postBuildPage',
     'preBuildStatic',
     'postBuildStatic',
@@ -1,6 +1,8 @@
 #coding:utf-8
 import functools
 
+from cactus import profiler
+
 from cactus.utils.internal import getargspec
 from cactus.plugin import defaults
 
@@ -17,45 +19,93 @@ class PluginManager(object):
 
     def reload(self):
         plugins = []
-        for loader in self.loaders:
-            plugins.extend(loader.load())
+        with profiler.measure(profiler.PHASE, 'plugins'):
+            for loader in self.loaders:
+                plugins.extend(loader.load())
 
         self.plugins = sorted(plugins, key=lambda plugin: plugin.ORDER)
+        self._compile()
+
+    def _compile(self):
+        """
+        Build the dispatch table: for each hook, the (plugin name, method) of the plugins
+        that implement it, in order. The no-op defaults the loaders set are left out.
+        """
+        self._hooks = {}
+
+        for hook in defaults.DEFAULTS:
+            default = getattr(defaults, hook)
+            self._hooks[hook] = [(plugin.plugin_name, getattr(plugin, hook)) for plugin in self.plugins
+                                 if getattr(plugin, hook) is not default]
+
+        # With the calling convention of each preBuildPage: whether it's the deprecated one
+        self._page_hooks = [(plugin_name, method, self._deprecated_convention(method))
+                            for plugin_name, method in self._hooks['preBuildPage']]
+
+    def _deprecated_convention(self, method):
+        """
+        We have two calling conventions for preBuildPage:
+        - The new one, which passes page, context, data
+        - The deprecated one, which also passes the site (Now accessible via the page)
+        """
+        try:
+            # Just use the new calling convention if there's fancy usage of
+            # *args, **kwargs that we can't control.
+            return len(getargspec(method).args) == 4
+        except NotImplementedError:
+            # If we can't get the number of args, use the new one.
+            return False
 
     def call(self, method, *args, **kwargs):
         """
         Call each plugin
         """
-        for plugin in self.plugins:
-            _meth = getattr(plugin, method)
-            _meth(*args, **kwargs)
+        hooks = self._hooks.get(method)
+        if hooks is None:
+            hooks = [(plugin.plugin_name, getattr(plugin, method)) for plugin in self.plugins]
+
+        if not profiler.enabled():
+            for _, _meth in hooks:
+                _meth(*args, **kwargs)
+            return
+
+        for plugin_name, _meth in hooks:
+            with profiler.measure(profiler.HOOK, method, plugin_name):
+                _meth(*args, **kwargs)
 
     def preBuildPage(self, site, page, context, data):
         """
-        Special call as we have changed the API for this.
-
-        We have two calling conventions:
-        - The new one, which passes page, context, data
-        - The deprecated one, which also passes the site (Now accessible via the page)
+        Special call as we have changed the API for this (see _deprecated_convention).
         """
-        for plugin in self.plugins:
-            # Find the correct calling convention
-            new = [page, context, data]
-            deprecated = [site, page, context, data]
-            arg_lists = dict((len(l), l) for l in [deprecated, new])
-
-            try:
-                # Try to find the best calling convention
-                n_args = len(getargspec(plugin.preBuildPage).args)
-                # Just use the new calling convention if there's fancy usage of
-                # *args, **kwargs that we can't control.
-                arg_list = arg_lists.get(n_args, new)
-            except NotImplementedError:
-                # If we can't get the number of args, use the new one.
-                arg_list = new
+        profiling = profiler.enabled()
+
+        for plugin_name, _meth, deprecated in self._page_hooks:
+            if deprecated:
+                arg_list = (site, page, context, data)
+            else:
+                arg_list = (page, context, data)
 
             # Call with the best calling convention we have.
             # If that doesn't work, then we'll let the error escalate.
-            context, data = plugin.preBuildPage(*arg_list)
+            if profiling:
+                with profiler.measure(profiler.HOOK, 'preBuildPage', plugin_name):
+                    context, data = _meth(*arg_list)
+            else:
+                context, data = _meth(*arg_list)
 
         return context, data
+
+    def postRenderPage(self, page, chunks):
+        """
+        Chain the output of the page through each plugin.
+        """
+        profiling = profiler.enabled()
+
+        for plugin_name, _meth in self._hooks['postRenderPage']:
+            if profiling:
+                with profiler.measure(profiler.HOOK, 'postRenderPage', plugin_name):
+                    chunks = _meth(page, chunks)
+            else:
+                chunks = _meth(page, chunks)
+
+        return chunks
@@ -0,0 +1,152 @@
+#coding:utf-8
+import os
+import gzip
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from cactus import profiler
+from cactus.utils.file import write_chunks_if_changed
+from cactus.utils.helpers import checksum
+
+
+logger = logging.getLogger(__name__)
+
+
+# Format name -> file suffix, default level
+FORMATS = {
+    'gzip': ('.gz', 9),
+    'br': ('.br', 11),
+    'zstd': ('.zst', 19),
+}
+
+
+def _compress_gzip(data, level):
+    # No timestamp or file name in the header, so the output only depends on the data
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_br(data, level):
+    import brotli
+    return brotli.compress(data, quality=level)
+
+
+def _compress_zstd(data, level):
+    import zstandard
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+COMPRESSORS = {
+    'gzip': _compress_gzip,
+    'br': _compress_br,
+    'zstd': _compress_zstd,
+}
+
+
+def available(name):
+    """
+    Whether the module needed for a format is installed (brotli and zstandard are optional).
+    """
+    module = {'br': 'brotli', 'zstd': 'zstandard'}.get(name)
+    if module is None:
+        return True
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return True
+
+
+def parse_formats(config):
+    """
+    Parse the precompress setting: a list of formats, or a dict of format -> level.
+
+    :returns: A dict of format -> level, for the formats we can write.
+    """
+    if not config:
+        return {}
+
+    if not isinstance(config, dict):
+        config = dict((name, None) for name in config)
+
+    formats = {}
+
+    for name, level in config.items():
+        if name not in FORMATS:
+            raise ValueError('Unknown precompress format: {0} (use one of {1})'.format(
+                name, ', '.join(sorted(FORMATS))))
+
+        if not available(name):
+            logger.warning('Not writing %s files: install the %s package',
+                           FORMATS[name][0], {'br': 'brotli', 'zstd': 'zstandard'}[name])
+            continue
+
+        formats[name] = FORMATS[name][1] if level is None else int(level)
+
+    return formats
+
+
+class Precompressor(object):
+    """
+    Writes compressed variants (e.g. index.html.gz) next to the files in the build folder,
+    so web servers can send them as they are instead of compressing every response.
+
+    A variant is only written again when the file or the level changes: it's recorded
+    in the outputs of the manifest with a key made of both.
+    """
+    def __init__(self, formats, extensions, workers=None):
+        self.formats = formats
+        self.extensions = extensions
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+
+    def variants(self, build_path):
+        """
+        :returns: The variants of a file: build path of the variant -> format.
+        """
+        extension = os.path.splitext(build_path)[1][1:]
+        if extension not in self.extensions:
+            return {}
+        return dict((build_path + FORMATS[name][0], name) for name in self.formats)
+
+    def _key(self, name, output):
+        return checksum('{0}:{1}:{2}'.format(name, self.formats[name], output).encode('utf-8'))
+
+    def _compress(self, root, build_path, variant_path, name):
+        path = os.path.join(root, build_path)
+
+        with profiler.measure(profiler.WRITE, name, build_path):
+            with open(path, 'rb') as f:
+                data = COMPRESSORS[name](f.read(), self.formats[name])
+            write_chunks_if_changed(os.path.join(root, variant_path), [data])
+
+    def run(self, root, outputs, manifest):
+        """
+        Write the variants that are missing or outdated.
+
+        :param root: The build folder.
+        :param outputs: The files in the build folder: build path -> checksum.
+        :param manifest: The manifest of the build folder, with the outputs of the previous build.
+        :returns: The variants: build path -> key.
+        """
+        variants, tasks = {}, []
+
+        for build_path, output in outputs.items():
+            for variant_path, name in self.variants(build_path).items():
+                key = variants[variant_path] = self._key(name, output)
+                if manifest.outputs.get(variant_path) != key or not os.path.exists(os.path.join(root, variant_path)):
+                    tasks.append((build_path, variant_path, name))
+
+        manifest.forget_outputs([variant_path for _, variant_path, _ in tasks
+                                 if variant_path in manifest.outputs])
+
+        logger.debug('Precompressing %s file(s)', len(tasks))
+
+        # Compressors release the GIL
+        if self.workers > 1 and len(tasks) > 1:
+            with ThreadPoolExecutor(min(self.workers, len(tasks))) as executor:
+                for future in [executor.submit(self._compress, root, *task) for task in tasks]:
+                    future.result()
+        else:
+            for task in tasks:
+                self._compress(root, *task)
+
+        return variants
@@ -0,0 +1,248 @@
+#coding:utf-8
+import os
+import io
+import json
+import time
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+
+# Kinds of things we measure
+PHASE = 'phase'  # A step of the build (loading config, building static files, ...)
+HOOK = 'hook'  # A plugin hook (name is the hook, item the plugin)
+EXTERNAL = 'external'  # An external running on a static file (name is the external, item the file)
+RENDER = 'render'  # Rendering a page (item is the page)
+WRITE = 'write'  # Writing a page to the build folder (item is the page)
+
+
+_profiler = None
+_done = object()
+
+
+class Profiler(object):
+    """
+    Records the wall and CPU time spent on everything we measure.
+
+    Times are exclusive: the time spent in a measurement nested in another one
+    (e.g. a plugin hook called while rendering a page) only counts for the inner one.
+    So the times of a single thread add up to the time it spent in the build.
+
+    Processes forked while profiling (e.g. to render pages or build locales) must call
+    flush() before they exit. Their measurements are merged into the report.
+    """
+    def __init__(self):
+        self.spool_path = tempfile.mkdtemp(prefix='cactus-profile-')
+        self.start = time.time()
+        self._pid = os.getpid()
+        self._records = []
+        self._local = threading.local()
+
+    def _check_process(self):
+        if os.getpid() != self._pid:
+            # We were forked: what we recorded so far belongs to the parent process
+            self._pid = os.getpid()
+            self._records = []
+
+    def add(self, kind, name, item, wall, cpu):
+        self._check_process()
+        self._records.append((kind, name, item, wall, cpu))
+
+    @contextmanager
+    def timing(self):
+        """
+        Time the block, without the measurements nested in it.
+        Yields a [wall, cpu] list, that is filled in when the block exits.
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        # Time spent in nested measurements
+        nested = [0.0, 0.0]
+        stack.append(nested)
+
+        result = [0.0, 0.0]
+        wall, cpu = time.time(), time.thread_time()
+        try:
+            yield result
+        finally:
+            wall, cpu = time.time() - wall, time.thread_time() - cpu
+            stack.pop()
+
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+
+            result[0], result[1] = wall - nested[0], cpu - nested[1]
+
+    @contextmanager
+    def measure(self, kind, name, item=None):
+        try:
+            with self.timing() as result:
+                yield
+        finally:
+            self.add(kind, name, item, result[0], result[1])
+
+    def flush(self):
+        """
+        Hand what this process recorded over to the process that started profiling.
+        """
+        self._check_process()
+
+        records, self._records = self._records, []
+        if not records:
+            return
+
+        path = os.path.join(self.spool_path, '{0}.json'.format(os.getpid()))
+        with io.open(path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(u'{0}\n'.format(json.dumps(record)))
+
+    def collect(self):
+        """
+        :returns: What was recorded by this process and the processes it started.
+        """
+        records = list(self._records)
+
+        for filename in sorted(os.listdir(self.spool_path)):
+            with io.open(os.path.join(self.spool_path, filename), encoding='utf-8') as f:
+                records.extend(tuple(json.loads(line)) for line in f)
+
+        return records
+
+    def report(self):
+        """
+        :returns: A JSON-friendly report with the time spent on each kind and name of
+                  measurement (e.g. a plugin hook), and on each item (e.g. a page), slowest first.
+        """
+        groups, items = {}, {}
+
+        for kind, name, item, wall, cpu in self.collect():
+            for key, totals in [((kind, name), groups), ((kind, name, item), items)]:
+                entry = totals.get(key)
+                if entry is None:
+                    entry = totals[key] = {'kind': kind, 'name': name, 'count': 0, 'wall': 0.0, 'cpu': 0.0}
+                    if totals is items:
+                        entry['item'] = item
+                entry['count'] += 1
+                entry['wall'] += wall
+                entry['cpu'] += cpu
+
+        def slowest(totals):
+            return sorted(totals.values(), key=lambda entry: entry['wall'], reverse=True)
+
+        return {
+            'wall': time.time() - self.start,
+            'groups': slowest(groups),
+            'items': slowest(items),
+        }
+
+    def write(self, path, report):
+        """
+        Write a report as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    def summary(self, report, top=20):
+        """
+        :returns: A human readable summary of a report, with the top entries.
+        """
+        lines = ['Build took {0:.3f}s'.format(report['wall']), '']
+
+        lines.append('Slowest steps (total wall / cpu time, count):')
+        for group in report['groups'][:top]:
+            lines.append('  {wall:9.3f}s {cpu:9.3f}s {count:6d}  {kind}: {name}'.format(**group))
+
+        lines.append('')
+        lines.append('Slowest items (wall / cpu time):')
+        for item in report['items'][:top]:
+            lines.append('  {wall:9.3f}s {cpu:9.3f}s  {kind}: {name} {item}'.format(
+                **dict(item, item=item['item'] or '')))
+
+        return '\n'.join(lines)
+
+    def close(self):
+        shutil.rmtree(self.spool_path, ignore_errors=True)
+
+
+def enable():
+    """
+    Start profiling.
+    """
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    """
+    Stop profiling.
+
+    :returns: The profiler that was used, if any.
+    """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def enabled():
+    """
+    :returns: Whether we're profiling.
+    """
+    return _profiler is not None
+
+
+@contextmanager
+def measure(kind, name, item=None):
+    """
+    Measure the time spent in the block, if we're profiling.
+    """
+    if _profiler is None:
+        yield
+    else:
+        with _profiler.measure(kind, name, item):
+            yield
+
+
+def measure_iter(kind, name, item, iterable):
+    """
+    Measure the time spent producing the values of an iterable (e.g. a page rendered in chunks),
+    if we're profiling. It's recorded as one measurement once the iterable is exhausted.
+    """
+    if _profiler is None:
+        for value in iterable:
+            yield value
+        return
+
+    profiler = _profiler
+    iterator = iter(iterable)
+    wall, cpu = 0.0, 0.0
+
+    try:
+        while True:
+            with profiler.timing() as result:
+                value = next(iterator, _done)
+
+            wall += result[0]
+            cpu += result[1]
+
+            if value is _done:
+                break
+            yield value
+    finally:
+        profiler.add(kind, name, item, wall, cpu)
+
+
+def flush():
+    """
+    Hand the measurements of this (forked) process over, if we're profiling.
+    """
+    if _profiler is not None:
+        _profiler.flush()
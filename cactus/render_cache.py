@@ -0,0 +1,111 @@
+#coding:utf-8
+import os
+import json
+import logging
+
+from django.utils import translation
+
+from cactus import dependencies
+from cactus.utils.cache import DiskCache
+from cactus.utils.helpers import checksum
+
+
+logger = logging.getLogger(__name__)
+
+
+class RenderCache(object):
+    """
+    A cache of rendered pages, keyed by everything that went into rendering them, so
+    unchanged pages can be reused without rendering them again, even in a fresh build folder.
+
+    There are two kinds of entries:
+    - by page source: the dependencies the page had the last time it was rendered
+    - by page source and the current value of those dependencies: the rendered page
+
+    Files are compared by content (not modification time) and stored relative to the
+    site, so the cache can be shared between machines.
+    """
+    def __init__(self, site, path, max_size=None):
+        self.site = site
+        self.cache = DiskCache(path, max_size)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget what we computed for the current state of the site.
+        Must be called at the start of a build.
+        """
+        self._base = None
+        self._checksums = {}
+
+    def _value(self, kind, key):
+        if kind == dependencies.FILE:
+            try:
+                return self._checksums[key]
+            except KeyError:
+                try:
+                    value = self.site.digests.get(key)
+                except (IOError, OSError):
+                    value = None
+                self._checksums[key] = value
+                return value
+
+        return self.site.dependencies.value(kind, key)
+
+    def _portable(self, kind, key):
+        """
+        Make file dependencies relative to the site, so they mean the same on any machine.
+        """
+        if kind == dependencies.FILE:
+            return os.path.relpath(key, self.site.path)
+        return key
+
+    def _local(self, kind, key):
+        """
+        The opposite of _portable.
+        """
+        if kind == dependencies.FILE:
+            return os.path.join(self.site.path, key)
+        return key
+
+    def _source_key(self, page):
+        if self._base is None:
+            self._base = [self.site.environment(), self.site.config.checksum(), translation.get_language()]
+
+        source = [self._base, page.source_path, self._value(dependencies.FILE, page.full_source_path)]
+        return checksum(json.dumps(source).encode('utf-8'))
+
+    def _render_key(self, source_key, keys):
+        values = sorted([kind, self._portable(kind, key), self._value(kind, key)] for kind, key in keys)
+        return checksum(json.dumps([source_key, values], default=str).encode('utf-8'))
+
+    def get(self, page):
+        """
+        :returns: The path of the rendered page in the cache and the dependencies it has, or (None, None).
+        """
+        source_key = self._source_key(page)
+
+        entry = self.cache.get(source_key)
+        if entry is None:
+            return None, None
+
+        keys = set((kind, self._local(kind, key)) for kind, key in json.loads(entry.decode('utf-8')))
+
+        path = self.cache.get_path(self._render_key(source_key, keys))
+        if path is None:
+            return None, None
+
+        logger.debug('Using cached render for %s', page.source_path)
+        return path, keys
+
+    def set(self, page, keys, path):
+        """
+        Store a rendered page (the file at path) and the dependencies it has.
+        """
+        source_key = self._source_key(page)
+        portable_keys = sorted([kind, self._portable(kind, key)] for kind, key in keys)
+        self.cache.set_file(self._render_key(source_key, keys), path)
+        self.cache.set(source_key, json.dumps(portable_keys).encode('utf-8'))
+
+    def evict(self):
+        self.cache.evict()
@@ -1,9 +1,13 @@
 import os
 import sys
+import gzip
+import json
+import asyncio
+import hashlib
 import logging
+import datetime
 import threading
-import mimetypes
-import itertools
+import collections
 
 import tornado.httpserver
 import tornado.websocket
@@ -37,32 +41,192 @@ class ShutdownHandler(tornado.web.RequestHandler):
         ioloop.add_callback(lambda x: x.stop(), ioloop)
 
 
+# Content types worth compressing, apart from text/*
+COMPRESSIBLE_TYPES = set([
+    'application/javascript', 'application/json', 'application/xml', 'application/rss+xml',
+    'application/atom+xml', 'image/svg+xml',
+])
+
+# Smaller files are not worth compressing
+MIN_COMPRESS_SIZE = 256
+
+
+class FileEntry(object):
+    """
+    A built file, as the server sends it: the live reload script is already in HTML files.
+    Files that are too large to keep in memory have no data, and are read from disk.
+    """
+    def __init__(self, abspath, max_size):
+        self.abspath = abspath
+        self.content_type = mime.guess(abspath)
+
+        info = os.stat(abspath)
+        self.modified = datetime.datetime.utcfromtimestamp(int(info.st_mtime))
+        self.data = None
+        self._gzipped = None
+
+        if self.content_type == "text/html":
+            with open(abspath, 'rb') as f:
+                self.data = f.read() + TEMPLATES["script"].encode('utf-8')
+        elif info.st_size <= max_size:
+            with open(abspath, 'rb') as f:
+                self.data = f.read()
+
+        if self.data is not None:
+            self.size = len(self.data)
+            self.etag = hashlib.md5(self.data).hexdigest()
+        else:
+            self.size = info.st_size
+            self.etag = '{0:x}-{1:x}'.format(info.st_mtime_ns, info.st_size)
+
+        self.compressible = self.data is not None and self.size >= MIN_COMPRESS_SIZE and (
+            self.content_type.startswith('text/') or self.content_type in COMPRESSIBLE_TYPES)
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.data, compresslevel=6, mtime=0)
+        return self._gzipped
+
+    def memory(self):
+        return len(self.data or b'') + len(self._gzipped or b'')
+
+
+class FileCache(object):
+    """
+    The files the server sent last, in memory, so they are not read (and hashed) again
+    for every request. The site invalidates it whenever it rebuilds.
+    """
+    def __init__(self, max_size=64 * 1024 * 1024, max_entry_size=4 * 1024 * 1024):
+        self.max_size = max_size
+        self.max_entry_size = max_entry_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, abspath):
+        """
+        :returns: The entry for a file, or None.
+        """
+        with self._lock:
+            entry = self._entries.get(abspath)
+            if entry is not None:
+                self._entries.move_to_end(abspath)
+            return entry
+
+    def load(self, abspath):
+        """
+        Read a file and keep it.
+        """
+        entry = FileEntry(abspath, self.max_entry_size)
+
+        with self._lock:
+            self._entries[abspath] = entry
+            self._evict()
+
+        return entry
+
+    def _evict(self):
+        total = sum(entry.memory() for entry in self._entries.values())
+        while total > self.max_size and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total -= entry.memory()
+
+    def invalidate(self, paths=None):
+        """
+        Forget files (absolute paths), or all of them.
+        """
+        with self._lock:
+            if paths is None:
+                self._entries.clear()
+            else:
+                for path in paths:
+                    self._entries.pop(path, None)
+
+
 class StaticHandler(tornado.web.StaticFileHandler):
 
-    @classmethod
-    def get_append(cls, abspath):
+    def initialize(self, path, default_filename=None, cache=None, builder=None):
+        super(StaticHandler, self).initialize(path, default_filename)
+        self.cache = cache if cache is not None else FileCache()
+        self.builder = builder
+        self.entry = None
+        self.encoding = None
+
+    def _build(self, root, path):
+        """
+        Have the file built if the site builds files on demand.
+        """
+        if path == "" or path.endswith(os.path.sep):
+            build_paths = [path + self.default_filename]
+        else:
+            build_paths = [path, os.path.join(path, self.default_filename)]
+
+        if self.builder(build_paths):
+            self.cache.invalidate([os.path.abspath(os.path.join(root, build_path)) for build_path in build_paths])
+
+    async def get(self, path, include_body=True):
+        if self.builder is not None and self.default_filename is not None:
+            # In a thread, so other requests are served in the meantime
+            await tornado.ioloop.IOLoop.current().run_in_executor(
+                None, self._build, self.root, self.parse_url_path(path))
+
+        await super(StaticHandler, self).get(path, include_body)
+
+    def validate_absolute_path(self, root, absolute_path):
+        # Files in the cache were validated when they were read
+        candidates = [absolute_path]
+        if self.default_filename is not None and self.request.path.endswith("/"):
+            candidates.insert(0, os.path.join(absolute_path, self.default_filename))
 
-        mime_type, encoding = mimetypes.guess_type(abspath)
+        for candidate in candidates:
+            self.entry = self.cache.get(candidate)
+            if self.entry is not None:
+                return candidate
 
-        if mime_type == "text/html":
-            return TEMPLATES["script"]
+        absolute_path = super(StaticHandler, self).validate_absolute_path(root, absolute_path)
+        if absolute_path is not None:
+            self.entry = self.cache.load(absolute_path)
+        return absolute_path
 
-        return ""
+    def _body(self):
+        if self.encoding == "gzip":
+            return self.entry.gzipped()
+        return self.entry.data
 
-    @classmethod
-    def get_content(cls, abspath, start=None, end=None):
-        data = super(StaticHandler, cls).get_content(abspath, start=start, end=end)
-        return itertools.chain(data, [cls.get_append(abspath)])
+    def set_headers(self):
+        if self.entry.compressible:
+            self.set_header("Vary", "Accept-Encoding")
+            accepted = self.request.headers.get("Accept-Encoding", "")
+            if "gzip" in accepted and not self.request.headers.get("Range"):
+                self.encoding = "gzip"
+                self.set_header("Content-Encoding", "gzip")
+
+        super(StaticHandler, self).set_headers()
+
+        # Always check with us, so changes show up (mostly with a 304)
+        self.set_header("Cache-Control", "no-cache")
+
+    def compute_etag(self):
+        if self.encoding is not None:
+            return '"{0}-{1}"'.format(self.entry.etag, self.encoding)
+        return '"{0}"'.format(self.entry.etag)
+
+    def get_modified_time(self):
+        return self.entry.modified
 
     def get_content_size(self):
-        return super(StaticHandler, self).get_content_size() + len(self.get_append(self.absolute_path))
+        body = self._body()
+        if body is None:
+            return self.entry.size
+        return len(body)
 
-    # Always be not caching
-    def should_return_304(self):
-        return False
+    def get_content(self, abspath, start=None, end=None):
+        body = self._body()
+        if body is None:
+            return super(StaticHandler, type(self)).get_content(abspath, start, end)
+        return body[start:end]
 
     def get_content_type(self):
-        return mime.guess(self.absolute_path)
+        return self.entry.content_type
 
     def write_error(self, status_code, **kwargs):
         # Special case handling for 404: try to find one of the error pages,
@@ -90,16 +254,22 @@ class StaticSingleFileHandler(tornado.web.RequestHandler):
 
 class WebServer(object):
 
-    def __init__(self, path, port=8080):
-
+    def __init__(self, path, port=8080, cache=None, builder=None):
+        """
+        :param builder: Called with the paths (relative to path) a request could be for, before
+                        the file is sent, to build it on demand. Returns whether it built it.
+        """
         self.path = path
         self.port = port
+        self.cache = cache if cache is not None else FileCache()
+        self.io_loop = tornado.ioloop.IOLoop.current()
 
         self.application = tornado.web.Application([
             (r'/_cactus/shutdown', ShutdownHandler),
             (r'/_cactus/ws', WebSocketHandler),
             (r'/_cactus/cactus.js', StaticSingleFileHandler),
-            (r'/(.*)', StaticHandler, {'path': self.path, "default_filename": "index.html"}),
+            (r'/(.*)', StaticHandler, {'path': self.path, "default_filename": "index.html", "cache": self.cache,
+                                     "builder": builder}),
         ], template_path=self.path)
 
         self.application.log_request = lambda x: self._log_request(x)
@@ -125,15 +295,43 @@ class WebServer(object):
         self._server = tornado.httpserver.HTTPServer(self.application)
         self._server.listen(self.port)
 
-        tornado.ioloop.IOLoop.instance().start()
+        self.io_loop.start()
 
     def stop(self):
         pass
 
+    def invalidate(self, paths=None):
+        """
+        Forget the files we have in memory (absolute paths), or all of them, e.g. after a rebuild.
+        """
+        self.cache.invalidate(paths)
+
     def publish(self, message):
+        """
+        Send a message to every browser. Messages are sent from the loop of the server, so
+        this can be called from any thread.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self.io_loop.asyncio_loop:
+            self._publish(message)
+        else:
+            self.io_loop.add_callback(self._publish, message)
+
+    def _publish(self, message):
         for ws in self.application._socketHandlers:
             ws.write_message(message)
 
+    def reload(self, urls):
+        """
+        Have the browsers reload what uses these URLs (e.g. /about/index.html): the pages
+        themselves, or only the stylesheets and images that changed in the other pages.
+        """
+        self.publish(json.dumps({"reload": list(urls)}))
+
     def reloadPage(self):
         self.publish("reloadPage")
 
@@ -154,19 +352,31 @@ function reloadPage() {
     window.location.reload()
 }
 
-function reloadCSS() {
-    function updateQueryStringParameter(uri, key, value) {
+function updateQueryStringParameter(uri, key, value) {
 
-        var re = new RegExp("([?|&])" + key + "=.*?(&|$)", "i");
-        separator = uri.indexOf("?") !== -1 ? "&" : "?";
+    var re = new RegExp("([?|&])" + key + "=.*?(&|$)", "i");
+    separator = uri.indexOf("?") !== -1 ? "&" : "?";
 
-        if (uri.match(re)) {
-            return uri.replace(re, "$1" + separator + key + "=" + value + "$2");
-        } else {
-            return uri + separator + key + "=" + value;
-        };
+    if (uri.match(re)) {
+        return uri.replace(re, "$1" + separator + key + "=" + value + "$2");
+    } else {
+        return uri + separator + key + "=" + value;
+    };
+};
+
+function reloadURL(url) {
+
+    var updatedLink = updateQueryStringParameter(url, "cactus.reload", new Date().getTime());
+
+    if (updatedLink.indexOf("?") == -1) {
+        updatedLink = updatedLink.replace("&", "?");
     };
 
+    return updatedLink;
+};
+
+function reloadCSS() {
+
     var links = document.getElementsByTagName("link");
 
     for (var i = 0; i < links.length;i++) {
@@ -185,13 +395,70 @@ function reloadCSS() {
                 continue;
             }
 
-            var updatedLink = updateQueryStringParameter(link.href, "cactus.reload", new Date().getTime());
+            link.href = reloadURL(link.href);
+        };
+    };
+};
 
-            if (updatedLink.indexOf("?") == -1) {
-                updatedLink = updatedLink.replace("&", "?");
-            };
+// /about/index.html and /about/ are the same page
+function normalizePath(path) {
+    try {
+        path = decodeURI(path);
+    } catch (e) {};
 
-            link.href = updatedLink;
+    if (path.slice(-11) === "/index.html") {
+        path = path.slice(0, -10);
+    };
+
+    return path;
+};
+
+function isChanged(url, changed) {
+    if (!url) {
+        return false;
+    };
+
+    var parsed = new URL(url, window.location.href);
+
+    // Only our own files change
+    if (parsed.host !== window.location.host) {
+        return false;
+    };
+
+    return changed.hasOwnProperty(normalizePath(parsed.pathname));
+};
+
+// Only reload this page if it changed, or the stylesheets and images it uses that changed
+function reloadURLs(urls) {
+
+    var changed = {};
+
+    for (var i = 0; i < urls.length; i++) {
+        changed[normalizePath(urls[i])] = true;
+    };
+
+    if (changed.hasOwnProperty(normalizePath(window.location.pathname))) {
+        return reloadPage();
+    };
+
+    // Scripts can't be swapped
+    for (var i = 0; i < document.scripts.length; i++) {
+        if (isChanged(document.scripts[i].src, changed)) {
+            return reloadPage();
+        };
+    };
+
+    var links = document.getElementsByTagName("link");
+
+    for (var i = 0; i < links.length; i++) {
+        if (links[i].rel === "stylesheet" && isChanged(links[i].href, changed)) {
+            links[i].href = reloadURL(links[i].href);
+        };
+    };
+
+    for (var i = 0; i < document.images.length; i++) {
+        if (isChanged(document.images[i].src, changed)) {
+            document.images[i].src = reloadURL(document.images[i].src);
         };
     };
 };
@@ -210,7 +477,19 @@ function startSocket() {
         var key = e.data;
 
         if (MessageActions.hasOwnProperty(key)) {
-            MessageActions[key]()
+            return MessageActions[key]()
+        };
+
+        var message;
+
+        try {
+            message = JSON.parse(e.data);
+        } catch (error) {
+            return;
+        };
+
+        if (message.reload) {
+            reloadURLs(message.reload);
         };
     };
 };
@@ -1,31 +1,46 @@
 import os
 import sys
+import json
 import shutil
 import logging
+import threading
 import traceback
 import django.conf
+from django.template import engines, Template
+from django.template.engine import Engine
 from django.utils import translation
 
 from cactus import ui as ui_module
+from cactus import dependencies, profiler
 from cactus.config.router import ConfigRouter
+from cactus.exceptions import BuildCancelled
+from cactus.digests import DigestCache, DIGESTS_FILENAME
+from cactus.manifest import Manifest
+from cactus.precompress import Precompressor, parse_formats
+from cactus.render_cache import RenderCache
 from cactus.i18n.commands import MessageMaker, MessageCompiler
 from cactus.plugin.builtin.cache import CacheDurationPlugin
 from cactus.plugin.builtin.context import ContextPlugin
 from cactus.plugin.builtin.ignore import IgnorePatternsPlugin
 from cactus.plugin.loader import CustomPluginsLoader, ObjectsPluginLoader
 from cactus.plugin.manager import PluginManager
+from cactus.static.external.cache import ExternalCache
 from cactus.static.external.manager import ExternalManager
+from cactus.static.external.runner import ExternalRunner
 from cactus.compat.paths import SiteCompatibilityLayer
 from cactus.compat.page import PageContextCompatibilityPlugin
-from cactus.utils.file import fileSize
-from cactus.utils.filesystem import chdir, fileList
-from cactus.utils.helpers import memoize, map_apply
+from cactus.utils.cache import parse_size
+from cactus.utils.file import fileSize, remove_files
+from cactus.utils.filesystem import chdir, fileList, mkdtemp
+from cactus.utils.helpers import map_apply, checksum
 from cactus.utils.network import internetWorking
-from cactus.utils.parallel import multiMap, PARALLEL_DISABLED, PARALLEL_CONSERVATIVE, PARALLEL_AGGRESSIVE
-from cactus.utils.url import is_external
+from cactus.utils.parallel import multiMap, processMap, processEach, processes_available, \
+    PARALLEL_DISABLED, PARALLEL_CONSERVATIVE, PARALLEL_AGGRESSIVE
+from cactus.url_index import URLIndex, page_aliases, static_aliases
 from cactus.page import Page
-from cactus.static import Static
+from cactus.static import Static, process_statics
 from cactus.listener import Listener
+from cactus.listener.scheduler import RebuildScheduler
 from cactus.server import WebServer
 from cactus.utils import ipc
 
@@ -35,10 +50,34 @@ logger = logging.getLogger(__name__)
 DEFAULT_PROVIDER = "rackspace"
 
 
+def _build_page(site, source_path):
+    """
+    Build a page in a worker process, and return its dependency record.
+    """
+    site._page_cache[source_path].build()
+    profiler.flush()
+    return site.dependencies.records[source_path]
+
+
+def _build_locale(site, args):
+    """
+    Build a locale in a worker process.
+    """
+    locale_item, incremental = args
+    site.build_with_translation(locale_item, incremental=incremental)
+    site.wait_for_sweep()
+    profiler.flush()
+
+
 class Site(SiteCompatibilityLayer):
     _path = None
     _parallel = PARALLEL_CONSERVATIVE  #TODO: Test me
     _static = None
+    _pages = None
+    _context = None
+    _staging_path = None
+    _on_demand = None  # build path -> page or static file, when building on demand
+    _cancelled = None  # set when the current build should stop
 
     VERB_UNKNOWN = 0
     VERB_SERVE = 1
@@ -51,16 +90,47 @@ class Site(SiteCompatibilityLayer):
         # Load the config engine
         if config_paths is None:
             config_paths = []
-        self.config = ConfigRouter(config_paths)
+        with profiler.measure(profiler.PHASE, 'config'):
+            self.config = ConfigRouter(config_paths)
         self.verb = verb
 
         # Load site-specific config values
         self.prettify_urls = self.config.get('prettify', False)
         self.root_url = self.config.get('root_url', None)
         self.compress_extensions = self.config.get('compress', ['html', 'css', 'js', 'txt', 'xml'])
+
+        # Write compressed variants of these files next to them
+        self.precompressor = None
+        precompress_formats = parse_formats(self.config.get('precompress'))
+        if precompress_formats:
+            self.precompressor = Precompressor(precompress_formats, self.compress_extensions)
         self.fingerprint_extensions = self.config.get('fingerprint', [])
         self.use_translate = self.config.get('use_translate', False)
 
+        # Static files that no external changes may be hard links to their source
+        self.static_hardlinks = self.config.get('static-hardlinks', False)
+
+        # Reuse rendered pages from a cache on disk
+        self.render_cache = None
+        render_cache_path = self.config.get('render-cache')
+        if render_cache_path is not None:
+            self.render_cache = RenderCache(
+                self, os.path.join(path, render_cache_path), parse_size(self.config.get('render-cache-size', '1gb')))
+
+        # Reuse what externals did to static files from a cache on disk
+        self.external_cache = None
+        external_cache_path = self.config.get('external-cache')
+        if external_cache_path is not None:
+            self.external_cache = ExternalCache(
+                os.path.join(path, external_cache_path), parse_size(self.config.get('external-cache-size', '1gb')))
+
+        # Render pages in this many worker processes ("auto" for one per CPU)
+        self.render_processes = self.config.get('render-processes', 0)
+        if self.render_processes == 'auto':
+            self.render_processes = os.cpu_count() or 1
+        else:
+            self.render_processes = int(self.render_processes)
+
         self.locale = []
         self.default_language = self.config.get('default_language', 'en')
         if self.use_translate:
@@ -92,6 +162,25 @@ class Site(SiteCompatibilityLayer):
             ExternalManagerClass = ExternalManager
         self.external_manager = ExternalManagerClass(self)
 
+        # Run externals in this many threads ("auto" for one per CPU)
+        external_workers = self.config.get('external-workers', 'auto')
+        self.external_runner = ExternalRunner(self, None if external_workers == 'auto' else int(external_workers))
+
+        # Keep track of what pages use, to only rebuild what changed
+        self.dependencies = dependencies.DependencyGraph(self)
+        self.manifest = Manifest(self.build_path)
+
+        # Remember file digests across runs, so unchanged files are not hashed again
+        self.digests = DigestCache(
+            os.path.join(path, self.config.get('digest-cache', os.path.join('.build', DIGESTS_FILENAME))),
+            self.config.get('fingerprint-algorithm', 'md5'))
+
+        self._sweepers = []
+        self._on_demand_lock = threading.Lock()
+        self._page_templates = {}
+        self._page_index = URLIndex(page_aliases)
+        self._static_index = URLIndex(static_aliases)
+
         # Load Django settings
         self.setup()
 
@@ -140,8 +229,11 @@ class Site(SiteCompatibilityLayer):
         TEMPLATES = [{
             'BACKEND': 'django.template.backends.django.DjangoTemplates',
             'DIRS': [self.template_path, self.page_path],
-            'APP_DIRS': True,
             'OPTIONS': {
+                'loaders': [
+                    'cactus.template_loaders.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ],
                 'context_processors': [
                     'django.template.context_processors.debug',
                     'django.template.context_processors.request',
@@ -175,6 +267,15 @@ class Site(SiteCompatibilityLayer):
         django.conf.settings.configure(**settings)
         django.setup()
 
+        # Django keeps the template engine around between sites, make sure we use ours.
+        try:
+            del engines.templates
+        except AttributeError:
+            pass
+        engines._templates = None
+        engines._engines = {}
+        Engine.get_default.cache_clear()
+
     def verify_path(self):
         """
         Check if this path looks like a Cactus website
@@ -188,23 +289,25 @@ class Site(SiteCompatibilityLayer):
                 logger.error('This does not look like a (complete) cactus project (missing "%s" subfolder)', p)
                 sys.exit(1)
 
-    @memoize
     def context(self):
         """
         Base context for the site: all the html pages.
         """
-        ctx = {
-            'CACTUS': {
-                'pages':  [p for p in self.pages() if p.is_html()],
-                'static': [p for p in self.static()]
-            },
-            '__CACTUS_SITE__': self,
-        }
+        if self._context is None:
+            ctx = {
+                'CACTUS': dependencies.RecordingDict({
+                    'pages':  [p for p in self.pages() if p.is_html()],
+                    'static': [p for p in self.static()]
+                }),
+                '__CACTUS_SITE__': self,
+            }
+
+            # Also make lowercase work
+            ctx['cactus'] = ctx['CACTUS']
 
-        # Also make lowercase work
-        ctx['cactus'] = ctx['CACTUS']
+            self._context = ctx
 
-        return ctx
+        return self._context
 
     def make_messages(self):
         """
@@ -232,10 +335,20 @@ class Site(SiteCompatibilityLayer):
         """
         logger.debug("*** CLEAN %s", self.path)
 
+        self.wait_for_sweep()
+
         if os.path.isdir(self.build_path):
             shutil.rmtree(self.build_path)
 
-    def build_with_translation(self, locale_item=None):
+        self.dependencies.clear()
+
+    def build_with_translation(self, locale_item=None, incremental=True):
+        """
+        Build the site for a single language.
+
+        When building incrementally, what the build manifest tells us did not change since
+        the last build (in this process or a previous one) is skipped.
+        """
         logger.debug("*** BUILD %s", self.path)
 
         language = self.default_language
@@ -249,64 +362,247 @@ class Site(SiteCompatibilityLayer):
 
         self.verify_url()
 
+        # Don't let a sweep from a previous build race with this one
+        self.wait_for_sweep()
+
         # Reset the static content
         self._static = None
-        self._static_resources_dict = None
+        self._pages = None
+        self._context = None
+        self.dependencies.reset()
+        self.manifest = Manifest(self.build_path)
+
+        if self.render_cache is not None:
+            self.render_cache.reset()
+
+        # What is used outside of the pages (e.g. config, templates or pages read by plugins) could affect any page
+        with dependencies.recording() as used:
 
-        # TODO: Facility to reset the site, and reload config.
-        # TODO: Currently, we can't build a site instance multiple times
-        self.plugin_manager.reload()  # Reload in case we're running on the server # We're still loading twice!
+            # TODO: Facility to reset the site, and reload config.
+            # TODO: Currently, we can't build a site instance multiple times
+            self.plugin_manager.reload()  # Reload in case we're running on the server # We're still loading twice!
 
-        self.plugin_manager.preBuild(self)
+            self.plugin_manager.preBuild(self)
 
-        logger.debug('Plugins:    %s', ', '.join([p.plugin_name for p in self.plugin_manager.plugins]))
-        logger.debug('Processors: %s', ', '.join([p.__name__ for p in self.external_manager.processors]))
-        logger.debug('Optimizers: %s', ', '.join([p.__name__ for p in self.external_manager.optimizers]))
+            logger.debug('Plugins:    %s', ', '.join([p.plugin_name for p in self.plugin_manager.plugins]))
+            logger.debug('Processors: %s', ', '.join([p.__name__ for p in self.external_manager.processors]))
+            logger.debug('Optimizers: %s', ', '.join([p.__name__ for p in self.external_manager.optimizers]))
 
-        # Make sure the build path exists
-        if not os.path.exists(self.build_path):
-            os.mkdir(self.build_path)
+            with profiler.measure(profiler.PHASE, 'manifest', language):
+                if not self.load_manifest() or not incremental:
+                    self.manifest.invalidate()
+                    incremental = False
 
-        # Copy the static files
-        self.buildStatic()
+            previous_outputs = set(self.manifest.outputs)
 
-        # Always clean out the pages
+            # Make sure the build path exists
+            os.makedirs(self.build_path, exist_ok=True)
 
-        build_static_path = os.path.join(self.build_path, "static")
+            # Copy the static files
+            self._check_cancelled()
+            with profiler.measure(profiler.PHASE, 'static', language):
+                self.buildStatic()
 
-        for path in os.listdir(self.build_path):
-            path = os.path.join(self.build_path, path)
-            if path != build_static_path:
-                if os.path.isdir(path):
-                    shutil.rmtree(path)
+            self._check_cancelled()
+            with profiler.measure(profiler.PHASE, 'pages', language):
+                pages = self.pages()
+
+                if incremental:
+                    self.dependencies.records = self.manifest.pages
+                    removed = self.dependencies.removed(pages)
+                    pages = self.dependencies.stale(pages)
+                    logger.debug('Incremental build: %s page(s) to render, %s removed', len(pages), len(removed))
+                else:
+                    self.dependencies.clear()
+
+                # Render the pages to their output files
+                if self.render_processes > 1 and len(pages) > 1 and processes_available():
+                    self.buildPagesInProcesses(pages)
                 else:
-                    os.remove(path)
+                    mapper = multiMap if self._parallel >= PARALLEL_AGGRESSIVE else map_apply
+                    # mapper = map_apply
+                    mapper(self._build_page, pages)
+
+            self._check_cancelled()
+            self.plugin_manager.postBuild(self)
+
+        self._remove_staging()
 
-        # Render the pages to their output files
-        mapper = multiMap if self._parallel >= PARALLEL_AGGRESSIVE else map_apply
-        # mapper = map_apply
-        mapper(lambda p: p.build(), self.pages())
+        outputs = self.outputs()
 
-        self.plugin_manager.postBuild(self)
+        # No need to wait for compression when serving the site
+        if self.precompressor is not None and self.verb != self.VERB_SERVE:
+            with profiler.measure(profiler.PHASE, 'precompress', language):
+                outputs.update(self.precompressor.run(self.build_path, outputs, self.manifest))
 
-        for static in self.static():
-            if os.path.isdir(static.pre_dir):
-                shutil.rmtree(static.pre_dir)
+        with profiler.measure(profiler.PHASE, 'manifest', language):
+            self.write_manifest(used, outputs)
+            self.digests.write()
 
-    def build(self):
+        # Whatever we wrote last time but not this time is stale. Removing it can happen in the background.
+        stale = previous_outputs - set(self.manifest.outputs)
+        if stale:
+            sweeper = threading.Thread(target=remove_files, args=(self.build_path, stale), name='cactus-sweep')
+            sweeper.start()
+            self._sweepers.append(sweeper)
+
+    def build(self, incremental=True):
         """
         Generate fresh site from templates.
+
+        :param incremental: Reuse what did not change since the last build.
         """
-        self.build_with_translation()
+        if not self.use_translate:
+            self.build_with_translation(incremental=incremental)
 
-        # Prepare translations
-        if self.use_translate:
-            build_path_tmp = self.build_path
+        elif self._parallel >= PARALLEL_CONSERVATIVE and processes_available():
             self.compile_messages()
 
+            # Each locale is built in its own process (with its own translation and build folder),
+            # while we build the default language here.
+            self.wait_for_sweep()
+            locales = [(locale_item, incremental) for locale_item in self.locale]
+
+            # The locale build folders go in ours, which we would only create once they started
+            os.makedirs(self.build_path, exist_ok=True)
+
+            with processEach(_build_locale, locales, self):
+                self.build_with_translation(incremental=incremental)
+
+        else:
+            self.compile_messages()
+            self.build_with_translation(incremental=incremental)
+
+            build_path_tmp = self.build_path
             for locale_item in self.locale:
-                self.build_with_translation(locale_item)
-                self.build_path = build_path_tmp
+                try:
+                    self.build_with_translation(locale_item, incremental=incremental)
+                finally:
+                    self.build_path = build_path_tmp
+
+        if self.render_cache is not None:
+            self.render_cache.evict()
+
+        if self.external_cache is not None:
+            self.external_cache.evict()
+
+    def environment(self):
+        """
+        A checksum of everything that can affect any file in the build, apart from the config
+        which is tracked key by key. When it changes, nothing from a previous build can be reused.
+        """
+        def external_names(externals):
+            return sorted(set('{0}.{1}'.format(e.__module__, e.__name__) for e in externals))
+
+        plugin_paths = [path for path in fileList(self.plugin_path) if path.endswith('.py')]
+
+        environment = {
+            'verb': self.verb,
+            'prettify': self.prettify_urls,
+            'root_url': self.root_url,
+            'fingerprint': self.fingerprint_extensions,
+            'fingerprint-algorithm': self.digests.algorithm,
+            'plugins': sorted(
+                (os.path.relpath(path, self.plugin_path), self.digests.get(path)) for path in plugin_paths),
+            'processors': external_names(self.external_manager.processors),
+            'optimizers': external_names(self.external_manager.optimizers),
+        }
+
+        return checksum(json.dumps(environment, sort_keys=True).encode('utf-8'))
+
+    def load_manifest(self):
+        """
+        Load the manifest for the current build folder.
+
+        :returns: Whether the manifest is still valid.
+        """
+        self.manifest.load()
+
+        if self.manifest.environment is None:
+            return False
+
+        changed = [key for kind, values in self.manifest.dependencies.items() for key, value in values.items()
+                   if self.dependencies.changed(kind, key, value)]
+
+        if self.manifest.environment != self.environment() or changed:
+            logger.info('Build environment changed, rebuilding everything')
+            return False
+
+        return True
+
+    def outputs(self):
+        """
+        :returns: The files we built: build path -> checksum.
+        """
+        outputs = dict((record['build_path'], record['output'])
+                       for record in self.dependencies.records.values() if not record['discarded'])
+        outputs.update((static.build_path, static.output_hash) for static in self.static()
+                       if not static.discarded and static.output_hash is not None)
+        return outputs
+
+    def write_manifest(self, used, outputs=None):
+        """
+        Save what we know about this build for the next one.
+
+        :param used: The dependencies used outside of the pages during the build: when any
+            of them changes, every page has to be rendered again.
+        :param outputs: The files we wrote to the build folder, if not only the pages and static files.
+        """
+        self.manifest.environment = self.environment()
+        self.manifest.dependencies = {}
+        for kind, key in used:
+            self.manifest.dependencies.setdefault(kind, {})[key] = self.dependencies.entry(kind, key)
+        self.manifest.static = dict((static.path, static.manifest_entry()) for static in self.static())
+        self.manifest.pages = self.dependencies.records
+        self.manifest.outputs = outputs if outputs is not None else self.outputs()
+        self.manifest.urls = dict((resource.link_url, resource.final_url)
+                                  for resource in self.static() + self.pages())
+        self.manifest.write()
+
+    def page_template(self, page, data):
+        """
+        The compiled template for a page body. It is reused for as long as the body
+        (after the preBuildPage plugins) does not change, e.g. by every locale and rebuild.
+        """
+        key = checksum(data.encode('utf-8'))
+
+        cached = self._page_templates.get(page.source_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        template = Template(data)
+        self._page_templates[page.source_path] = (key, template)
+        return template
+
+    def _remove_staging(self):
+        if self._staging_path is not None:
+            shutil.rmtree(self._staging_path, ignore_errors=True)
+            self._staging_path = None
+
+    def staging_path(self):
+        """
+        The folder where static files are pre-processed, for the current build.
+        """
+        if self._staging_path is None:
+            self._staging_path = mkdtemp()
+        return self._staging_path
+
+    def _check_cancelled(self):
+        """
+        Stop the build here if it was cancelled: this is only called where the next
+        build can pick up from (the build manifest is written last, and the outputs
+        written until then are in its journal, see Manifest.forget_outputs).
+        """
+        if self._cancelled is not None and self._cancelled.is_set():
+            self._remove_staging()
+            raise BuildCancelled()
+
+    def wait_for_sweep(self):
+        """
+        Wait until the stale outputs of previous builds are removed.
+        """
+        while self._sweepers:
+            self._sweepers.pop().join()
 
     def static(self):
         """
@@ -325,7 +621,12 @@ class Site(SiteCompatibilityLayer):
                         logger.warning("Skipping symlink that points to unexisting file:\n%s", full_path)
                         continue
 
-                self._static.append(Static(self, path))
+                self._static.append(Static(self, path, process=False))
+
+            with profiler.measure(profiler.PHASE, 'externals'):
+                process_statics(self, self._static)
+
+            self._static_index.update(self._static)
 
         return self._static
 
@@ -333,34 +634,39 @@ class Site(SiteCompatibilityLayer):
         """
         Retrieve a dictionary mapping URL's to static files
         """
-        if self._static_resources_dict is None:
-            self._static_resources_dict = dict((resource.link_url, resource) for resource in self.static())
-
-        return self._static_resources_dict
-
-    def _get_resource(self, src_url, resources):
-
-        if is_external(src_url):
-            return src_url
-
-        for split_char in ["#", "?"]:
-            if split_char in src_url:
-                src_url = src_url.split(split_char)[0]
-
-        if src_url in resources:
-            return resources[src_url].final_url
-
-        return None
-
-
-    def _get_url(self, src_url, resources):
-        return self._get_resource(src_url, resources)
+        self.static()
+        return self._static_index.resources()
 
     def get_url_for_static(self, src_path):
-        return self._get_url(src_path, self.static_resources_dict())
+        dependencies.record(dependencies.STATIC, src_path)
+        self.static()
+        return self._static_index.final_url(src_path)
+
+    def get_url_for_static_alias(self, src_path):
+        """
+        The final URL of the static file that src_path is an alias of (e.g. css/style.css
+        for /static/css/style.css), if any.
+        """
+        self.static()
+        static = self._static_index.get_alias(src_path)
+        if static is None:
+            return None
+        return static.final_url
 
     def get_url_for_page(self, src_path):
-        return self._get_url(src_path, dict((resource.link_url, resource) for resource in self.pages()))
+        dependencies.record(dependencies.PAGE, src_path)
+        self.pages()
+        return self._page_index.final_url(src_path)
+
+    def get_url_for_page_alias(self, src_path):
+        """
+        The final URL of the page that src_path is an alias of (e.g. /subdir for /subdir/index.html), if any.
+        """
+        self.pages()
+        page = self._page_index.get_alias(src_path)
+        if page is None:
+            return None
+        return page.final_url
 
     def buildStatic(self):
         """
@@ -369,11 +675,34 @@ class Site(SiteCompatibilityLayer):
         mapper = multiMap if self._parallel > PARALLEL_DISABLED else map_apply
         mapper(lambda s: s.build(), self.static())
 
+    def _build_page(self, page):
+        self._check_cancelled()
+        page.build()
+
+    def buildPagesInProcesses(self, pages):
+        """
+        Build pages in worker processes. The workers are forked from this process, so they
+        start with the Django settings, plugins and page inventory we have here.
+
+        Note that plugins only see the postBuildPage hook in the worker processes.
+        """
+        logger.debug('Rendering %s page(s) in %s processes', len(pages), self.render_processes)
+
+        records = processMap(
+            _build_page, [page.source_path for page in pages], self, processes=self.render_processes)
+
+        for page, record in zip(pages, records):
+            page.discarded = record['discarded']
+            self.dependencies.records[page.source_path] = record
+
     def pages(self):
         """
         List of pages.
         """
 
+        if self._pages is not None:
+            return self._pages
+
         if not hasattr(self, "_page_cache"):
             self._page_cache = {}
 
@@ -390,8 +719,100 @@ class Site(SiteCompatibilityLayer):
 
             pages.append(self._page_cache[path])
 
+        self._page_index.update(pages)
+        self._pages = pages
+
         return pages
 
+    def prepare_on_demand(self):
+        """
+        Get ready to build pages and static files when they are requested (see build_on_demand)
+        instead of building the whole site. Static files are processed, but only copied on demand.
+        """
+        logger.debug("*** PREPARE %s", self.path)
+
+        django.conf.settings.LANGUAGE_CODE = self.default_language
+        translation.activate(self.default_language)
+
+        self.verify_url()
+        self.wait_for_sweep()
+        self._remove_staging()
+
+        self._static = None
+        self._pages = None
+        self._context = None
+        self.dependencies.reset()
+        self.manifest = Manifest(self.build_path)
+
+        if self.render_cache is not None:
+            self.render_cache.reset()
+
+        with dependencies.recording() as used:
+            self.plugin_manager.reload()
+            self.plugin_manager.preBuild(self)
+
+            if self.load_manifest():
+                self.dependencies.records = self.manifest.pages
+            else:
+                self.manifest.invalidate()
+                self.dependencies.clear()
+
+            if not os.path.exists(self.build_path):
+                os.mkdir(self.build_path)
+
+            self.dependencies.removed(self.pages())
+            resources = self.static() + self.pages()
+
+        self._on_demand_used = used
+        self._on_demand = dict((resource.build_path, resource) for resource in resources)
+        self._on_demand_fresh = set()
+
+        # Whatever we wrote before that is not in the site anymore (e.g. a page that was removed) is stale.
+        # The next manifest won't list it, so it has to go now.
+        stale = set(self.manifest.outputs) - set(self._on_demand)
+        if stale:
+            sweeper = threading.Thread(target=remove_files, args=(self.build_path, stale), name='cactus-sweep')
+            sweeper.start()
+            self._sweepers.append(sweeper)
+
+    def build_on_demand(self, build_paths):
+        """
+        Build the first page or static file found at one of these build paths, unless it's up to date.
+
+        :returns: Whether it was built.
+        """
+        with self._on_demand_lock:
+            for build_path in build_paths:
+                resource = self._on_demand.get(build_path)
+                if resource is None:
+                    continue
+
+                if build_path in self._on_demand_fresh:
+                    return False
+
+                if isinstance(resource, Page):
+                    stale = self.dependencies.is_stale(resource)
+                else:
+                    stale = resource._preprocessing_path is not None or not os.path.exists(resource.full_build_path)
+
+                if stale:
+                    logger.info('Building %s', build_path)
+                    resource.build()
+
+                # Until something changes
+                self._on_demand_fresh.add(build_path)
+                return stale
+
+        return False
+
+    def save_on_demand(self):
+        """
+        Save what we built on demand for the next run.
+        """
+        with self._on_demand_lock:
+            self.write_manifest(self._on_demand_used)
+            self.digests.write()
+
     def _rebuild_should_ignore(self, file_path):
 
         file_relative_path = os.path.relpath(file_path, self.path)
@@ -415,15 +836,35 @@ class Site(SiteCompatibilityLayer):
 
         return True
 
+    def _output_urls(self):
+        """
+        :returns: The URL of every file in the build folder -> checksum, as the build manifests have them.
+        """
+        folders = [('/', self.build_path)]
+        if self.use_translate:
+            folders.extend(('/{0}/'.format(locale_item), os.path.join(self.build_path, locale_item))
+                           for locale_item in self.locale)
+
+        urls = {}
+        for prefix, path in folders:
+            manifest = Manifest(path)
+            manifest.load()
+            urls.update((prefix + build_path.replace(os.sep, '/'), output)
+                        for build_path, output in manifest.outputs.items())
+        return urls
+
     def _rebuild(self, changes):
+        """
+        Build again after changes (in the executor of the rebuild scheduler).
 
+        :returns: The URLs whose files changed, or None when we don't know.
+        """
         logger.debug("*** REBUILD %s", self.path)
 
         logger.info('*** Rebuilding (%s changed)' % self.path)
 
-        # We will pause the listener while building so scripts that alter the output
-        # like coffeescript and less don't trigger the listener again immediately.
-        self.listener.pause()
+        # The URLs whose files changed, or None when we don't know
+        urls = None
 
         try:
             #TODO: Fix this.
@@ -434,54 +875,87 @@ class Site(SiteCompatibilityLayer):
             # They run on __init__ to run before fingerprinting, and the "built" static files themselves,
             # which are in a temporary folder, have been deleted already!
             # self._static = None
-            self.build()
-
+            if self._on_demand is not None:
+                # Pages and static files are built again when they are requested, if they changed
+                self.save_on_demand()
+                with self._on_demand_lock:
+                    self.prepare_on_demand()
+            else:
+                before = self._output_urls()
+                self.build()
+                after = self._output_urls()
+                urls = sorted(url for url in set(before) | set(after) if before.get(url) != after.get(url))
+
+        except BuildCancelled:
+            # The scheduler builds again with the new changes
+            raise
         except Exception as e:
             logger.info('*** Error while building\n%s', e)
             traceback.print_exc(file=sys.stdout)
 
-        changed_file_extension = set(map(lambda x: os.path.splitext(x)[1], changes["changed"]))
-        reload_css_file_extenstions = set([".css", ".sass", ".scss", ".styl"])
+        return urls
+
+    def _rebuilt(self, changes, urls):
+        """
+        Update the server and the browsers after a rebuild (on the loop of the server).
+        """
+        # The server has the previous version of the files in memory: it served
+        # those until now, and reads the new ones from here.
+        self.server.invalidate()
 
         # When we have changes, we want to refresh the browser tabs with the updates.
-        # Mostly we just refresh the browser except when there are just css changes,
-        # then we reload the css in place.
+        # When we know which files changed, the browsers only reload the pages that changed,
+        # or the stylesheets and images they use that changed.
+        if urls is not None:
+            if urls:
+                logger.debug('Changed: %s', ', '.join(urls))
+                self.server.reload(urls)
+            return
 
-        local_hosts = [
-            "http://127.0.0.1:%s" % self._port,
-            "http://localhost:%s" % self._port,
-            "http://0.0.0.0:%s" % self._port
-        ]
+        # Otherwise, we mostly just refresh the browser except when there are just css changes,
+        # then we reload the css in place.
+        changed_file_extension = set(map(lambda x: os.path.splitext(x)[1], changes["changed"]))
+        reload_css_file_extenstions = set([".css", ".sass", ".scss", ".styl"])
 
         if len(changes["added"]) == 0 and len(changes["deleted"]) == 0 and changed_file_extension.issubset(reload_css_file_extenstions):
-            # browserReloadCSS(local_hosts)
             self.server.reloadCSS()
         else:
-            # browserReload(local_hosts)
             self.server.reloadPage()
 
-        self.listener.resume()
-
-    def serve(self, browser=True, port=8000):
+    def serve(self, browser=True, port=8000, on_demand=False):
         """
         Start a http server and rebuild on changes.
+
+        :param on_demand: Only build pages and static files when they are requested.
         """
         self._parallel = PARALLEL_DISABLED
         self._port = port
         self.verb = self.VERB_SERVE
 
-        self.clean()
-        self.build()
+        if on_demand and self.use_translate:
+            logger.warning('Building on demand does not support translations, building the whole site')
+            on_demand = False
+
+        # No need to clean: the build manifest tells us what we can reuse
+        if on_demand:
+            self.prepare_on_demand()
+        else:
+            self.build()
 
         logger.info('Running webserver at http://127.0.0.1:%s for %s' % (port, self.build_path))
         ipc.signal("server.didstart")
         logger.info('Type control-c to exit')
 
+        # Bursts of changes are built at once, and a build stops early when what it builds changes again
+        self.scheduler = RebuildScheduler(self._rebuild, self._rebuilt)
+        self._cancelled = self.scheduler.cancelled
+
         with chdir(self.build_path):
-            self.listener = Listener(self.path, self._rebuild, ignore=self._rebuild_should_ignore)
+            self.listener = Listener(self.path, self.scheduler.add, ignore=self._rebuild_should_ignore)
             self.listener.run()
 
-        self.server = WebServer(self.build_path, port=port)
+        self.server = WebServer(self.build_path, port=port, builder=self.build_on_demand if on_demand else None)
+        self.scheduler.start(self.server.io_loop)
 
         try:
             self.server.start()
@@ -492,6 +966,10 @@ class Site(SiteCompatibilityLayer):
         except (KeyboardInterrupt, SystemExit):
             self.server.stop()
             logger.info("Bye")
+        finally:
+            self.scheduler.stop()
+            if on_demand:
+                self.save_on_demand()
 
     def upload(self):
 
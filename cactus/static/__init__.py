@@ -1,29 +1,43 @@
 #coding:utf-8
 import os
 import logging
-import tempfile
 import shutil
 
+from cactus import profiler
 from cactus.compat.paths import StaticCompatibilityLayer
-from cactus.utils.file import calculate_file_checksum, file_changed_hash
-from cactus.utils.filesystem import alt_file, mkdtemp
+from cactus.static.external import may_accept
+from cactus.utils.file import calculate_file_checksum, copy_if_changed, file_changed_hash
 from cactus.utils.url import ResourceURLHelperMixin
 
 
 logger = logging.getLogger(__name__)
 
+def process_statics(site, statics):
+    """
+    Pre-process and fingerprint static files that are pending, running the externals on all of them at once.
+    """
+    statics = [static for static in statics if static.pending]
+    site.external_runner.run([static for static in statics if static.pre_process()])
+
+    for static in statics:
+        static.fingerprint()
+
+
 class Static(StaticCompatibilityLayer, ResourceURLHelperMixin):
     """
     A static resource in the repo
     """
 
     discarded = False
+    pending = False
 
-    def __init__(self, site, path, relative_to=None):
+    def __init__(self, site, path, relative_to=None, process=True):
         """
         :param site: The site that's building this static file
         :param path: The location where this static file is to be found
         :param relative_to: Location this path is relative to. Optional, and defaults to the site's path.
+        :param process: Whether to pre-process the file (if it changed) right away. If not, it's
+                        pending until it goes through process_statics.
         """
         self.site = site
         self.path = path
@@ -45,15 +59,30 @@ class Static(StaticCompatibilityLayer, ResourceURLHelperMixin):
         # # TODO
         # assert self.src_extension, "No extension for file?! {0}".format(self.src_name)
 
-        # Do some pre-processing (e.g. optimizations):
-        # must be done before fingerprinting
-        self._preprocessing_path = self.pre_process()
+        self._preprocessing_path = None
+        self.source_hash = file_changed_hash(self.full_source_path)
+        self.source_digest = None
+        self.output_hash = None
+
+        entry = self.site.manifest.static.get(self.path)
 
+        if entry is not None and self._unchanged(entry) and self._is_built(entry):
+            # Unchanged since the last build: reuse what we know instead of pre-processing again
+            self.final_extension = entry['final_extension']
+            self.checksum = entry['checksum']
+            self.output_hash = entry['output']
+            self.discarded = entry['discarded']
+            self._set_names()
+        else:
+            self.pending = True
+            if process:
+                self.process()
+
+    def _set_names(self):
         # Where the file will have to be referenced in output files
 
-        if self.final_extension in self.site.fingerprint_extensions:
-            checksum = calculate_file_checksum(self._preprocessing_path)
-            new_name = "{0}.{1}".format(self.src_name, checksum)
+        if self.checksum is not None:
+            new_name = "{0}.{1}".format(self.src_name, self.checksum)
         else:
             new_name = self.src_name
 
@@ -62,9 +91,42 @@ class Static(StaticCompatibilityLayer, ResourceURLHelperMixin):
 
         self.final_name = "{0}.{1}".format(new_name, self.final_extension)
 
-        if not hasattr(self.site, "_static_file_cache"):
-            self.site._static_file_cache = {}
+    def _unchanged(self, entry):
+        """
+        Whether the source is the same as in a manifest entry: the stamp tells without reading
+        the file, or else (e.g. in a fresh checkout, where every file is new) the digest does.
+        """
+        if entry['source'] == self.source_hash:
+            self.source_digest = entry['digest']
+            return True
 
+        self.source_digest = self.site.digests.get(self.full_source_path)
+        return self.source_digest == entry['digest']
+
+    def _is_built(self, entry):
+        """
+        Whether the output recorded in a manifest entry is still in the build folder.
+        """
+        if entry['discarded']:
+            return True
+        return os.path.exists(os.path.join(self.site.build_path, self.src_dir, entry['final_name']))
+
+    def manifest_entry(self):
+        """
+        What we need to know to skip this file in the next build if its source does not change.
+        """
+        if self.source_digest is None:
+            self.source_digest = self.site.digests.get(self.full_source_path)
+
+        return {
+            'source': self.source_hash,
+            'digest': self.source_digest,
+            'checksum': self.checksum,
+            'final_extension': self.final_extension,
+            'final_name': self.final_name,
+            'discarded': self.discarded,
+            'output': self.output_hash,
+        }
 
     @property
     def full_source_path(self):
@@ -102,69 +164,73 @@ class Static(StaticCompatibilityLayer, ResourceURLHelperMixin):
         return "/{0}".format(self.build_path)
 
 
-    def run_externals(self, current_extension, pre_path, externals):
+    def may_be_processed(self):
         """
-        Run a set of externals against the file at pre_path
-        Only one external will run (the first one to accept the file)
-
-        Return the new extension for the file.
+        Whether any external might change this file.
         """
-        with alt_file(pre_path) as tmp_file:
-            for ExternalClass in externals:
-                external = ExternalClass(current_extension, pre_path, tmp_file)
-                external.run()
-
-                if external.accepted():
-                    return external.output_extension
-                elif external.refused():
-                    continue
-                elif external.discarded():
-                    self.discard()
-                    break
-
-                raise Exception("External {0} has an unknown status: {1}".format(external, external.status))
+        manager = self.site.external_manager
+        return any(may_accept(ExternalClass, self.src_extension)
+                   for ExternalClass in manager.processors + manager.optimizers)
 
-            return current_extension
+    def process(self):
+        """
+        Get the file ready to be built, and fingerprint it.
+        Use process_statics to do it for many files at once.
+        """
+        process_statics(self.site, [self])
 
     def pre_process(self):
         """
-        Does file pre-processing if required
+        Get the file ready for the externals to run on it, if any may change it.
+
+        Files that no external will touch are built straight from their source,
+        the others are copied to the staging folder first.
+
+        :returns: Whether the externals need to run on the file.
         """
-        self.pre_dir = mkdtemp()
-        pre_path = os.path.join(self.pre_dir, self.src_filename)
+        self.final_extension = self.src_extension
+
+        if not self.may_be_processed():
+            self._preprocessing_path = self.full_source_path
+            return False
+
+        pre_path = os.path.join(self.site.staging_path(), self.path)
+
+        try:
+            os.makedirs(os.path.dirname(pre_path))
+        except OSError:
+            pass
 
         shutil.copy(self.full_source_path, pre_path)
 
-        # Pre-process
-        logger.debug('Pre-processing: %s %s', self.src_name, self.pre_dir)
+        logger.debug('Pre-processing: %s %s', self.src_name, pre_path)
 
-        # Run processors (those might change the extension)
-        self.final_extension = self.run_externals(self.src_extension, pre_path, self.site.external_manager.processors)
+        self._preprocessing_path = pre_path
+        return True
 
-        # Optimize
-        if not self.discarded:
-            # Run optimizes and make sure they don't alter the extension
-            _ = self.run_externals(self.final_extension, pre_path, self.site.external_manager.optimizers)
-            assert self.final_extension == _, "Illegal Optimizer: may not change the extension"
-            assert not self.discarded, "Illegal Optimizer: may not discard files"
+    def fingerprint(self):
+        """
+        Compute the checksum and names of the file, once the externals ran on it.
+        """
+        if self.discarded or self.final_extension not in self.site.fingerprint_extensions:
+            self.checksum = None
+        elif self._preprocessing_path == self.full_source_path:
+            self.checksum = self.site.digests.get(self._preprocessing_path)
+        else:
+            self.checksum = calculate_file_checksum(self._preprocessing_path, self.site.digests.algorithm)
 
-        return pre_path
+        self._set_names()
+        self.pending = False
 
     def discard(self):
         self.discarded = True  #TODO: Warn on usage of the static!
 
     def build(self):
 
-        # See if we can maybe skip this if the file did not change
-        curr_hash = file_changed_hash(self.full_source_path)
-        prev_hash = self.site._static_file_cache.get(self.full_source_path)
-
-        if os.path.exists(self.full_build_path):
-            if curr_hash == prev_hash:
-                logger.debug("skip building (unchanged) %s %s", self.src_name, self.final_url)
-                return
-
-        self.site._static_file_cache[self.full_source_path] = curr_hash
+        # We can skip this if the file did not change since the last build
+        if self._preprocessing_path is None:
+            logger.debug("skip building (unchanged) %s %s", self.src_name, self.final_url)
+            return
 
         self.site.plugin_manager.preBuildStatic(self)
 
@@ -173,12 +239,27 @@ class Static(StaticCompatibilityLayer, ResourceURLHelperMixin):
 
         logger.debug('Building {0} --> {1}'.format(self.src_name, self.full_build_path))
 
-        try:
-            os.makedirs(os.path.dirname(self.full_build_path))
-        except OSError:
-            pass
+        passthrough = self._preprocessing_path == self.full_source_path
+
+        if self.checksum is not None:
+            self.output_hash = self.checksum
+        elif passthrough:
+            # Whatever identifies the content: no need to read the file for it
+            self.output_hash = self.source_hash
+        else:
+            self.output_hash = calculate_file_checksum(self._preprocessing_path, self.site.digests.algorithm)
+
+        previous = self.site.manifest.outputs.get(self.build_path)
+        if previous is not None:
+            self.site.manifest.forget_outputs([self.build_path])
+
+        # Only files built straight from their source may be hard links to it
+        hardlink = passthrough and self.site.static_hardlinks
 
-        shutil.copy(self._preprocessing_path, self.full_build_path)
+        with profiler.measure(profiler.WRITE, 'static', self.build_path):
+            if not copy_if_changed(self._preprocessing_path, self.full_build_path, self.output_hash, previous,
+                                   hardlink):
+                logger.debug('Output unchanged for %s', self.src_filename)
 
         # self.site.plugin_manager.postBuildStatic(self)
 
@@ -30,6 +30,14 @@ class External(object):
     supported_extensions = ()  # The extensions supported by this output
     output_extension = 'css'  # The extension of this processor's output
     critical = False  # Whether this External failure is critical
+    batch_size = 1  # How many files run_batch may be given at once (see _run_batch)
+    concurrency = None  # How many runs of this External may happen at the same time (None: no limit)
+    version = 0  # Bump this when the output changes for the same input, so cached outputs aren't reused
+    options = None  # Whatever else changes the output (e.g. settings from the config), for the cache
+    cacheable = True  # Whether the output only depends on the above and the input, and can be cached
+
+    status = None
+    failed = False  # Whether the External could not run
 
     def __init__(self, extension, src, dst):
         self.extension = extension
@@ -59,14 +67,63 @@ class External(object):
         try:
             self._run()
         except OSError as e:
-            msg = 'Could not call external processor {0}: {1}'.format(self.__class__.__name__, e)
+            self._failed([self], e)
+
+    @classmethod
+    def _failed(cls, externals, e):
+        for external in externals:
+            external.failed = True
+
+        msg = 'Could not call external processor {0}: {1}'.format(cls.__name__, e)
+
+        if cls.critical:
+            logger.critical(msg)
+            raise ExternalFailure(cls.__name__, e)
+        else:
+            logger.info(msg)
+            for external in externals:
+                external.refuse()
 
-            if self.critical:
-                logger.critical(msg)
-                raise ExternalFailure(self.__class__.__name__, e)
+    @classmethod
+    def run_batch(cls, externals):
+        """
+        Like run, for several files at once (at most batch_size).
+        """
+        batch = []
+
+        for external in externals:
+            if not external.extension in external.supported_extensions:
+                external.refuse()
             else:
-                logger.info(msg)
-                self.refuse()
+                external.accept()
+                batch.append(external)
+
+        if not batch:
+            return
+
+        try:
+            cls._run_batch(batch)
+        except OSError as e:
+            cls._failed(batch, e)
+
+    @classmethod
+    def _run_batch(cls, externals):
+        """
+        Externals that can process several files in one invocation of their tool
+        (saving its startup time) override this, and set batch_size.
+        """
+        for external in externals:
+            external._run()
 
     def _run(self):
         raise NotImplementedError()
+
+
+def may_accept(ExternalClass, extension):
+    """
+    Whether an external might accept a file with this extension, without running it.
+    Externals that override run() may decide on their own, so we can't rule them out.
+    """
+    if ExternalClass.run is not External.run:
+        return True
+    return extension in ExternalClass.supported_extensions
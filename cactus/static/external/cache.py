@@ -0,0 +1,90 @@
+#coding:utf-8
+import os
+import json
+import shutil
+import logging
+
+from cactus.static.external import ACCEPTED, REFUSED, DISCARDED
+from cactus.utils.cache import DiskCache
+from cactus.utils.file import calculate_file_checksum
+from cactus.utils.helpers import checksum
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExternalCache(object):
+    """
+    A cache of what externals did to static files, so unchanged files do not go
+    through them again, even in a fresh build folder (or on another machine).
+
+    Entries are keyed by the content of the input, the External (its class, version
+    and options) and the extension of the input. An entry holds the status of the
+    External (so a refused or discarded file is refused or discarded again) and the output.
+    """
+    def __init__(self, path, max_size=None):
+        self.cache = DiskCache(path, max_size)
+
+    def key(self, external):
+        ExternalClass = external.__class__
+        source = [
+            '{0}.{1}'.format(ExternalClass.__module__, ExternalClass.__name__),
+            ExternalClass.version,
+            ExternalClass.options,
+            external.extension,
+            calculate_file_checksum(external.src),
+        ]
+        return checksum(json.dumps(source, sort_keys=True, default=str).encode('utf-8'))
+
+    def replay(self, key, external):
+        """
+        Do what the External did last time on the same input, if we know.
+
+        :returns: Whether we did.
+        """
+        data = self.cache.get(key)
+        if data is None:
+            return False
+
+        try:
+            status = json.loads(data.decode('utf-8'))['status']
+        except (ValueError, KeyError):
+            return False
+
+        if status == ACCEPTED:
+            output = self.cache.get_path(key + '-output')
+            if output is None:
+                return False
+            try:
+                shutil.copyfile(output, external.dst)
+            except (IOError, OSError):
+                # The entry was evicted in the meantime
+                return False
+            external.accept()
+        elif status == REFUSED:
+            external.refuse()
+        elif status == DISCARDED:
+            external.discard()
+        else:
+            return False
+
+        logger.debug('Reused the output of %s for %s', external.__class__.__name__, external.src)
+        return True
+
+    def set(self, key, external):
+        """
+        Remember what the External did (once it ran).
+        """
+        if external.failed:
+            # It could work next time (e.g. once the tool is installed)
+            return
+
+        if external.accepted():
+            # The External wrote its output to dst, or changed src in place
+            output = external.dst if os.path.exists(external.dst) else external.src
+            self.cache.set_file(key + '-output', output)
+
+        self.cache.set(key, json.dumps({'status': external.status}).encode('utf-8'))
+
+    def evict(self):
+        self.cache.evict()
@@ -0,0 +1,172 @@
+#coding:utf-8
+import os
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cactus import profiler
+from cactus.static.external import may_accept
+from cactus.static.external.exceptions import InvalidExternal
+
+
+logger = logging.getLogger(__name__)
+
+
+class ExternalRunner(object):
+    """
+    Runs the externals on many static files at once.
+
+    Each External runs on every file that is still waiting for a processor (or optimizer)
+    before the next one gets a chance, so files can be handed to it in batches, and runs
+    can happen in parallel: externals call tools in subprocesses, so a pool of threads
+    bounds how many of those run at the same time. An External can set a lower
+    limit for itself with its concurrency attribute.
+    """
+    def __init__(self, site, workers=None):
+        self.site = site
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _limit(self, ExternalClass):
+        with self._lock:
+            limit = self._limits.get(ExternalClass)
+            if limit is None:
+                limit = self._limits[ExternalClass] = threading.BoundedSemaphore(ExternalClass.concurrency)
+            return limit
+
+    def _task(self, ExternalClass, externals, item):
+        if ExternalClass.batch_size > 1:
+            run = lambda: ExternalClass.run_batch(externals)
+        else:
+            run = externals[0].run
+
+        def task():
+            if ExternalClass.concurrency is None:
+                with profiler.measure(profiler.EXTERNAL, ExternalClass.__name__, item):
+                    run()
+            else:
+                with self._limit(ExternalClass):
+                    with profiler.measure(profiler.EXTERNAL, ExternalClass.__name__, item):
+                        run()
+
+        return task
+
+    def _tasks(self, ExternalClass, statics, externals):
+        if ExternalClass.batch_size > 1:
+            # Only give it the files it may accept, as evenly as we can between the workers
+            candidates = [(static, external) for static, external in zip(statics, externals)
+                          if external.extension in ExternalClass.supported_extensions]
+            for static, external in zip(statics, externals):
+                if external.extension not in ExternalClass.supported_extensions:
+                    external.refuse()
+
+            count = max(1, min(ExternalClass.batch_size, -(-len(candidates) // self.workers)))
+            for i in range(0, len(candidates), count):
+                batch = candidates[i:i + count]
+                item = batch[0][0].path if len(batch) == 1 else '{0} files'.format(len(batch))
+                yield self._task(ExternalClass, [external for _, external in batch], item)
+        else:
+            for static, external in zip(statics, externals):
+                yield self._task(ExternalClass, [external], static.path)
+
+    def _execute(self, tasks):
+        workers = self.workers if self.site._parallel else 1
+
+        if workers <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                task()
+            return
+
+        with ThreadPoolExecutor(min(workers, len(tasks))) as executor:
+            futures = [executor.submit(task) for task in tasks]
+            # Raises the first error (e.g. a critical External failing)
+            for future in futures:
+                future.result()
+
+    def _cache_keys(self, ExternalClass, externals):
+        """
+        :returns: The cache key for each External whose output can be cached.
+        """
+        if self.site.external_cache is None or not ExternalClass.cacheable:
+            return {}
+
+        return dict((external, self.site.external_cache.key(external)) for external in externals
+                    if may_accept(ExternalClass, external.extension))
+
+    def _run_externals(self, statics, externals):
+        """
+        Run a set of externals against the pre-processed files of statics.
+        Only one external runs on a file (the first one to accept it).
+
+        :returns: The new extension of each static, that was not discarded.
+        """
+        extensions = dict((static, static.final_extension) for static in statics)
+        remaining = list(statics)
+
+        try:
+            for ExternalClass in externals:
+                if not remaining:
+                    break
+
+                runs = [ExternalClass(extensions[static], static._preprocessing_path,
+                                      static._preprocessing_path + '-alt') for static in remaining]
+
+                keys = self._cache_keys(ExternalClass, runs)
+
+                pending = [(static, external) for static, external in zip(remaining, runs)
+                           if not (external in keys and self.site.external_cache.replay(keys[external], external))]
+
+                if pending:
+                    self._execute(list(self._tasks(ExternalClass, *zip(*pending))))
+
+                for _, external in pending:
+                    if external in keys:
+                        self.site.external_cache.set(keys[external], external)
+
+                waiting = []
+                for static, external in zip(remaining, runs):
+                    if external.accepted():
+                        extensions[static] = external.output_extension
+                    elif external.refused():
+                        waiting.append(static)
+                    elif external.discarded():
+                        static.discard()
+                        del extensions[static]
+                    else:
+                        raise Exception("External {0} has an unknown status: {1}".format(external, external.status))
+
+                remaining = waiting
+        finally:
+            for static in statics:
+                try:
+                    shutil.move(static._preprocessing_path + '-alt', static._preprocessing_path)
+                except IOError:
+                    # We didn't use an alt file.
+                    pass
+
+        return extensions
+
+    def run(self, statics):
+        """
+        Run the processors, then the optimizers, on the pre-processed files of statics.
+        """
+        if not statics:
+            return
+
+        manager = self.site.external_manager
+
+        # Run processors (those might change the extension)
+        for static, extension in self._run_externals(statics, manager.processors).items():
+            static.final_extension = extension
+
+        # Run optimizers and make sure they don't alter the extension
+        statics = [static for static in statics if not static.discarded]
+        optimized = self._run_externals(statics, manager.optimizers)
+
+        for static in statics:
+            if static.discarded:
+                raise InvalidExternal("Illegal Optimizer: may not discard files")
+            if optimized[static] != static.final_extension:
+                raise InvalidExternal("Illegal Optimizer: may not change the extension")
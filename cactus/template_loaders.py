@@ -0,0 +1,61 @@
+#coding:utf-8
+import os
+
+from django.template import Template, TemplateDoesNotExist
+from django.template.loaders import filesystem
+
+from cactus import dependencies
+
+
+class Loader(filesystem.Loader):
+    """
+    Filesystem loader that records every template file it looks at as a
+    dependency of the page being rendered, including the ones that do not exist
+    (yet), so that adding a template that shadows another one is noticed too.
+
+    Compiled templates are kept for as long as the file's mtime and size do not
+    change, so they are shared by all the pages and every rebuild of the site.
+    """
+    def __init__(self, engine, dirs=None):
+        super(Loader, self).__init__(engine, dirs)
+        self.template_cache = {}
+
+    def get_contents(self, origin):
+        dependencies.record(dependencies.FILE, origin.name)
+        return super(Loader, self).get_contents(origin)
+
+    def get_template(self, template_name, skip=None):
+        tried = []
+
+        for origin in self.get_template_sources(template_name):
+            if skip is not None and origin in skip:
+                tried.append((origin, "Skipped to avoid recursion"))
+                continue
+
+            # Cache hits must be recorded too
+            dependencies.record(dependencies.FILE, origin.name)
+
+            try:
+                info = os.stat(origin.name)
+            except OSError:
+                tried.append((origin, "Source does not exist"))
+                continue
+
+            key = (origin.name, origin.template_name)
+            stamp = (info.st_mtime_ns, info.st_size)
+
+            cached = self.template_cache.get(key)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+
+            try:
+                contents = self.get_contents(origin)
+            except TemplateDoesNotExist:
+                tried.append((origin, "Source does not exist"))
+                continue
+
+            template = Template(contents, origin, origin.template_name, self.engine)
+            self.template_cache[key] = (stamp, template)
+            return template
+
+        raise TemplateDoesNotExist(template_name, tried=tried)
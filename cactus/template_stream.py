@@ -0,0 +1,169 @@
+#coding:utf-8
+from django.template.base import TextNode, VariableDoesNotExist
+from django.template.defaulttags import ForNode, IfNode, WithNode
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockContext, BlockNode, ExtendsNode
+
+
+def stream(template, context):
+    """
+    Render a template in chunks, so the whole output never has to be in memory at once.
+
+    The output is the same as template.render(context). {% extends %}, {% block %}, {% for %},
+    {% if %} and {% with %} are followed (so a loop over a long listing is streamed item by item),
+    other tags (e.g. an {% include %}) are rendered as one chunk each.
+    """
+    with context.render_context.push_state(template):
+        if context.template is None:
+            with context.bind_template(template):
+                context.template_name = template.name
+                for chunk in _stream_nodelist(template.nodelist, context):
+                    yield chunk
+        else:
+            for chunk in _stream_nodelist(template.nodelist, context):
+                yield chunk
+
+
+def _stream_nodelist(nodelist, context):
+    for node in nodelist:
+        if isinstance(node, ExtendsNode):
+            for chunk in _stream_extends(node, context):
+                yield chunk
+        elif isinstance(node, BlockNode):
+            for chunk in _stream_block(node, context):
+                yield chunk
+        elif isinstance(node, ForNode):
+            for chunk in _stream_for(node, context):
+                yield chunk
+        elif isinstance(node, IfNode):
+            for chunk in _stream_if(node, context):
+                yield chunk
+        elif isinstance(node, WithNode):
+            for chunk in _stream_with(node, context):
+                yield chunk
+        else:
+            yield node.render_annotated(context)
+
+
+def _stream_extends(node, context):
+    # Follows ExtendsNode.render
+    compiled_parent = node.get_parent(context)
+
+    if BLOCK_CONTEXT_KEY not in context.render_context:
+        context.render_context[BLOCK_CONTEXT_KEY] = BlockContext()
+    block_context = context.render_context[BLOCK_CONTEXT_KEY]
+
+    block_context.add_blocks(node.blocks)
+
+    # If the parent does not extend another template, its blocks are the root ones
+    for parent_node in compiled_parent.nodelist:
+        if not isinstance(parent_node, TextNode):
+            if not isinstance(parent_node, ExtendsNode):
+                blocks = dict((n.name, n) for n in compiled_parent.nodelist.get_nodes_by_type(BlockNode))
+                block_context.add_blocks(blocks)
+            break
+
+    with context.render_context.push_state(compiled_parent, isolated_context=False):
+        for chunk in _stream_nodelist(compiled_parent.nodelist, context):
+            yield chunk
+
+
+def _stream_block(node, context):
+    # Follows BlockNode.render
+    block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+
+    with context.push():
+        if block_context is None:
+            context['block'] = node
+            for chunk in _stream_nodelist(node.nodelist, context):
+                yield chunk
+        else:
+            push = block = block_context.pop(node.name)
+            if block is None:
+                block = node
+            block = type(node)(block.name, block.nodelist)
+            block.context = context
+            context['block'] = block
+            for chunk in _stream_nodelist(block.nodelist, context):
+                yield chunk
+            if push is not None:
+                block_context.push(node.name, push)
+
+
+def _stream_for(node, context):
+    # Follows ForNode.render
+    if 'forloop' in context:
+        parentloop = context['forloop']
+    else:
+        parentloop = {}
+
+    with context.push():
+        values = node.sequence.resolve(context, ignore_failures=True)
+        if values is None:
+            values = []
+        if not hasattr(values, '__len__'):
+            values = list(values)
+        len_values = len(values)
+
+        if len_values < 1:
+            for chunk in _stream_nodelist(node.nodelist_empty, context):
+                yield chunk
+            return
+
+        if node.is_reversed:
+            values = reversed(values)
+        num_loopvars = len(node.loopvars)
+        unpack = num_loopvars > 1
+
+        loop_dict = context['forloop'] = {'parentloop': parentloop}
+
+        for i, item in enumerate(values):
+            loop_dict['counter0'] = i
+            loop_dict['counter'] = i + 1
+            loop_dict['revcounter'] = len_values - i
+            loop_dict['revcounter0'] = len_values - i - 1
+            loop_dict['first'] = (i == 0)
+            loop_dict['last'] = (i == len_values - 1)
+
+            pop_context = False
+            if unpack:
+                try:
+                    len_item = len(item)
+                except TypeError:
+                    len_item = 1
+                if num_loopvars != len_item:
+                    raise ValueError('Need {0} values to unpack in for loop; got {1}. '.format(num_loopvars, len_item))
+                context.update(dict(zip(node.loopvars, item)))
+                pop_context = True
+            else:
+                context[node.loopvars[0]] = item
+
+            for chunk in _stream_nodelist(node.nodelist_loop, context):
+                yield chunk
+
+            if pop_context:
+                context.pop()
+
+
+def _stream_if(node, context):
+    # Follows IfNode.render
+    for condition, nodelist in node.conditions_nodelists:
+        if condition is not None:
+            try:
+                match = condition.eval(context)
+            except VariableDoesNotExist:
+                match = None
+        else:
+            match = True
+
+        if match:
+            for chunk in _stream_nodelist(nodelist, context):
+                yield chunk
+            return
+
+
+def _stream_with(node, context):
+    # Follows WithNode.render
+    values = dict((key, value.resolve(context)) for key, value in node.extra_context.items())
+    with context.push(**values):
+        for chunk in _stream_nodelist(node.nodelist, context):
+            yield chunk
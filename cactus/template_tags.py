@@ -1,4 +1,3 @@
-import os
 import logging
 
 from django.conf import settings
@@ -28,21 +27,13 @@ def static(context, link_url):
 
     if url is None:
 
-        # For the static method we check if we need to add a prefix
-        helper_keys = [
-            "/static/" + link_url,
-            "/static"  + link_url,
-            "static/"  + link_url
-        ]
+        # For the static method we check if we need to add a prefix (e.g. css/style.css)
+        url_alias = site.get_url_for_static_alias(link_url)
 
-        for helper_key in helper_keys:
-
-            url_helper_key = site.get_url_for_static(helper_key)
-
-            if url_helper_key is not None:
-                if site.root_url is not None:
-                    url_helper_key = add_root_url(url_helper_key, site.root_url)
-                return url_helper_key
+        if url_alias is not None:
+            if site.root_url is not None:
+                url_alias = add_root_url(url_alias, site.root_url)
+            return url_alias
 
         logger.warning('%s: static resource does not exist: %s', page.link_url, link_url)
 
@@ -67,10 +58,7 @@ def url(context, link_url):
     if url is None:
 
         # See if we're trying to link to an /subdir/index.html with /subdir
-        link_url_index = os.path.join(link_url, "index.html")
-        url_link_url_index = site.get_url_for_page(link_url_index)
-
-        if url_link_url_index is None:
+        if site.get_url_for_page_alias(link_url) is None:
             logger.warning('%s: page resource does not exist: %s', page.link_url, link_url)
 
         url = link_url
@@ -1,10 +1,15 @@
 #coding:utf-8
 import os
+import asyncio
 import tempfile
 import shutil
 import unittest
 
 import django.conf
+from tornado.httpclient import AsyncHTTPClient
+from tornado.httpserver import HTTPServer
+from tornado.ioloop import IOLoop
+from tornado.testing import bind_unused_port
 
 from cactus.site import Site
 from cactus.bootstrap import bootstrap
@@ -66,11 +71,74 @@ class SiteTestCase(BaseBootstrappedTestCase):
             self.conf.set(k, v)
         self.conf.write()
 
-        self.site = Site(self.path, [self.config_path])
-        self.site._parallel = PARALLEL_DISABLED
+        self.site = self.new_site()
+
+    def new_site(self):
+        """
+        A new site for the same project, as if we were running cactus again.
+        """
+        self.clear_django_settings()
+        site = Site(self.path, [self.config_path])
+        site._parallel = PARALLEL_DISABLED
+        return site
 
     def get_config_for_test(self):
         """
         Hook to set config keys in other tests.
         """
         return {}
+
+
+class IOLoopTestCase(unittest.TestCase):
+    """
+    Runs each test with a Tornado IOLoop of its own, as the current one.
+
+    We don't use tornado.testing.AsyncTestCase: it wraps the test method it's created for,
+    and pytest creates test cases for a "runTest" method to inspect them, which fails.
+    """
+    timeout = 5
+
+    def setUp(self):
+        super(IOLoopTestCase, self).setUp()
+        self.asyncio_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.asyncio_loop)
+        self.io_loop = IOLoop.current()
+
+    def tearDown(self):
+        self.io_loop.close(all_fds=True)
+        asyncio.set_event_loop(None)
+        super(IOLoopTestCase, self).tearDown()
+
+    def run_sync(self, f):
+        """
+        Run f (a coroutine function) on the loop until it's done, and return its result.
+        """
+        return self.io_loop.run_sync(f, timeout=self.timeout)
+
+
+class HTTPServerTestCase(IOLoopTestCase):
+    """
+    Serves the application returned by get_app on a free port, for fetch.
+    """
+    def setUp(self):
+        super(HTTPServerTestCase, self).setUp()
+        sock, self.port = bind_unused_port()
+        self.http_server = HTTPServer(self.get_app())
+        self.http_server.add_sockets([sock])
+        self.http_client = AsyncHTTPClient()
+
+    def tearDown(self):
+        self.http_server.stop()
+        self.run_sync(self.http_server.close_all_connections)
+        self.http_client.close()
+        super(HTTPServerTestCase, self).tearDown()
+
+    def get_app(self):
+        raise NotImplementedError()
+
+    def fetch(self, path, **kwargs):
+        """
+        Request path from the server, and return the response (errors included).
+        """
+        url = 'http://127.0.0.1:{0}{1}'.format(self.port, path)
+        return self.run_sync(lambda: self.http_client.fetch(url, raise_error=False, **kwargs))
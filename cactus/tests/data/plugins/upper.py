@@ -0,0 +1,5 @@
+#coding:utf-8
+
+def postRenderPage(page, chunks):
+    for chunk in chunks:
+        yield chunk.upper()
@@ -0,0 +1,43 @@
+#coding:utf-8
+import os
+
+import mock
+
+from cactus import bench
+from cactus.cli import parse_arguments
+from cactus.tests import BaseTestCase
+
+
+class TestBench(BaseTestCase):
+    def test_generate_site(self):
+        bench.generate_site(self.path, pages=3, depth=2, statics=4)
+
+        site = bench._new_site(self.path)
+        site.build()
+
+        with open(os.path.join(site.build_path, 'bench', 'page-1', 'index.html')) as f:
+            page = f.read()
+
+        self.assertIn('<h1>Page 1</h1>', page)
+        self.assertIn('class="level-1"', page)
+        self.assertIn('href="/bench/page-2/"', page)
+        self.assertIn(site.get_url_for_static('/static/bench/file-1.js'), page)
+        self.assertNotEqual('/static/bench/file-1.js', site.get_url_for_static('/static/bench/file-1.js'))
+
+    def test_run(self):
+        report = bench.run(os.path.join(self.test_dir, 'bench'), pages=3, depth=1, statics=2, repeat=1, tags=10)
+
+        self.assertEqual(3, report['parameters']['pages'])
+        self.assertEqual(
+            ['cold_build', 'single_page_rebuild', 'static_tags_per_second', 'url_tags_per_second', 'warm_build'],
+            sorted(report['results']))
+        self.assertIn('cold_build', bench.summary(report))
+
+    def test_arguments(self):
+        ns = parse_arguments(mock.Mock(), ['bench', '--pages', '1', '--repeat', '1'])
+        self.assertEqual((1, 1), (ns.pages, ns.repeat))
+
+        # The benchmarks need a page to render, and a run to report
+        with mock.patch('sys.stderr'):
+            self.assertRaises(SystemExit, parse_arguments, mock.Mock(), ['bench', '--pages', '0'])
+            self.assertRaises(SystemExit, parse_arguments, mock.Mock(), ['bench', '--repeat', '0'])
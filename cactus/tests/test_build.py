@@ -1,9 +1,14 @@
 #coding:utf-8
 import os
+import time
 import tempfile
 
+import mock
+
+from cactus.site import Site
 from cactus.tests import SiteTestCase
 from cactus.tests.compat import has_symlink
+from cactus.utils.parallel import PARALLEL_CONSERVATIVE, processes_available
 import unittest
 
 class TestBuild(SiteTestCase):
@@ -98,3 +103,66 @@ class TestBuild(SiteTestCase):
 
         # Test for ignore function to work with symlinks
         self.assertEqual(self.site._rebuild_should_ignore(link_path), False)
+
+
+class TestProcessBuild(SiteTestCase):
+    def get_config_for_test(self):
+        return {"render-processes": 2}
+
+    @unittest.skipUnless(processes_available(), "No fork support")
+    def test_build(self):
+        for i in range(10):
+            with open(os.path.join(self.site.page_path, 'page-{0}.html'.format(i)), "w") as f:
+                f.write("{% extends 'base.html' %}{% block content %}" + str(i) + "{% endblock %}")
+
+        self.site.build()
+
+        for i in range(10):
+            self.assertFileExists(os.path.join(self.site.build_path, 'page-{0}.html'.format(i)))
+            self.assertIn(
+                os.path.join(self.site.template_path, 'base.html'),
+                self.site.dependencies.records['page-{0}.html'.format(i)]['dependencies']['file'])
+
+
+class TestLocaleBuild(SiteTestCase):
+    def get_config_for_test(self):
+        return {"use_translate": True, "default_language": "en", "other_languages": ["fr", "de"]}
+
+    def assertLanguagesBuilt(self):
+        self.assertEqual(self.site.build_path, os.path.join(self.path, '.build'))
+
+        for language in ["en", "fr", "de"]:
+            with open(os.path.join(self.site.build_path, language, 'language.html')) as f:
+                self.assertEqual(language, f.read())
+
+    def setUp(self):
+        super(TestLocaleBuild, self).setUp()
+
+        with open(os.path.join(self.site.page_path, 'language.html'), "w") as f:
+            f.write("{% load i18n %}{% get_current_language as language %}{{ language }}")
+
+    def test_build(self):
+        # Compiling messages needs gettext
+        with mock.patch.object(Site, "compile_messages"):
+            self.site.build()
+
+        self.assertLanguagesBuilt()
+
+    @unittest.skipUnless(processes_available(), "No process support")
+    def test_build_in_processes(self):
+        self.site._parallel = PARALLEL_CONSERVATIVE
+        self.assertFileDoesNotExist(self.site.build_path)
+
+        build_with_translation = Site.build_with_translation
+
+        def slow_default(site, locale_item=None, **kwargs):
+            # The locales start building before the default language
+            if locale_item is None:
+                time.sleep(.5)
+            build_with_translation(site, locale_item, **kwargs)
+
+        with mock.patch.object(Site, "compile_messages"):
+            with mock.patch.object(Site, "build_with_translation", autospec=True, side_effect=slow_default):
+                self.site.build()
+
+        self.assertLanguagesBuilt()
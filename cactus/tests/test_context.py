@@ -1,5 +1,9 @@
 #coding:utf-8
 import os
+
+import mock
+
+from cactus.page import Page
 from cactus.tests import SiteTestCase
 
 
@@ -64,3 +68,35 @@ class TestCustomPageContext(SiteTestCase):
 
         self.assertEqual(a, "1")
         self.assertEqual(b, "Monkey")
+
+
+class TestYAMLPageContext(SiteTestCase):
+    """
+    Test that a YAML header is parsed once, and again when the page changes.
+    """
+    def setUp(self):
+        super(TestYAMLPageContext, self).setUp()
+
+        self.page_path = os.path.join(self.site.page_path, "test.html")
+        with open(self.page_path, "w") as f:
+            f.write("---\ntitle: Hello\ntags: [a, b]\n...\n{{ title }} {{ tags|join:',' }}")
+
+    def test_yaml_context(self):
+        self.site.build()
+
+        with open(os.path.join(self.site.build_path, "test.html")) as f:
+            self.assertEqual(f.read().strip(), "Hello a,b")
+
+    def test_parsed_once(self):
+        page = [p for p in self.site.pages() if p.source_path == "test.html"][0]
+
+        with mock.patch.object(Page, "data", autospec=True, side_effect=Page.data) as data:
+            self.assertEqual(page.context()["title"], "Hello")
+            self.assertEqual(page.context()["title"], "Hello")
+            self.assertEqual(1, data.call_count)
+
+            with open(self.page_path, "w") as f:
+                f.write("---\ntitle: Changed title\n...\n")
+
+            self.assertEqual(page.context()["title"], "Changed title")
+            self.assertEqual(2, data.call_count)
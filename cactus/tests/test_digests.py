@@ -0,0 +1,92 @@
+#coding:utf-8
+import os
+import time
+import hashlib
+import tempfile
+import shutil
+import unittest
+
+import mock
+
+from cactus import digests
+from cactus.digests import DigestCache
+
+
+class TestDigestCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.test_dir, 'cache', 'digests')
+        self.path = os.path.join(self.test_dir, 'file.txt')
+        self.write(b'content')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, data, age=60):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+        # Old enough not to be racy
+        mtime = time.time() - age
+        os.utime(self.path, (mtime, mtime))
+
+    def get(self, cache):
+        with mock.patch.object(digests, "calculate_file_checksum", side_effect=digests.calculate_file_checksum) as hashed:
+            digest = cache.get(self.path)
+        return digest, hashed.call_count
+
+    def test_cached(self):
+        cache = DigestCache(self.cache_path)
+        self.assertEqual((hashlib.md5(b'content').hexdigest(), 1), self.get(cache))
+        self.assertEqual((hashlib.md5(b'content').hexdigest(), 0), self.get(cache))
+
+    def test_persisted(self):
+        cache = DigestCache(self.cache_path)
+        self.get(cache)
+        cache.write()
+
+        self.assertEqual((hashlib.md5(b'content').hexdigest(), 0), self.get(DigestCache(self.cache_path)))
+
+        # Another algorithm can't use these
+        self.assertEqual((hashlib.sha1(b'content').hexdigest(), 1), self.get(DigestCache(self.cache_path, 'sha1')))
+
+    def test_renamed(self):
+        cache = DigestCache(self.cache_path)
+        self.get(cache)
+
+        new_path = os.path.join(self.test_dir, 'renamed.txt')
+        os.rename(self.path, new_path)
+        self.path = new_path
+
+        self.assertEqual((hashlib.md5(b'content').hexdigest(), 0), self.get(cache))
+
+    def test_changed(self):
+        cache = DigestCache(self.cache_path)
+        self.get(cache)
+
+        self.write(b'other content', age=30)
+        self.assertEqual((hashlib.md5(b'other content').hexdigest(), 1), self.get(cache))
+
+    def test_racy(self):
+        cache = DigestCache(self.cache_path)
+        self.write(b'content', age=0)
+
+        self.get(cache)
+        self.assertEqual(1, self.get(cache)[1])
+
+    def test_max_entries(self):
+        cache = DigestCache(self.cache_path, max_entries=1)
+        self.get(cache)
+        cache.write()
+
+        other = os.path.join(self.test_dir, 'other.txt')
+        shutil.copy(self.path, other)
+        os.utime(other, (time.time() - 60, time.time() - 60))
+        cache.get(other)
+        cache.write()
+
+        # The entry used last is kept
+        cache = DigestCache(self.cache_path, max_entries=1)
+        self.assertEqual(1, self.get(cache)[1])
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(ValueError, DigestCache, self.cache_path, 'nope')
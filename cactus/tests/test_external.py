@@ -1,10 +1,16 @@
 #coding:utf-8
 import os
 import shutil
-from cactus.static.external.exceptions import ExternalFailure
+import threading
+
+import mock
 
-from cactus.static.external import External
+from cactus.static import Static
+from cactus.static.external.exceptions import ExternalFailure
+from cactus.static.external import External, may_accept
 from cactus.tests import SiteTestCase
+from cactus.utils.file import copy_file
+from cactus.utils.parallel import PARALLEL_CONSERVATIVE
 
 
 class TestExternal(External):
@@ -72,6 +78,13 @@ class DiscardingProcessor(DummyProc):
         self.discard()
 
 
+class PlainOptimizer(External):
+    supported_extensions = ('dst',)
+    output_extension = 'dst'
+
+    def _run(self):
+        shutil.move(self.src, self.dst)
+
 
 class TestStaticExternals(SiteTestCase):
     """
@@ -158,3 +171,243 @@ class TestStaticExternals(SiteTestCase):
         for static in self.site.static():
             if static.src_filename == self.dummy_static:
                 self.assertTrue(static.discarded)
+
+
+class TestStaticPassthrough(SiteTestCase):
+    """
+    Test that files no external may touch are built straight from their source.
+    """
+    def setUp(self):
+        super(TestStaticPassthrough, self).setUp()
+        self.site.external_manager.clear()
+
+        self.source = os.path.join(self.site.static_path, 'test.src')
+        with open(self.source, 'w') as f:
+            f.write('content')
+
+        self.output = os.path.join(self.site.build_path, 'static', 'test.src')
+
+    def build(self):
+        """
+        Build the site, and return the static files that were staged.
+        """
+        self.site.build()
+        return sorted(static.src_filename for static in self.site.static()
+                      if static._preprocessing_path != static.full_source_path)
+
+    def test_may_accept(self):
+        self.assertFalse(may_accept(PlainOptimizer, 'src'))
+        self.assertTrue(may_accept(PlainOptimizer, 'dst'))
+
+        # Externals that override run decide on their own
+        self.assertTrue(may_accept(DummyOptimizer, 'src'))
+
+    def test_passthrough(self):
+        self.site.external_manager.register_optimizer(PlainOptimizer)
+
+        self.assertEqual([], self.build())
+
+        with open(self.output) as f:
+            self.assertEqual('content', f.read())
+        self.assertNotEqual(os.stat(self.source).st_ino, os.stat(self.output).st_ino)
+
+    def test_hardlinks(self):
+        self.site.static_hardlinks = True
+        self.build()
+
+        self.assertEqual(os.stat(self.source).st_ino, os.stat(self.output).st_ino)
+
+        # Replacing the output does not write through the link
+        other = os.path.join(self.path, 'other.src')
+        with open(other, 'w') as f:
+            f.write('other content')
+        copy_file(other, self.output)
+
+        with open(self.source) as f:
+            self.assertEqual('content', f.read())
+        with open(self.output) as f:
+            self.assertEqual('other content', f.read())
+
+    def test_staging(self):
+        self.site.external_manager.register_processor(DummyProc)
+        staged = []
+        original = Static.pre_process
+
+        def pre_process(static):
+            staged.append(static.site.staging_path())
+            return original(static)
+
+        with mock.patch.object(Static, "pre_process", autospec=True, side_effect=pre_process):
+            self.site.build()
+
+        self.assertEqual(1, len(set(staged)))
+        self.assertFileExists(os.path.join(self.site.build_path, 'static', 'test.dst'))
+
+        # The staging folder is gone once the build is done
+        self.assertFalse(os.path.exists(staged[0]))
+
+
+class BatchOptimizer(External):
+    supported_extensions = ('src',)
+    output_extension = 'src'
+    batch_size = 2
+    batches = []
+
+    @classmethod
+    def _run_batch(cls, externals):
+        cls.batches.append(sorted(os.path.basename(external.src) for external in externals))
+        for external in externals:
+            with open(external.dst, 'w') as f:
+                f.write('optimized')
+
+
+class ParallelOptimizer(External):
+    supported_extensions = ('src',)
+    output_extension = 'src'
+    barrier = None
+
+    def _run(self):
+        # Only passes if both files are optimized at the same time
+        self.barrier.wait()
+
+
+class LimitedOptimizer(External):
+    supported_extensions = ('src',)
+    output_extension = 'src'
+    concurrency = 1
+    lock = threading.Lock()
+    active = 0
+    most_active = 0
+
+    def _run(self):
+        cls = LimitedOptimizer
+        with cls.lock:
+            cls.active += 1
+            cls.most_active = max(cls.most_active, cls.active)
+        threading.Event().wait(0.05)
+        with cls.lock:
+            cls.active -= 1
+
+
+class TestExternalRunner(SiteTestCase):
+    """
+    Test that externals run in batches and in parallel.
+    """
+    def setUp(self):
+        super(TestExternalRunner, self).setUp()
+        self.site.external_manager.clear()
+        self.site._parallel = PARALLEL_CONSERVATIVE
+
+        for name in ['a.src', 'b.src', 'c.src']:
+            with open(os.path.join(self.site.static_path, name), 'w') as f:
+                f.write(name)
+
+    def test_batches(self):
+        BatchOptimizer.batches = []
+        self.site.external_runner.workers = 1
+        self.site.external_manager.register_optimizer(BatchOptimizer)
+        self.site.build()
+
+        self.assertEqual([1, 2], sorted(len(batch) for batch in BatchOptimizer.batches))
+        self.assertEqual(['a.src', 'b.src', 'c.src'], sorted(sum(BatchOptimizer.batches, [])))
+
+        for name in ['a.src', 'b.src', 'c.src']:
+            with open(os.path.join(self.site.build_path, 'static', name)) as f:
+                self.assertEqual('optimized', f.read())
+
+    def test_parallel(self):
+        ParallelOptimizer.barrier = threading.Barrier(3, timeout=10)
+        self.site.external_runner.workers = 3
+        self.site.external_manager.register_optimizer(ParallelOptimizer)
+        self.site.build()
+
+    def test_concurrency(self):
+        LimitedOptimizer.most_active = 0
+        self.site.external_runner.workers = 3
+        self.site.external_manager.register_optimizer(LimitedOptimizer)
+        self.site.build()
+
+        self.assertEqual(1, LimitedOptimizer.most_active)
+
+
+class CountingProc(External):
+    supported_extensions = ('src',)
+    output_extension = 'dst'
+    calls = 0
+
+    def _run(self):
+        CountingProc.calls += 1
+        with open(self.src) as src, open(self.dst, 'w') as dst:
+            dst.write(src.read().upper())
+
+
+class CountingDiscardingProc(CountingProc):
+    def _run(self):
+        CountingProc.calls += 1
+        self.discard()
+
+
+class CountingFailingProc(CountingProc):
+    def _run(self):
+        CountingProc.calls += 1
+        raise OSError('Error.')
+
+
+class TestExternalCache(SiteTestCase):
+    """
+    Test that what externals do is cached.
+    """
+    def get_config_for_test(self):
+        return {"external-cache": ".cache/externals"}
+
+    def setUp(self):
+        super(TestExternalCache, self).setUp()
+        CountingProc.calls = 0
+
+        with open(os.path.join(self.site.static_path, 'test.src'), 'w') as f:
+            f.write('content')
+
+    def build(self, *processors):
+        """
+        Build from scratch, and return how many times the processors ran.
+        """
+        self.site.clean()
+        self.site.external_manager.clear()
+        for processor in processors:
+            self.site.external_manager.register_processor(processor)
+
+        calls = CountingProc.calls
+        self.site.build()
+        return CountingProc.calls - calls
+
+    def test_cached(self):
+        self.assertEqual(1, self.build(CountingProc))
+        self.assertEqual(0, self.build(CountingProc))
+
+        with open(os.path.join(self.site.build_path, 'static', 'test.dst')) as f:
+            self.assertEqual('CONTENT', f.read())
+
+        # A new version of the processor runs again
+        with mock.patch.object(CountingProc, 'version', 1):
+            self.assertEqual(1, self.build(CountingProc))
+
+        with mock.patch.object(CountingProc, 'options', {'uppercase': False}):
+            self.assertEqual(1, self.build(CountingProc))
+
+        # So does a changed file
+        with open(os.path.join(self.site.static_path, 'test.src'), 'w') as f:
+            f.write('new content')
+        self.assertEqual(1, self.build(CountingProc))
+
+    def test_discard(self):
+        self.assertEqual(1, self.build(CountingDiscardingProc))
+        self.assertEqual(0, self.build(CountingDiscardingProc))
+
+        for static in self.site.static():
+            if static.src_filename == 'test.src':
+                self.assertTrue(static.discarded)
+
+    def test_failure(self):
+        self.assertEqual(1, self.build(CountingFailingProc))
+        self.assertEqual(1, self.build(CountingFailingProc))
+        self.assertFileExists(os.path.join(self.site.build_path, 'static', 'test.src'))
@@ -83,3 +83,28 @@ class TestFingerprintingValues(TestFingerPrintingMixin, SiteTestCase):
 
         self.site.build()
         self.assertTrue(expected_checksum in self.site.get_url_for_static("/static/data.dat"))
+
+    def test_fingerprinting_large_file(self):
+        payload = b"\x02" * (3 * 1024 * 1024 + 5)
+        expected_checksum = hashlib.md5(payload).hexdigest()
+
+        with io.FileIO(os.path.join(self.path, "static", "data.dat"), "w") as f:
+            f.write(payload)
+
+        self.site.build()
+        self.assertTrue(expected_checksum in self.site.get_url_for_static("/static/data.dat"))
+
+
+class TestFingerprintingAlgorithm(SiteTestCase):
+    def get_config_for_test(self):
+        return {"fingerprint": ["dat"], "fingerprint-algorithm": "blake2b"}
+
+    def test_fingerprinting_algorithm(self):
+        payload = b"\x01" * 1024
+        expected_checksum = hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+        with io.FileIO(os.path.join(self.path, "static", "data.dat"), "w") as f:
+            f.write(payload)
+
+        self.site.build()
+        self.assertEqual("/static/data.{0}.dat".format(expected_checksum), self.site.get_url_for_static("/static/data.dat"))
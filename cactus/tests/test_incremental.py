@@ -0,0 +1,146 @@
+#coding:utf-8
+import os
+
+import mock
+
+from cactus.page import Page
+from cactus.tests import SiteTestCase
+
+
+class TestIncrementalBuild(SiteTestCase):
+    def get_config_for_test(self):
+        return {"context": {"a": "1", "b": "2"}}
+
+    def setUp(self):
+        super(TestIncrementalBuild, self).setUp()
+
+        with open(os.path.join(self.site.template_path, "partial.html"), "w") as f:
+            f.write("partial")
+
+        with open(os.path.join(self.site.page_path, "include.html"), "w") as f:
+            f.write("{% include 'partial.html' %}")
+
+        with open(os.path.join(self.site.page_path, "link.html"), "w") as f:
+            f.write("{% url '/new.html' %}")
+
+        with open(os.path.join(self.site.page_path, "config.html"), "w") as f:
+            f.write("{% config 'test-value' %}")
+
+        with open(os.path.join(self.site.page_path, "context.html"), "w") as f:
+            f.write("{{ a }}{{ c }}")
+
+        with open(os.path.join(self.site.page_path, "post.html"), "w") as f:
+            f.write("title: First\n\npost")
+
+        with open(os.path.join(self.site.page_path, "list.html"), "w") as f:
+            f.write("{% for pg in CACTUS.pages %}{% if pg.context.title %}[{{ pg.context.title }}]{% endif %}{% endfor %}")
+
+        self.site.build()
+
+    def rebuild(self):
+        """
+        Rebuild incrementally and return the source paths of the pages that were rendered.
+        """
+        with mock.patch.object(Page, "build", autospec=True, side_effect=Page.build) as build:
+            self.site.build(incremental=True)
+        return sorted(call[0][0].source_path for call in build.call_args_list)
+
+    def test_nothing_changed(self):
+        self.assertEqual([], self.rebuild())
+
+    def test_page_changed(self):
+        with open(os.path.join(self.site.page_path, "include.html"), "w") as f:
+            f.write("changed")
+
+        # The list reads the context of every page
+        self.assertEqual(["include.html", "list.html"], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "include.html")) as f:
+            self.assertEqual("changed", f.read())
+
+    def test_template_changed(self):
+        with open(os.path.join(self.site.template_path, "partial.html"), "w") as f:
+            f.write("partial changed")
+
+        self.assertEqual(["include.html"], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "include.html")) as f:
+            self.assertEqual("partial changed", f.read())
+
+    def test_base_template_changed(self):
+        with open(os.path.join(self.site.template_path, "base.html"), "a") as f:
+            f.write("\n")
+
+        self.assertEqual(["error.html", "index.html"], self.rebuild())
+
+    def test_listed_page_changed(self):
+        with open(os.path.join(self.site.page_path, "post.html"), "w") as f:
+            f.write("title: Second\n\npost")
+
+        # The list reads the title of the post
+        self.assertEqual(["list.html", "post.html"], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "list.html")) as f:
+            self.assertEqual("[Second]", f.read())
+
+    def test_page_read_by_plugin_changed(self):
+        with open(os.path.join(self.site.plugin_path, "titles.py"), "w") as f:
+            f.write("def preBuild(site):\n    site.titles = [page.context().get('title') for page in site.pages()]\n")
+        self.site.build()
+
+        with open(os.path.join(self.site.page_path, "post.html"), "w") as f:
+            f.write("title: Second\n\npost")
+
+        # We can't tell what the plugin did with the page, so every page is rendered again
+        self.assertEqual(sorted(page.source_path for page in self.site.pages()), self.rebuild())
+
+    def test_config_changed(self):
+        self.site.config.set("test-value", "yep")
+        self.assertEqual(["config.html"], self.rebuild())
+
+    def test_config_context_changed(self):
+        # Only the pages using the keys that changed
+        self.site.config.set("context", {"a": "1", "b": "3"})
+        self.assertEqual([], self.rebuild())
+
+        self.site.config.set("context", {"a": "2", "b": "3"})
+        self.assertEqual(["context.html"], self.rebuild())
+
+        # Or that were added
+        self.site.config.set("context", {"a": "2", "b": "3", "c": "4"})
+        self.assertEqual(["context.html"], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "context.html")) as f:
+            self.assertEqual("24", f.read())
+
+    def test_page_added(self):
+        with open(os.path.join(self.site.page_path, "new.html"), "w") as f:
+            f.write("new")
+
+        # Pages listing the site pages (e.g. the sitemap) also need to be updated
+        self.assertEqual(["link.html", "list.html", "new.html", "sitemap.xml"], self.rebuild())
+
+    def test_page_removed(self):
+        os.remove(os.path.join(self.site.page_path, "include.html"))
+
+        self.assertEqual(["list.html", "sitemap.xml"], self.rebuild())
+        self.site.wait_for_sweep()
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, "include.html"))
+
+
+class TestIncrementalFingerprint(SiteTestCase):
+    def get_config_for_test(self):
+        return {"fingerprint": ["css"]}
+
+    def test_listed_static_changed(self):
+        with open(os.path.join(self.site.page_path, "static.html"), "w") as f:
+            f.write("{% for s in CACTUS.static %}{{ s.final_url }}\n{% endfor %}")
+        self.site.build()
+
+        with open(os.path.join(self.site.static_path, "css", "style.css"), "a") as f:
+            f.write("\n")
+        self.site.build(incremental=True)
+
+        # The list links to the new fingerprint
+        with open(os.path.join(self.site.build_path, "static.html")) as f:
+            self.assertIn(self.site.get_url_for_static("/static/css/style.css"), f.read().split("\n"))
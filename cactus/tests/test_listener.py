@@ -1,8 +1,12 @@
 import os
+import shutil
 import tempfile
 import threading
+import time
 import unittest
 
+import mock
+
 from cactus.listener import PollingListener
 from cactus.tests.compat import has_symlink
 
@@ -11,6 +15,11 @@ try:
 except ImportError:
     FSEventsListener = None
 
+try:
+    from cactus.listener.inotify import InotifyListener
+except (ImportError, OSError, AttributeError):
+    InotifyListener = None
+
 
 def sleep(s):
     # time.sleep(s)
@@ -25,6 +34,10 @@ class PollingListenerTest(unittest.TestCase):
         self._callback_count = 0
         self.lock = threading.Lock()
 
+    def tearDown(self):
+        # Don't keep polling while the other tests run
+        if hasattr(self, "listener"):
+            self.listener.stop()
 
     def _callback(self, event):
         with self.lock:
@@ -169,9 +182,176 @@ class PollingListenerTest(unittest.TestCase):
         self.assertEqual(len(self.callbacks), 2)
         self.assertEqual(self.callbacks[0]["changed"], [file_link])
 
+
+class PollingListenerCheckTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.realpath(tempfile.mkdtemp())
+        os.makedirs(os.path.join(self.path, "a", "b"))
+        os.makedirs(os.path.join(self.path, "ignored", "c"))
+
+        self.file = os.path.join(self.path, "a", "b", "file.js")
+        with open(self.file, "w") as f:
+            f.write("hello1")
+
+        with open(os.path.join(self.path, "ignored", "c", "file.js"), "w") as f:
+            f.write("hello1")
+
+        # Make the folders old enough to be trusted
+        past = time.time() - 10
+        for directory, _, _ in os.walk(self.path):
+            os.utime(directory, (past, past))
+
+        ignored = os.path.join(self.path, "ignored")
+        self.listener = PollingListener(self.path, None, ignore=lambda path: path.startswith(ignored))
+        self.listener.check(full=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testPrune(self):
+        self.assertEqual(list(self.listener.checksums()), [self.file])
+        self.assertEqual(sorted(self.listener._folders), [self.path, os.path.join(self.path, "a"), os.path.join(self.path, "a", "b")])
+
+    def testOnlyChangedFolders(self):
+        listed = []
+        scandir = os.scandir
+
+        def spy(path):
+            listed.append(path)
+            return scandir(path)
+
+        with mock.patch("os.scandir", side_effect=spy):
+            self.assertEqual(self.listener.check()["any"], [])
+            self.assertEqual(listed, [])
+
+            other = os.path.join(self.path, "a", "other.js")
+            with open(other, "w") as f:
+                f.write("hello1")
+
+            self.assertEqual(self.listener.check()["added"], [other])
+            self.assertEqual(listed, [os.path.join(self.path, "a")])
+
+    def testInPlaceEdit(self):
+        with open(self.file, "w") as f:
+            f.write("hello2, longer")
+
+        # The folder did not change, only a full sweep sees this
+        self.assertEqual(self.listener.check()["any"], [])
+        self.assertEqual(self.listener.check(full=True)["changed"], [self.file])
+
+    def testDeletedFolder(self):
+        shutil.rmtree(os.path.join(self.path, "a"))
+
+        changes = self.listener.check()
+        self.assertEqual(changes["deleted"], [self.file])
+        self.assertEqual(list(self.listener._folders), [self.path])
+
+    def testAdaptiveInterval(self):
+        self.listener.delay = .5
+
+        with mock.patch("time.thread_time", side_effect=[0, 1]), mock.patch("time.time_ns", return_value=0):
+            self.listener._sweep()
+
+        # A sweep that took a second of CPU time happens at most every 20 seconds
+        self.assertEqual(self.listener._sweep_interval, 20)
+
 if FSEventsListener:
 
     class FSEventsListenerTest(PollingListener):
 
         def create_listener(self, path):
             return FSEventsListener(path, self._callback)
+
+
+@unittest.skipUnless(InotifyListener, "No inotify support")
+class InotifyListenerTest(PollingListenerTest):
+
+    def create_listener(self, path, ignore=None):
+        return InotifyListener(path, self._callback, delay=.1, ignore=ignore)
+
+    def testNewFolder(self):
+
+        path_watch = os.path.realpath(os.path.join(tempfile.mkdtemp(), "watched"))
+        path_folder = os.path.join(path_watch, "a", "b")
+        path_file = os.path.join(path_folder, "file.js")
+
+        os.mkdir(path_watch)
+
+        self.listener = self.create_listener(path_watch)
+        self.listener.run()
+
+        os.makedirs(path_folder)
+
+        with open(path_file, "w") as f:
+            f.write("hello1")
+
+        self.wait()
+
+        self.assertEqual(self.callbacks[0]["added"], [path_file])
+
+        # The new folder is watched too
+        with open(path_file, "w") as f:
+            f.write("hello2")
+
+        self.wait()
+
+        self.assertEqual(self.callbacks[1]["changed"], [path_file])
+
+        shutil.rmtree(os.path.join(path_watch, "a"))
+
+        self.wait()
+
+        self.assertEqual(self.callbacks[2]["deleted"], [path_file])
+
+    def testIgnore(self):
+
+        path_watch = os.path.realpath(os.path.join(tempfile.mkdtemp(), "watched"))
+        path_ignored = os.path.join(path_watch, "ignored")
+        path_file = os.path.join(path_watch, "file.js")
+
+        os.mkdir(path_watch)
+        os.mkdir(path_ignored)
+
+        self.listener = self.create_listener(path_watch, ignore=lambda path: path.startswith(path_ignored))
+        self.listener.run()
+
+        self.assertNotIn(path_ignored, self.listener._folders)
+
+        with open(os.path.join(path_ignored, "file.js"), "w") as f:
+            f.write("hello1")
+
+        with open(os.path.join(path_watch, ".hidden.js"), "w") as f:
+            f.write("hello1")
+
+        with open(path_file, "w") as f:
+            f.write("hello1")
+
+        self.wait()
+
+        self.assertEqual(self.callbacks[0]["any"], [path_file])
+
+    def testPause(self):
+
+        path_watch = os.path.realpath(os.path.join(tempfile.mkdtemp(), "watched"))
+        path_file = os.path.join(path_watch, "file.js")
+
+        os.mkdir(path_watch)
+
+        self.listener = self.create_listener(path_watch)
+        self.listener.run()
+
+        self.listener.pause()
+
+        with open(os.path.join(path_watch, "paused.js"), "w") as f:
+            f.write("hello1")
+
+        sleep(.3)
+        self.listener.resume()
+
+        with open(path_file, "w") as f:
+            f.write("hello1")
+
+        self.wait()
+
+        self.assertEqual(self.callbacks[0]["any"], [path_file])
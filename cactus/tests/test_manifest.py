@@ -0,0 +1,149 @@
+#coding:utf-8
+import os
+
+import mock
+
+from cactus.manifest import Manifest
+from cactus.page import Page
+from cactus.site import Site
+from cactus.static import Static
+from cactus.tests import SiteTestCase
+
+
+class TestManifest(SiteTestCase):
+    def get_config_for_test(self):
+        return {"fingerprint": ["css"]}
+
+    def setUp(self):
+        super(TestManifest, self).setUp()
+        self.site.build()
+
+    def build(self, site):
+        """
+        Build the site and return the pages that were rendered and the static files that were pre-processed.
+        """
+        with mock.patch.object(Page, "build", autospec=True, side_effect=Page.build) as page_build:
+            with mock.patch.object(Static, "fingerprint", autospec=True, side_effect=Static.fingerprint) as fingerprint:
+                site.build()
+
+        pages = sorted(call[0][0].source_path for call in page_build.call_args_list)
+        static = sorted(call[0][0].path for call in fingerprint.call_args_list)
+        return pages, static
+
+    def test_manifest_written(self):
+        manifest = Manifest(self.site.build_path)
+        manifest.load()
+
+        self.assertIsNotNone(manifest.environment)
+        self.assertIn("index.html", manifest.pages)
+        self.assertIn("css/style.css", manifest.static)
+        self.assertEqual(manifest.urls["/static/css/style.css"], self.site.get_url_for_static("/static/css/style.css"))
+
+    def test_warm_build(self):
+        site = self.new_site()
+        self.assertEqual(([], []), self.build(site))
+
+        # Fingerprints are kept
+        self.assertEqual(site.get_url_for_static("/static/css/style.css"),
+                         self.site.get_url_for_static("/static/css/style.css"))
+
+    def test_changed_files(self):
+        with open(os.path.join(self.site.page_path, "index.html"), "a") as f:
+            f.write("\n")
+
+        with open(os.path.join(self.site.static_path, "js", "main.js"), "a") as f:
+            f.write("\n")
+
+        self.assertEqual((["index.html"], ["js/main.js"]), self.build(self.new_site()))
+
+    def test_touched_files(self):
+        # As in a fresh checkout: every file has a new modification time, but the same content
+        for folder in [self.site.page_path, self.site.template_path, self.site.static_path]:
+            for root, _, files in os.walk(folder):
+                for name in files:
+                    os.utime(os.path.join(root, name), (1000000000, 1000000000))
+
+        self.assertEqual(([], []), self.build(self.new_site()))
+
+        # The stamps are updated, so the contents are not compared again
+        site = self.new_site()
+        with mock.patch.object(site.digests, "get", side_effect=site.digests.get) as get:
+            self.assertEqual(([], []), self.build(site))
+        self.assertEqual([], [call for call in get.call_args_list
+                              if not call[0][0].startswith(self.site.plugin_path)])
+
+    def test_changed_fingerprint(self):
+        with open(os.path.join(self.site.static_path, "css", "style.css"), "a") as f:
+            f.write("\n")
+
+        # Pages that link to the stylesheet need to pick up the new fingerprint
+        self.assertEqual((["error.html", "index.html"], ["css/style.css"]), self.build(self.new_site()))
+
+    def test_changed_environment(self):
+        with open(os.path.join(self.site.plugin_path, "new.py"), "w") as f:
+            f.write("")
+
+        pages, static = self.build(self.new_site())
+        self.assertEqual(len(self.site.pages()), len(pages))
+        self.assertEqual(len(self.site.static()), len(static))
+
+    def test_clean(self):
+        self.site.clean()
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, ".cactus-manifest"))
+
+    def test_unchanged_outputs_kept(self):
+        index = os.path.join(self.site.build_path, "index.html")
+        style = os.path.join(self.site.build_path, self.site.get_url_for_static("/static/css/style.css")[1:])
+        os.utime(index, (0, 0))
+        os.utime(style, (0, 0))
+
+        # Everything is built again, but nothing is written
+        with open(os.path.join(self.site.plugin_path, "new.py"), "w") as f:
+            f.write("")
+
+        self.build(self.new_site())
+        self.assertEqual(0, os.path.getmtime(index))
+        self.assertEqual(0, os.path.getmtime(style))
+
+    def test_stale_outputs_removed(self):
+        old_style = os.path.join(self.site.build_path, self.site.get_url_for_static("/static/css/style.css")[1:])
+        old_index = os.path.join(self.site.build_path, "index.html")
+
+        with open(os.path.join(self.site.static_path, "css", "style.css"), "a") as f:
+            f.write("\n")
+        os.remove(os.path.join(self.site.page_path, "index.html"))
+
+        site = self.new_site()
+        self.build(site)
+        site.wait_for_sweep()
+
+        self.assertFileDoesNotExist(old_style)
+        self.assertFileDoesNotExist(old_index)
+        self.assertFileExists(os.path.join(site.build_path, site.get_url_for_static("/static/css/style.css")[1:]))
+
+    def test_interrupted_build(self):
+        page = os.path.join(self.site.page_path, "page.html")
+        output = os.path.join(self.site.build_path, "page.html")
+
+        with open(page, "w") as f:
+            f.write("v1")
+        self.new_site().build()
+
+        # The build stops after writing the page, but before writing the manifest
+        with open(page, "w") as f:
+            f.write("v2")
+        with mock.patch.object(Site, "write_manifest", side_effect=RuntimeError):
+            self.assertRaises(RuntimeError, self.new_site().build)
+
+        with open(output) as f:
+            self.assertEqual("v2", f.read())
+
+        # The manifest can't tell us the output is still v1
+        with open(page, "w") as f:
+            f.write("v1")
+        self.new_site().build()
+
+        with open(output) as f:
+            self.assertEqual("v1", f.read())
+
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, ".cactus-manifest.journal"))
@@ -2,7 +2,8 @@
 import os
 import shutil
 
-from cactus.plugin.loader import CustomPluginsLoader
+from cactus import profiler
+from cactus.plugin.loader import CustomPluginsLoader, ObjectsPluginLoader
 from cactus.plugin.manager import PluginManager
 from cactus.tests import SiteTestCase
 
@@ -44,6 +45,22 @@ class TestPluginLoader(SiteTestCase):
         self.assertTrue(hasattr(plugin, 'postBuild'))
         self.assertEqual(-1, plugin.ORDER)
 
+    def test_dispatch_table(self):
+        """
+        Check that only the plugins that implement a hook are called for it
+        """
+        self._load_test_plugin('empty.py', 'empty.py')
+        self._load_test_plugin('test.py', 'test.py')
+
+        manager = self.site.plugin_manager
+        test_plugin = [p for p in manager.plugins if p.plugin_name == 'plugin_test'][0]
+
+        self.assertEqual([('plugin_test', test_plugin.preBuild)], manager._hooks['preBuild'])
+        self.assertEqual([], manager._hooks['preBuildStatic'])
+
+        manager.preBuild(self.site)
+        self.assertEqual([{'args': (self.site,), 'kwargs': {}}], test_plugin.preBuild.calls)
+
     # def test_call(self):
     #     """
     #     Check that plugins get called
@@ -72,3 +89,63 @@ class TestPluginLoader(SiteTestCase):
     #     #postBuild
     #     self.assertEqual(1, len(plugin.postBuild.calls))
     #     self.assertEqual((self.site,), plugin.postBuild.calls[0]['args'])
+
+
+class TestPluginManager(SiteTestCase):
+    def test_calling_conventions(self):
+        calls = []
+
+        class NewPlugin(object):
+            def preBuildPage(self, page, context, data):
+                calls.append(('new', page))
+                context['new'] = True
+                return context, data
+
+        class DeprecatedPlugin(object):
+            ORDER = 1
+
+            def preBuildPage(self, site, page, context, data):
+                calls.append(('deprecated', site, page))
+                return context, data + '!'
+
+        manager = PluginManager(self.site, [ObjectsPluginLoader([NewPlugin(), DeprecatedPlugin()])])
+
+        context, data = manager.preBuildPage(self.site, 'page', {}, 'data')
+
+        self.assertEqual([('new', 'page'), ('deprecated', self.site, 'page')], calls)
+        self.assertEqual(({'new': True}, 'data!'), (context, data))
+
+    def test_postRenderPage(self):
+        class UpperPlugin(object):
+            def postRenderPage(self, page, chunks):
+                return (chunk.upper() for chunk in chunks)
+
+        manager = PluginManager(self.site, [ObjectsPluginLoader([UpperPlugin()])])
+
+        self.assertEqual(['A', 'B'], list(manager.postRenderPage('page', ['a', 'b'])))
+
+        # No plugin: the chunks are passed as they are
+        manager = PluginManager(self.site, [ObjectsPluginLoader([])])
+        chunks = iter(['a'])
+        self.assertIs(chunks, manager.postRenderPage('page', chunks))
+
+    def test_profiled(self):
+        class Plugin(object):
+            def preBuild(self, site):
+                pass
+
+        manager = PluginManager(self.site, [ObjectsPluginLoader([Plugin()])])
+
+        profiler.enable()
+        try:
+            manager.preBuild(self.site)
+            manager.postBuild(self.site)
+        finally:
+            profile = profiler.disable()
+
+        try:
+            hooks = [record[:3] for record in profile.collect() if record[0] == profiler.HOOK]
+        finally:
+            profile.close()
+
+        self.assertEqual([(profiler.HOOK, 'preBuild', 'Plugin')], hooks)
@@ -0,0 +1,77 @@
+#coding:utf-8
+import os
+import gzip
+
+import mock
+
+from cactus import precompress
+from cactus.precompress import Precompressor, parse_formats
+from cactus.tests import SiteTestCase
+from cactus.utils.file import compressString
+
+
+class TestPrecompress(SiteTestCase):
+    def get_config_for_test(self):
+        return {"precompress": {"gzip": 6}, "compress": ["html"]}
+
+    def setUp(self):
+        super(TestPrecompress, self).setUp()
+        self.site.build()
+        self.site.wait_for_sweep()
+
+    def build(self):
+        """
+        Build the site again, and return the files that were compressed.
+        """
+        site = self.new_site()
+        with mock.patch.object(Precompressor, "_compress", autospec=True, side_effect=Precompressor._compress) as compress:
+            site.build()
+        site.wait_for_sweep()
+        return sorted(call[0][2] for call in compress.call_args_list)
+
+    def test_variants(self):
+        path = os.path.join(self.site.build_path, "index.html")
+
+        with open(path, "rb") as f, gzip.open(path + ".gz") as g:
+            self.assertEqual(f.read(), g.read())
+
+        # Only the configured extensions
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, "static", "css", "style.css.gz"))
+
+    def test_deterministic(self):
+        with open(os.path.join(self.site.build_path, "index.html.gz"), "rb") as f:
+            data = f.read()
+
+        # No timestamp
+        self.assertEqual(b"\0\0\0\0", data[4:8])
+
+    def test_incremental(self):
+        self.assertEqual([], self.build())
+
+        with open(os.path.join(self.site.page_path, "index.html"), "w") as f:
+            f.write("Changed")
+
+        self.assertEqual(["index.html"], self.build())
+
+    def test_removed(self):
+        os.remove(os.path.join(self.site.page_path, "index.html"))
+        self.build()
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, "index.html.gz"))
+
+
+class TestPrecompressFormats(SiteTestCase):
+    def test_parse(self):
+        self.assertEqual({"gzip": 9}, parse_formats(["gzip"]))
+        self.assertEqual({"gzip": 4}, parse_formats({"gzip": 4}))
+        self.assertEqual({}, parse_formats(None))
+        self.assertRaises(ValueError, parse_formats, ["lzma"])
+
+    def test_missing_module(self):
+        with mock.patch.object(precompress, "available", return_value=False):
+            self.assertEqual({}, parse_formats(["br"]))
+
+    def test_compress_string(self):
+        data = b"Hello" * 100
+        self.assertEqual(compressString(data), compressString(data))
+        self.assertIs(gzip.time, __import__("time"))
+        self.assertEqual(data, gzip.decompress(compressString(data)))
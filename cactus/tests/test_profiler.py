@@ -0,0 +1,59 @@
+#coding:utf-8
+import os
+import json
+import unittest
+
+from cactus import profiler
+from cactus.tests import SiteTestCase
+from cactus.utils.parallel import processes_available
+
+
+class TestProfiler(SiteTestCase):
+    def setUp(self):
+        super(TestProfiler, self).setUp()
+        self.profiler = profiler.enable()
+
+    def tearDown(self):
+        profiler.disable()
+        self.profiler.close()
+        super(TestProfiler, self).tearDown()
+
+    def kinds(self, report):
+        return set((item['kind'], item['name'], item['item']) for item in report['items'])
+
+    def test_report(self):
+        self.site.build()
+        report = self.profiler.report()
+        kinds = self.kinds(report)
+
+        self.assertIn((profiler.RENDER, 'page', 'index.html'), kinds)
+        self.assertIn((profiler.WRITE, 'page', 'index.html'), kinds)
+        self.assertIn((profiler.PHASE, 'static', 'en'), kinds)
+        self.assertIn((profiler.HOOK, 'preBuild', 'ContextPlugin'), kinds)
+
+        # Slowest first
+        self.assertEqual(report['groups'], sorted(report['groups'], key=lambda g: g['wall'], reverse=True))
+        self.assertIn('render: page', self.profiler.summary(report))
+
+        path = os.path.join(self.path, 'profile.json')
+        self.profiler.write(path, report)
+        with open(path) as f:
+            self.assertEqual(report, json.load(f))
+
+    @unittest.skipUnless(processes_available(), "No fork support")
+    def test_worker_processes(self):
+        self.site.render_processes = 2
+        self.site.build()
+
+        kinds = self.kinds(self.profiler.report())
+        self.assertIn((profiler.RENDER, 'page', 'index.html'), kinds)
+        self.assertIn((profiler.RENDER, 'page', 'error.html'), kinds)
+
+    def test_nested(self):
+        with self.profiler.measure(profiler.PHASE, 'outer'):
+            with self.profiler.measure(profiler.PHASE, 'inner'):
+                sum(range(100000))
+
+        report = self.profiler.report()
+        outer, inner = [[g for g in report['groups'] if g['name'] == name][0] for name in ['outer', 'inner']]
+        self.assertLess(outer['wall'], inner['wall'])
@@ -0,0 +1,95 @@
+#coding:utf-8
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from cactus.page import Page
+from cactus.tests import SiteTestCase
+from cactus.utils.cache import DiskCache, parse_size
+
+
+class TestRenderCache(SiteTestCase):
+    def get_config_for_test(self):
+        return {"render-cache": ".cache"}
+
+    def setUp(self):
+        super(TestRenderCache, self).setUp()
+
+        with open(os.path.join(self.site.template_path, "partial.html"), "w") as f:
+            f.write("partial")
+
+        with open(os.path.join(self.site.page_path, "include.html"), "w") as f:
+            f.write("{% include 'partial.html' %}")
+
+        self.site.build()
+
+    def rebuild(self):
+        """
+        Build from scratch and return the source paths of the pages that were rendered.
+        """
+        self.site.clean()
+
+        with mock.patch.object(Page, "render_chunks", autospec=True, side_effect=Page.render_chunks) as render:
+            self.site.build()
+
+        return sorted(call[0][0].source_path for call in render.call_args_list)
+
+    def test_cached(self):
+        self.assertEqual([], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "include.html")) as f:
+            self.assertEqual("partial", f.read())
+
+    def test_dependency_changed(self):
+        with open(os.path.join(self.site.template_path, "partial.html"), "w") as f:
+            f.write("partial changed")
+
+        self.assertEqual(["include.html"], self.rebuild())
+
+        with open(os.path.join(self.site.build_path, "include.html")) as f:
+            self.assertEqual("partial changed", f.read())
+
+    def test_config_changed(self):
+        self.site.config.set("test-value", "yep")
+        self.assertEqual(len(self.site.pages()), len(self.rebuild()))
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_set(self):
+        cache = DiskCache(self.path)
+        self.assertIsNone(cache.get("abcdef"))
+        cache.set("abcdef", b"hello")
+        self.assertEqual(b"hello", cache.get("abcdef"))
+
+    def test_evict(self):
+        cache = DiskCache(self.path, max_size=10)
+
+        cache.set("aaaa", b"12345")
+        cache.set("bbbb", b"12345")
+
+        # Make sure "aaaa" is the most recently used one
+        past = time.time() - 10
+        os.utime(os.path.join(self.path, "bb", "bbbb"), (past, past))
+        cache.set("cccc", b"12345")
+
+        cache.evict()
+
+        self.assertIsNone(cache.get("bbbb"))
+        self.assertEqual(b"12345", cache.get("aaaa"))
+        self.assertEqual(b"12345", cache.get("cccc"))
+
+    def test_parse_size(self):
+        self.assertEqual(1024, parse_size(1024))
+        self.assertEqual(1024, parse_size("1kb"))
+        self.assertEqual(512 * 1024 ** 2, parse_size("512 MB"))
+        self.assertRaises(ValueError, parse_size, "lots")
@@ -0,0 +1,197 @@
+#coding:utf-8
+import os
+import threading
+
+import mock
+from tornado import gen
+
+from cactus.exceptions import BuildCancelled
+from cactus.listener.scheduler import RebuildScheduler
+from cactus.tests import IOLoopTestCase, SiteTestCase
+
+
+def changes(added=(), deleted=(), changed=()):
+    return {'added': list(added), 'deleted': list(deleted), 'changed': list(changed),
+            'any': list(added) + list(deleted) + list(changed)}
+
+
+class TestRebuildScheduler(IOLoopTestCase):
+    def setUp(self):
+        super(TestRebuildScheduler, self).setUp()
+        self.builds = []
+        self.results = []
+        self.scheduler = RebuildScheduler(self.rebuild, self.done, debounce=.05, max_delay=1)
+
+    def tearDown(self):
+        self.scheduler.stop()
+        super(TestRebuildScheduler, self).tearDown()
+
+    def rebuild(self, changes):
+        self.builds.append(changes)
+        return len(self.builds)
+
+    def done(self, changes, result):
+        # Results come back on the loop
+        self.assertIs(threading.current_thread(), threading.main_thread())
+        self.results.append((changes, result))
+
+    @gen.coroutine
+    def wait(self, count=1):
+        for _ in range(100):
+            if len(self.results) >= count and self.scheduler.idle():
+                return
+            yield gen.sleep(.02)
+        self.fail("Timeout")
+
+    def test_debounce(self):
+        self.scheduler.add(changes(added=['a.html']))
+        self.scheduler.add(changes(changed=['a.html', 'b.html']))
+        self.scheduler.add(changes(deleted=['c.html']))
+        self.scheduler.start(self.io_loop)
+
+        self.run_sync(self.wait)
+
+        self.assertEqual(1, len(self.builds))
+        self.assertEqual([(changes(added=['a.html'], deleted=['c.html'], changed=['b.html']), 1)], self.results)
+
+    def test_added_then_deleted(self):
+        self.scheduler.start(self.io_loop)
+        self.scheduler.add(changes(added=['a.html']))
+        self.scheduler.add(changes(deleted=['a.html'], changed=['b.html']))
+
+        self.run_sync(self.wait)
+
+        self.assertEqual([changes(changed=['b.html'])], self.builds)
+
+    def test_cancel(self):
+        started = threading.Event()
+        attempts = []
+
+        def rebuild(changes):
+            attempts.append(changes)
+            if len(attempts) == 1:
+                started.set()
+                # Wait for the next changes to cancel us
+                if not self.scheduler.cancelled.wait(5):
+                    return None
+                raise BuildCancelled()
+            return self.rebuild(changes)
+
+        self.scheduler.rebuild = rebuild
+        self.scheduler.start(self.io_loop)
+
+        self.scheduler.add(changes(added=['a.html']))
+
+        @gen.coroutine
+        def cancel():
+            while not started.is_set():
+                yield gen.sleep(.02)
+
+            # From another thread, like listeners do
+            adding = threading.Thread(target=self.scheduler.add, args=(changes(changed=['a.html', 'b.html']),))
+            adding.start()
+            adding.join()
+
+            yield self.wait()
+
+        self.run_sync(cancel)
+
+        self.assertEqual(2, len(attempts))
+        self.assertEqual([changes(added=['a.html'], changed=['b.html'])], self.builds)
+
+    def test_error(self):
+        def rebuild(changes):
+            self.rebuild(changes)
+            raise Exception("Broken")
+
+        self.scheduler.rebuild = rebuild
+        self.scheduler.start(self.io_loop)
+
+        @gen.coroutine
+        def built(count):
+            while len(self.builds) < count or not self.scheduler.idle():
+                yield gen.sleep(.02)
+
+        with mock.patch('cactus.listener.scheduler.logger'):
+            self.scheduler.add(changes(added=['a.html']))
+            self.run_sync(lambda: built(1))
+
+            # Errors don't stop the scheduler
+            self.scheduler.add(changes(added=['b.html']))
+            self.run_sync(lambda: built(2))
+
+        self.assertEqual([], self.results)
+
+
+class TestCancelBuild(SiteTestCase):
+    def test_cancelled(self):
+        self.site._cancelled = threading.Event()
+        self.site._cancelled.set()
+
+        self.assertRaises(BuildCancelled, self.site.build)
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, 'index.html'))
+
+        # The next build picks up from there
+        self.site._cancelled.clear()
+        self.site.build()
+        self.assertFileExists(os.path.join(self.site.build_path, 'index.html'))
+
+    def test_cancelled_between_pages(self):
+        self.site._cancelled = threading.Event()
+
+        build_page = self.site._build_page
+        built = []
+
+        def cancel(page):
+            build_page(page)
+            built.append(page)
+            self.site._cancelled.set()
+
+        self.site._build_page = cancel
+
+        self.assertRaises(BuildCancelled, self.site.build)
+        self.assertEqual(1, len(built))
+        self.assertIsNone(self.site._staging_path)
+
+        self.site._cancelled.clear()
+        self.site._build_page = build_page
+        self.site.build()
+
+        for page in self.site.pages():
+            self.assertFileExists(os.path.join(self.site.build_path, page.build_path))
+
+    def test_cancelled_then_reverted(self):
+        page = os.path.join(self.site.page_path, 'page.html')
+        output = os.path.join(self.site.build_path, 'page.html')
+
+        with open(page, 'w') as f:
+            f.write('v1')
+        self.site.build()
+
+        self.site._cancelled = threading.Event()
+        build_page = self.site._build_page
+
+        def cancel(page):
+            build_page(page)
+            if page.source_path == 'page.html':
+                self.site._cancelled.set()
+
+        self.site._build_page = cancel
+
+        with open(page, 'w') as f:
+            f.write('v2')
+        self.assertRaises(BuildCancelled, self.site.build)
+
+        with open(output) as f:
+            self.assertEqual('v2', f.read())
+
+        # The manifest still has the checksum of v1, but it's not what we have on disk
+        self.site._cancelled.clear()
+        self.site._build_page = build_page
+
+        with open(page, 'w') as f:
+            f.write('v1')
+        self.site.build()
+
+        with open(output) as f:
+            self.assertEqual('v1', f.read())
@@ -0,0 +1,234 @@
+#coding:utf-8
+import os
+import gzip
+import shutil
+import tempfile
+
+import mock
+
+from cactus.server import WebServer, TEMPLATES
+from cactus.tests import HTTPServerTestCase, SiteTestCase
+
+
+class TestWebServer(HTTPServerTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+        with open(os.path.join(self.path, 'index.html'), 'w') as f:
+            f.write('<p>Hello</p>' * 100)
+
+        os.mkdir(os.path.join(self.path, 'about'))
+        with open(os.path.join(self.path, 'about', 'index.html'), 'w') as f:
+            f.write('<p>About</p>')
+
+        with open(os.path.join(self.path, 'image.png'), 'wb') as f:
+            f.write(b'\x89PNG' * 1000)
+
+        super(TestWebServer, self).setUp()
+
+    def tearDown(self):
+        super(TestWebServer, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def get_app(self):
+        self.server = WebServer(self.path)
+        self.server.application._socketHandlers = []
+        return self.server.application
+
+    def test_script(self):
+        response = self.fetch('/')
+        self.assertEqual(200, response.code)
+        self.assertEqual(('<p>Hello</p>' * 100 + TEMPLATES['script']).encode('utf-8'), response.body)
+
+        response = self.fetch('/about/')
+        self.assertEqual(('<p>About</p>' + TEMPLATES['script']).encode('utf-8'), response.body)
+
+    def test_not_modified(self):
+        response = self.fetch('/image.png')
+        etag = response.headers['Etag']
+
+        response = self.fetch('/image.png', headers={'If-None-Match': etag})
+        self.assertEqual(304, response.code)
+
+    def test_cached(self):
+        self.fetch('/image.png')
+
+        with open(os.path.join(self.path, 'image.png'), 'wb') as f:
+            f.write(b'GIF8')
+
+        # Until the site tells us it changed
+        self.assertEqual(b'\x89PNG' * 1000, self.fetch('/image.png').body)
+
+        self.server.invalidate()
+        self.assertEqual(b'GIF8', self.fetch('/image.png').body)
+
+    def test_gzip(self):
+        response = self.fetch('/index.html', headers={'Accept-Encoding': 'gzip'}, decompress_response=False)
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertEqual(self.fetch('/index.html').body, gzip.decompress(response.body))
+
+        # Not for binary files
+        response = self.fetch('/image.png', headers={'Accept-Encoding': 'gzip'}, decompress_response=False)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_range(self):
+        response = self.fetch('/image.png', headers={'Range': 'bytes=0-3'})
+        self.assertEqual(206, response.code)
+        self.assertEqual(b'\x89PNG', response.body)
+
+    def test_not_found(self):
+        self.assertEqual(404, self.fetch('/missing.html').code)
+
+
+class TestBuilder(HTTPServerTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.requested = []
+        super(TestBuilder, self).setUp()
+
+    def tearDown(self):
+        super(TestBuilder, self).tearDown()
+        shutil.rmtree(self.path)
+
+    def get_app(self):
+        self.server = WebServer(self.path, builder=self.build)
+        self.server.application._socketHandlers = []
+        return self.server.application
+
+    def build(self, build_paths):
+        self.requested.append(build_paths)
+        if build_paths[-1] == os.path.join('about', 'index.html'):
+            os.makedirs(os.path.join(self.path, 'about'), exist_ok=True)
+            with open(os.path.join(self.path, 'about', 'index.html'), 'w') as f:
+                f.write('<p>About {0}</p>'.format(len(self.requested)))
+            return True
+        return False
+
+    def test_build(self):
+        response = self.fetch('/about/')
+        self.assertEqual(200, response.code)
+        self.assertTrue(response.body.startswith(b'<p>About 1</p>'))
+        self.assertEqual([[os.path.join('about', 'index.html')]], self.requested)
+
+        # What was built again is not served from memory
+        self.assertTrue(self.fetch('/about/').body.startswith(b'<p>About 2</p>'))
+
+    def test_redirect(self):
+        response = self.fetch('/about', follow_redirects=False)
+        self.assertEqual(301, response.code)
+        self.assertEqual([['about', os.path.join('about', 'index.html')]], self.requested)
+
+
+class TestOnDemand(SiteTestCase):
+    def setUp(self):
+        super(TestOnDemand, self).setUp()
+        self.site.prepare_on_demand()
+
+    def test_nothing_built(self):
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, 'index.html'))
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, 'static', 'css', 'style.css'))
+
+    def test_page(self):
+        self.assertTrue(self.site.build_on_demand(['index.html']))
+        self.assertFileExists(os.path.join(self.site.build_path, 'index.html'))
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, 'error.html'))
+
+        self.assertFalse(self.site.build_on_demand(['index.html']))
+        self.assertFalse(self.site.build_on_demand(['missing.html']))
+
+    def test_static(self):
+        self.assertTrue(self.site.build_on_demand([os.path.join('static', 'css', 'style.css')]))
+        self.assertFileExists(os.path.join(self.site.build_path, 'static', 'css', 'style.css'))
+
+    def test_changed(self):
+        self.site.build_on_demand(['index.html'])
+        self.site.build_on_demand(['error.html'])
+
+        with open(os.path.join(self.site.page_path, 'index.html'), 'w') as f:
+            f.write('Changed')
+
+        # As the server does when something changes
+        self.site.save_on_demand()
+        self.site.prepare_on_demand()
+
+        self.assertTrue(self.site.build_on_demand(['index.html']))
+        self.assertFalse(self.site.build_on_demand(['error.html']))
+
+        with open(os.path.join(self.site.build_path, 'index.html')) as f:
+            self.assertEqual('Changed', f.read())
+
+    def test_removed(self):
+        self.site.build_on_demand(['error.html'])
+        self.site.save_on_demand()
+
+        os.remove(os.path.join(self.site.page_path, 'error.html'))
+        self.site.prepare_on_demand()
+        self.site.wait_for_sweep()
+
+        self.assertFileDoesNotExist(os.path.join(self.site.build_path, 'error.html'))
+        self.assertFalse(self.site.build_on_demand(['error.html']))
+
+
+class TestReload(SiteTestCase):
+    def setUp(self):
+        super(TestReload, self).setUp()
+        self.site.build()
+        self.site.server = mock.Mock()
+
+    def test_changed_page(self):
+        with open(os.path.join(self.site.page_path, 'error.html'), 'w') as f:
+            f.write('Changed')
+
+        changes = {'added': [], 'deleted': [], 'changed': [os.path.join(self.site.page_path, 'error.html')]}
+        self.site._rebuilt(changes, self.site._rebuild(changes))
+
+        self.site.server.reload.assert_called_once_with(['/error.html'])
+        self.site.server.reloadPage.assert_not_called()
+
+    def test_changed_static(self):
+        with open(os.path.join(self.site.static_path, 'css', 'style.css'), 'a') as f:
+            f.write('body { color: red; }')
+
+        changes = {'added': [], 'deleted': [], 'changed': [os.path.join(self.site.static_path, 'css', 'style.css')]}
+        self.site._rebuilt(changes, self.site._rebuild(changes))
+
+        self.site.server.reload.assert_called_once_with(['/static/css/style.css'])
+
+    def test_removed_page(self):
+        os.remove(os.path.join(self.site.page_path, 'error.html'))
+
+        changes = {'added': [], 'deleted': [os.path.join(self.site.page_path, 'error.html')], 'changed': []}
+        self.site._rebuilt(changes, self.site._rebuild(changes))
+
+        self.site.server.reload.assert_called_once_with(['/error.html'])
+
+    def test_nothing_changed(self):
+        changes = {'added': [], 'deleted': [], 'changed': [os.path.join(self.site.page_path, 'error.html')]}
+        self.site._rebuilt(changes, self.site._rebuild(changes))
+
+        self.site.server.reload.assert_not_called()
+        self.site.server.reloadPage.assert_not_called()
+
+    def test_on_demand(self):
+        self.site.prepare_on_demand()
+
+        changes = {'added': [], 'deleted': [], 'changed': [os.path.join(self.site.page_path, 'error.html')]}
+        self.site._rebuilt(changes, self.site._rebuild(changes))
+
+        # We don't know what changed until it's requested
+        self.site.server.reloadPage.assert_called_once_with()
+
+    def test_publish(self):
+        server = WebServer(self.site.build_path)
+        socket = mock.Mock()
+        server.application._socketHandlers = [socket]
+        server.io_loop = mock.Mock()
+
+        server.reload(['/about.html'])
+
+        # Not from this thread
+        socket.write_message.assert_not_called()
+        server.io_loop.add_callback.assert_called_once_with(server._publish, '{"reload": ["/about.html"]}')
+
+        server._publish('{"reload": ["/about.html"]}')
+        socket.write_message.assert_called_once_with('{"reload": ["/about.html"]}')
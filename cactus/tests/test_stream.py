@@ -0,0 +1,71 @@
+#coding:utf-8
+import os
+import shutil
+
+from cactus.tests import SiteTestCase
+
+
+class TestStreamingRender(SiteTestCase):
+    def setUp(self):
+        super(TestStreamingRender, self).setUp()
+
+        with open(os.path.join(self.site.template_path, "root.html"), "w") as f:
+            f.write("<root>{% block a %}root a{% endblock %}{% block b %}root b{% endblock %}</root>")
+
+        with open(os.path.join(self.site.template_path, "middle.html"), "w") as f:
+            f.write("{% extends 'root.html' %}{% block a %}middle a {{ block.super }}"
+                    "{% block c %}middle c{% endblock %}{% endblock %}")
+
+        with open(os.path.join(self.site.template_path, "partial.html"), "w") as f:
+            f.write("partial {{ value }}")
+
+        with open(os.path.join(self.site.page_path, "test.html"), "w") as f:
+            f.write("value: 1\n{% extends 'middle.html' %}{% block c %}page c {{ block.super }}{% endblock %}"
+                    "{% block b %}{% for i in '123' %}{{ i }}{% endfor %}{% include 'partial.html' %}{% endblock %}")
+
+    def get_page(self):
+        return [page for page in self.site.pages() if page.source_path == "test.html"][0]
+
+    def test_same_output(self):
+        page = self.get_page()
+        self.site.build()
+
+        chunks = list(page.render_chunks())
+        self.assertGreater(len(chunks), 1)
+
+        expected = "<root>middle a root apage c middle c123partial 1</root>"
+        self.assertEqual(expected, "".join(chunks))
+        self.assertEqual(expected, page.render())
+
+        with open(os.path.join(self.site.build_path, "test.html")) as f:
+            self.assertEqual(expected, f.read())
+
+    def test_post_render_plugin(self):
+        shutil.copy(os.path.join('cactus', 'tests', 'data', 'plugins', 'upper.py'), self.site.plugin_path)
+        self.site.build()
+
+        with open(os.path.join(self.site.build_path, "test.html")) as f:
+            self.assertEqual("<ROOT>MIDDLE A ROOT APAGE C MIDDLE C123PARTIAL 1</ROOT>", f.read())
+
+    def test_loop(self):
+        items = "0123456789" * 2000
+
+        with open(os.path.join(self.site.page_path, "archive.html"), "w") as f:
+            f.write("items: {0}\n".format(items))
+            f.write("{% for i in items %}{% if forloop.first %}[{% endif %}{% with n=i %}<li>{{ n }}</li>{% endwith %}"
+                    "{% if forloop.last %}]{% else %},{% endif %}{% endfor %}"
+                    "{% for i in missing %}{{ i }}{% empty %} empty{% endfor %}")
+
+        self.site.build()
+        page = [page for page in self.site.pages() if page.source_path == "archive.html"][0]
+
+        # Item by item, not as one big chunk
+        chunks = list(page.render_chunks())
+        self.assertGreater(len(chunks), len(items))
+        self.assertLess(max(len(chunk) for chunk in chunks), 100)
+
+        expected = "[" + ",".join("<li>{0}</li>".format(i) for i in items) + "] empty"
+        self.assertEqual(expected, "".join(chunks))
+
+        with open(os.path.join(self.site.build_path, "archive.html")) as f:
+            self.assertEqual(expected, f.read())
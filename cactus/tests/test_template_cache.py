@@ -0,0 +1,57 @@
+#coding:utf-8
+import os
+
+import mock
+from django.template.engine import Engine
+
+from cactus.tests import SiteTestCase
+
+
+class TestTemplateCache(SiteTestCase):
+    def setUp(self):
+        super(TestTemplateCache, self).setUp()
+
+        with open(os.path.join(self.site.template_path, "parent.html"), "w") as f:
+            f.write("parent {% block content %}{% endblock %}")
+
+        for name in ["a.html", "b.html"]:
+            with open(os.path.join(self.site.page_path, name), "w") as f:
+                f.write("{% extends 'parent.html' %}{% block content %}" + name + "{% endblock %}")
+
+    def read(self, name):
+        with open(os.path.join(self.site.build_path, name)) as f:
+            return f.read()
+
+    def test_templates_compiled_once(self):
+        loader = Engine.get_default().template_loaders[0]
+
+        with mock.patch.object(loader, "get_contents", side_effect=loader.get_contents) as get_contents:
+            self.site.build(incremental=False)
+            self.site.build(incremental=False)
+
+        parent = os.path.join(self.site.template_path, "parent.html")
+        self.assertEqual(1, len([call for call in get_contents.call_args_list if call[0][0].name == parent]))
+        self.assertEqual("parent a.html", self.read("a.html"))
+
+    def test_page_templates_reused(self):
+        self.site.build(incremental=False)
+        template = self.site._page_templates["a.html"][1]
+
+        self.site.build(incremental=False)
+        self.assertIs(template, self.site._page_templates["a.html"][1])
+
+        with open(os.path.join(self.site.page_path, "a.html"), "w") as f:
+            f.write("changed")
+
+        self.site.build(incremental=False)
+        self.assertIsNot(template, self.site._page_templates["a.html"][1])
+        self.assertEqual("changed", self.read("a.html"))
+
+    def test_template_changed(self):
+        self.site.build()
+
+        with open(os.path.join(self.site.template_path, "parent.html"), "w") as f:
+            f.write("changed parent {% block content %}{% endblock %}")
+
+        self.site.build()
+        self.assertEqual("changed parent b.html", self.read("b.html"))
@@ -45,3 +45,42 @@ class TestPrettyURLS(SiteTestCase):
         """
         self.assertFileExists(os.path.join(self.site.build_path, 'sitemap.xml'))
         self.assertFileExists(os.path.join(self.site.build_path, 'robots.txt'))
+
+
+class TestURLIndex(SiteTestCase):
+    def setUp(self):
+        super(TestURLIndex, self).setUp()
+
+        subfolder = os.path.join(self.path, 'pages', 'folder')
+        os.makedirs(subfolder)
+        open(os.path.join(subfolder, 'index.html'), 'w')
+
+    def test_aliases(self):
+        self.site.build()
+
+        style = self.site.get_url_for_static('/static/css/style.css')
+        self.assertEqual(style, self.site.get_url_for_static_alias('css/style.css'))
+        self.assertEqual(style, self.site.get_url_for_static_alias('/css/style.css'))
+        self.assertIsNone(self.site.get_url_for_static('css/style.css'))
+
+        self.assertEqual('/folder/index.html', self.site.get_url_for_page_alias('/folder'))
+        self.assertEqual('/folder/index.html', self.site.get_url_for_page_alias('/folder/'))
+        self.assertIsNone(self.site.get_url_for_page_alias('/nothing'))
+
+    def test_query_and_external(self):
+        self.site.build()
+
+        self.assertEqual('/index.html', self.site.get_url_for_page('/index.html#top'))
+        self.assertEqual('http://example.com/a.css', self.site.get_url_for_static('http://example.com/a.css'))
+
+    def test_pages_added_and_removed(self):
+        self.site.build()
+        self.assertIsNone(self.site.get_url_for_page('/new.html'))
+
+        open(os.path.join(self.path, 'pages', 'new.html'), 'w')
+        os.remove(os.path.join(self.path, 'pages', 'folder', 'index.html'))
+        self.site.build()
+
+        self.assertEqual('/new.html', self.site.get_url_for_page('/new.html'))
+        self.assertIsNone(self.site.get_url_for_page('/folder/index.html'))
+        self.assertIsNone(self.site.get_url_for_page_alias('/folder'))
@@ -0,0 +1,100 @@
+#coding:utf-8
+from cactus.utils.url import is_external
+
+
+def clean_url(url):
+    """
+    Drop the fragment and query from an URL.
+    """
+    for split_char in ["#", "?"]:
+        if split_char in url:
+            url = url.split(split_char)[0]
+    return url
+
+
+def page_aliases(page):
+    """
+    The other URLs a page can be linked with: /subdir/ and /subdir for /subdir/index.html
+    """
+    if page.link_url.endswith('/index.html'):
+        directory = page.link_url.rsplit('index.html', 1)[0]
+        return [directory, directory.rstrip('/')]
+    return []
+
+
+def static_aliases(static):
+    """
+    The other URLs a static file can be linked with: css/style.css and /css/style.css for /static/css/style.css
+    """
+    if static.link_url.startswith('/static/'):
+        return [static.link_url[len('/static/'):], static.link_url[len('/static'):]]
+    return []
+
+
+class URLIndex(object):
+    """
+    Finds resources (pages or static files) by link URL, or by one of their aliases.
+
+    The index is updated with the current list of resources, only the ones that were
+    added or removed since the last update are (un)indexed.
+    """
+    def __init__(self, aliases):
+        self._aliases = aliases
+        self._resources = {}
+        self._by_alias = {}
+
+    def update(self, resources):
+        current = dict((resource.link_url, resource) for resource in resources)
+
+        for link_url in [link_url for link_url in self._resources if link_url not in current]:
+            self.remove(self._resources[link_url])
+
+        for link_url, resource in current.items():
+            if self._resources.get(link_url) is not resource:
+                self.add(resource)
+
+    def add(self, resource):
+        self._resources[resource.link_url] = resource
+        for alias in self._aliases(resource):
+            # Real URLs win over aliases
+            if alias and alias not in self._by_alias:
+                self._by_alias[alias] = resource.link_url
+
+    def remove(self, resource):
+        self._resources.pop(resource.link_url, None)
+        for alias in self._aliases(resource):
+            if self._by_alias.get(alias) == resource.link_url:
+                del self._by_alias[alias]
+
+    def resources(self):
+        """
+        :returns: A dict of link_url -> resource.
+        """
+        return self._resources
+
+    def get(self, url):
+        """
+        :returns: The resource with this link URL, or None.
+        """
+        return self._resources.get(clean_url(url))
+
+    def get_alias(self, url):
+        """
+        :returns: The resource that has this URL as an alias, or None.
+        """
+        link_url = self._by_alias.get(clean_url(url))
+        if link_url is None:
+            return None
+        return self._resources.get(link_url)
+
+    def final_url(self, url):
+        """
+        :returns: The final URL for a link URL, the URL itself for external URLs, or None.
+        """
+        if is_external(url):
+            return url
+
+        resource = self.get(url)
+        if resource is None:
+            return None
+        return resource.final_url
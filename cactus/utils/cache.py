@@ -0,0 +1,140 @@
+#coding:utf-8
+import os
+import re
+import shutil
+import logging
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+
+SIZE_UNITS = {'': 1, 'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3, 'tb': 1024 ** 4}
+
+
+def parse_size(size):
+    """
+    Parse a size like 1024, "512mb" or "1 GB" into a number of bytes.
+    """
+    if isinstance(size, int):
+        return size
+
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([a-z]*)\s*$', str(size).lower())
+    if match is None or match.group(2) not in SIZE_UNITS:
+        raise ValueError('Invalid size: {0}'.format(size))
+
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+class DiskCache(object):
+    """
+    A content addressed cache on disk, that can be shared between processes (and machines).
+
+    Entries are files named after their key. Reading an entry marks it as recently used,
+    and evict() removes the least recently used entries until the cache fits in max_size.
+    """
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get_path(self, key):
+        """
+        :returns: The path of the file stored for this key, or None.
+        """
+        path = self._entry_path(key)
+
+        # Mark as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+
+        return path
+
+    def get(self, key):
+        """
+        :returns: The bytes stored for this key, or None.
+        """
+        path = self.get_path(key)
+        if path is None:
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def _store(self, key, fill):
+        path = self._entry_path(key)
+        directory = os.path.dirname(path)
+
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+        # Write to a temporary file first, so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                fill(f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def set(self, key, data):
+        """
+        Store bytes for this key.
+        """
+        self._store(key, lambda f: f.write(data))
+
+    def set_file(self, key, source):
+        """
+        Store a copy of the file at source for this key.
+        """
+        def fill(f):
+            with open(source, 'rb') as src:
+                shutil.copyfileobj(src, f)
+
+        self._store(key, fill)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in max_size.
+        """
+        if self.max_size is None or not os.path.isdir(self.path):
+            return
+
+        entries = []
+        total = 0
+
+        for directory, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+                total += info.st_size
+
+        if total <= self.max_size:
+            return
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+        logger.debug('Evicted cache entries in %s, %s bytes left', self.path, total)
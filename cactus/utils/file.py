@@ -1,30 +1,32 @@
 #coding:utf-8
 import os
+import sys
 import gzip
 import io
 import hashlib
+import mmap
+import shutil
+import filecmp
 import subprocess
+import uuid
 
-from six import text_type, BytesIO
+from six import BytesIO
 
-from cactus.utils.helpers import checksum
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
-class FakeTime:
-    """
-    Monkey-patch gzip.time to avoid changing files every time we deploy them.
-    """
-    def time(self):
-        return 1111111111.111
+# A fixed timestamp in gzip headers, to avoid changing files every time we deploy them.
+GZIP_MTIME = 1111111111
 
 
 def compressString(s):
     """Gzip a given string."""
 
-    gzip.time = FakeTime()
-
     zbuf = BytesIO()
-    zfile = gzip.GzipFile(mode='wb', compresslevel=9, fileobj=zbuf)
+    zfile = gzip.GzipFile(mode='wb', compresslevel=9, fileobj=zbuf, mtime=GZIP_MTIME)
     zfile.write(s)
     zfile.close()
     return zbuf.getvalue()
@@ -36,22 +38,193 @@ def fileSize(num):
             return "%.0f%s" % (num, x)
         num /= 1024.0
 
-def calculate_file_checksum(path):
+# Files larger than this are hashed through mmap, in one call that releases the GIL
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def new_hasher(algorithm='md5'):
+    """
+    A hashlib object for an algorithm name. BLAKE2 digests are cut to 128 bits,
+    so fingerprinted filenames stay as long as with MD5.
     """
-    Calculate the MD5 sum for a file:
-    Read chunks of a file and update the hasher.
-    Returns the hex digest of the md5 hash.
+    if algorithm in ('blake2b', 'blake2s'):
+        return getattr(hashlib, algorithm)(digest_size=16)
+    return hashlib.new(algorithm)
+
+
+def calculate_file_checksum(path, algorithm='md5'):
     """
-    hasher = hashlib.md5()
+    Calculate the hex digest of a file (MD5 unless another hashlib algorithm is given).
+    """
+    hasher = new_hasher(algorithm)
     with io.FileIO(path, 'r') as fp:
-        while True:
-            buf = fp.read(65536)
-            if not buf:
-                break
-            hasher.update(buf)
+        size = os.fstat(fp.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                hasher.update(data)
+        else:
+            while True:
+                buf = fp.read(65536)
+                if not buf:
+                    break
+                hasher.update(buf)
     return hasher.hexdigest()
 
+
 def file_changed_hash(path):
+    """
+    A stamp that changes whenever the file is modified, without reading it.
+    """
     info = os.stat(path)
-    hashKey = text_type(info.st_mtime) + text_type(info.st_size)
-    return checksum(hashKey.encode('utf-8'))
+    return '{0:x}-{1:x}'.format(info.st_mtime_ns, info.st_size)
+
+
+def _ensure_directory(path):
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError:
+        pass
+
+
+def write_chunks_if_changed(path, chunks, previous_checksum=None, algorithm='md5'):
+    """
+    Write data (bytes) that comes in chunks to path, unless the file already holds exactly
+    these bytes: unchanged files keep their mtime, so syncing and watching tools only see real
+    changes. The chunks are written to a temporary file next to path, which replaces path if it differs.
+
+    :param previous_checksum: The checksum of what we last wrote to path, if known (and nothing wrote to path
+        since, see Manifest.forget_outputs). Saves reading the file back.
+    :param algorithm: The algorithm of the checksums (see calculate_file_checksum).
+    :returns: Whether the file was written, and the checksum of the data.
+    """
+    _ensure_directory(path)
+
+    directory, filename = os.path.split(path)
+    tmp_path = os.path.join(directory, '.{0}.{1}.tmp'.format(filename, uuid.uuid4().hex))
+    hasher = new_hasher(algorithm)
+
+    try:
+        # Buffered: streamed pages come in many small chunks
+        with io.open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                hasher.update(chunk)
+                f.write(chunk)
+
+        data_checksum = hasher.hexdigest()
+
+        try:
+            unchanged = os.path.getsize(path) == os.path.getsize(tmp_path) and (
+                previous_checksum == data_checksum or filecmp.cmp(tmp_path, path, shallow=False))
+        except OSError:
+            unchanged = False
+
+        if unchanged:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return not unchanged, data_checksum
+
+
+def copy_if_changed(source, path, source_checksum, previous_checksum=None, hardlink=False):
+    """
+    Copy source to path, unless path already holds the same content.
+
+    :param source_checksum: The checksum of source.
+    :param previous_checksum: The checksum of what we last copied to path, if known (and nothing wrote to path
+        since, see Manifest.forget_outputs). Saves reading the file back.
+    :param hardlink: Whether path may be a hard link to source, see copy_file.
+    :returns: Whether the file was copied.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+
+    if size == os.path.getsize(source):
+        if previous_checksum is not None and previous_checksum == source_checksum:
+            return False
+        if filecmp.cmp(source, path, shallow=False):
+            return False
+
+    copy_file(source, path, hardlink)
+
+    return True
+
+
+# ioctl to clone a file (share its extents, copy-on-write) on btrfs, xfs, ...
+FICLONE = 0x40049409
+
+
+def _clone(source, path):
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+
+    with io.FileIO(source, 'r') as src, io.FileIO(path, 'w') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except (IOError, OSError):
+            return False
+
+    return True
+
+
+def copy_file(source, path, hardlink=False):
+    """
+    Copy source to path, without reading the data into Python when we can: with a
+    hard link (if allowed), a copy-on-write clone, or a copy made by the kernel.
+
+    The copy goes to a temporary file that replaces path, so a hard link in the
+    build folder is never written through.
+
+    :param hardlink: Whether path may be a hard link to source.
+    """
+    _ensure_directory(path)
+
+    directory, filename = os.path.split(path)
+    tmp_path = os.path.join(directory, '.{0}.{1}.tmp'.format(filename, uuid.uuid4().hex))
+
+    try:
+        linked = False
+        if hardlink:
+            try:
+                os.link(source, tmp_path)
+                linked = True
+            except OSError:
+                pass
+
+        if not linked:
+            if not _clone(source, tmp_path):
+                shutil.copyfile(source, tmp_path)
+            shutil.copymode(source, tmp_path)
+
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def remove_files(root, paths):
+    """
+    Remove files (relative to root), and the folders that this leaves empty.
+    """
+    for path in paths:
+        full_path = os.path.join(root, path)
+
+        try:
+            os.remove(full_path)
+        except OSError:
+            continue
+
+        directory = os.path.dirname(full_path)
+        while os.path.abspath(directory) != os.path.abspath(root):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
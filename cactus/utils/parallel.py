@@ -1,8 +1,11 @@
 #coding:utf-8
 from __future__ import print_function
+import os
 import sys
 import logging
+import multiprocessing
 import multiprocessing.pool
+from contextlib import contextmanager
 
 
 PARALLEL_AGGRESSIVE = 2
@@ -25,3 +28,82 @@ def multiMap(f, items, workers = 8):
             sys.exit()
 
     return pool.map(wrapper, items)
+
+
+# State shared with the worker processes, set once when they start
+_worker_state = None
+
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state = state
+
+
+def _run_batch(args):
+    f, batch = args
+    return [f(_worker_state, item) for item in batch]
+
+
+def processes_available():
+    """
+    Whether we can use processMap: workers are forked so they inherit the state
+    (e.g. Django settings and the site) without pickling it.
+    """
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def processMap(f, items, state, processes=None, batch_size=None):
+    """
+    Map f(state, item) over items using a pool of forked worker processes, which
+    escapes the GIL for CPU bound work.
+
+    The state is handed over once, when the workers start. Items are sent in batches.
+    Both f (a module level function), the items and the results must be picklable.
+    """
+    items = list(items)
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if batch_size is None:
+        # A few batches per worker, so the slow ones don't hold everything up
+        batch_size = max(1, min(64, len(items) // (processes * 4)))
+
+    batches = [(f, items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+
+    pool = multiprocessing.get_context('fork').Pool(processes, initializer=_init_worker, initargs=(state,))
+
+    try:
+        results = pool.map(_run_batch, batches, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    return [result for batch in results for result in batch]
+
+
+@contextmanager
+def processEach(f, items, state):
+    """
+    Run f(state, item) for each item in its own forked process, while the block runs
+    in this one. Leaving the block waits for the processes.
+
+    Unlike the processMap workers, these processes can start processes of their own.
+    Nothing is returned: the processes should only produce files.
+    """
+    items = list(items)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=f, args=(state, item)) for item in items]
+
+    for process in processes:
+        process.start()
+
+    try:
+        yield
+    finally:
+        for process in processes:
+            process.join()
+
+    failed = [item for item, process in zip(items, processes) if process.exitcode != 0]
+    if failed:
+        raise RuntimeError('Failed in worker processes: {0}'.format(', '.join(map(str, failed))))